@@ -1,17 +1,32 @@
+import os
+import threading
+
+import click
 from flask import Flask
 from flask_cors import CORS
-from flask_caching import Cache
 
-# caches the data for 1500 seconds (25 minutes)
-cache = Cache(config={
-    "CACHE_TYPE": "SimpleCache",
-    "CACHE_DEFAULT_TIMEOUT": 1500
-})
+from app.routes.response_cache import ResponseCache
+
+# caches the responses for 1500 seconds (25 minutes) by default,
+# in a file that is shared by all workers (RESPONSE_CACHE_FILE, default: response_cache.sqlite3)
+cache = ResponseCache(default_timeout=1500)
 
 def create_app():
+    from app.routes.frame_cache import enable_copy_on_write
+
+    # the loader hands out shallow copies of its cached dfs, which is only safe with Copy-on-Write
+    enable_copy_on_write()
+
     app = Flask(__name__)
     CORS(app)
-    cache.init_app(app)
+    from app.routes.es_dataloader import get_loader
+
+    # the ETags of the cached responses are derived from the versions of the datasets they use
+    cache.init_app(
+        app,
+        record_versions=lambda: get_loader().record_versions(),
+        current_versions=lambda cache_keys: get_loader().current_versions(cache_keys)
+    )
 
     from app.routes.question5 import question5_bp
     from app.routes.question4 import question4_bp
@@ -20,6 +35,8 @@ def create_app():
     from app.routes.question2 import question2_bp
     from app.routes.question3 import question3_bp
     from app.routes.question6 import question6_bp
+    from app.routes.meta import meta_bp
+    from app.routes.batch import batch_bp
 
     app.register_blueprint(question1_bp, url_prefix='/api/question1')
     app.register_blueprint(question5_bp, url_prefix='/api/question5')
@@ -28,9 +45,26 @@ def create_app():
     app.register_blueprint(question2_bp, url_prefix='/api/question2')
     app.register_blueprint(question3_bp, url_prefix='/api/question3')
     app.register_blueprint(question6_bp, url_prefix='/api/question6')
+    app.register_blueprint(meta_bp, url_prefix='/api/meta')
+    app.register_blueprint(batch_bp, url_prefix='/api')
 
     @app.route('/')
     def index():
         return "Hello World"
 
+    from app.warmup import warm_up
+
+    # flask --app run warmup
+    @app.cli.command('warmup')
+    @click.option('--top', default=5, help='Most used param combinations per endpoint to request as well')
+    @click.option('--workers', default=4, help='Number of parallel loads & requests')
+    @click.option('--refresh', is_flag=True, help='Build the responses again even if they are cached')
+    def warmup_command(top, workers, refresh):
+        """Loads all datasets and fills the response cache of every chart endpoint"""
+        warm_up(app, top=top, workers=workers, refresh=refresh, log=click.echo)
+
+    # optional warm-up in the background when a worker starts
+    if os.environ.get('WARMUP_ON_START', '0') == '1':
+        threading.Thread(target=warm_up, args=(app,), name='cache-warmup', daemon=True).start()
+
     return app
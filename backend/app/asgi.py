@@ -0,0 +1,90 @@
+import inspect
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from urllib.parse import parse_qsl
+
+from asgiref.sync import SyncToAsync
+from asgiref.wsgi import WsgiToAsgiInstance
+from werkzeug.datastructures import MultiDict
+
+from app.routes.async_dataloader import get_async_loader
+from app.routes.batch import BatchItem, plan
+
+"""
+ASGI entry point of the backend (see backend/asgi.py).
+
+The chart views stay the normal Flask views, but before a GET request of a chart is passed to Flask,
+the datasets it needs are loaded with the async loader if its response is not cached yet.
+So the wait for Eurostat happens in the event loop: hundreds of requests can wait for upstream
+without a thread each, and the view only parses & builds the chart.
+
+The views run in a thread pool of their own (ASGI_VIEW_THREADS, default: 16 threads). WsgiToAsgi of asgiref
+would run every view of the process on one shared thread (thread_sensitive), one request after the other.
+"""
+
+# the run_wsgi_app of asgiref without its sync_to_async wrapper (which is thread sensitive)
+_run_wsgi_app = inspect.unwrap(WsgiToAsgiInstance.run_wsgi_app)
+
+
+class _WsgiInstance(WsgiToAsgiInstance):
+    """A request to the WSGI app, run in the given thread pool"""
+    def __init__(self, wsgi_application, executor):
+        super().__init__(wsgi_application)
+        self.executor = executor
+
+    async def run_wsgi_app(self, body):
+        await SyncToAsync(partial(_run_wsgi_app, self), thread_sensitive=False, executor=self.executor)(body)
+
+
+class PrefetchingASGIApp:
+    def __init__(self, app, loader=None, view_threads=None):
+        """
+        Args:
+            app (Flask): The app from create_app
+            loader (AsyncEurostatDataLoader): Loader for the prefetch (default: get_async_loader())
+            view_threads (int): Views that run at the same time (default: ASGI_VIEW_THREADS or 16)
+        """
+        self.app = app
+        view_threads = view_threads or int(os.environ.get('ASGI_VIEW_THREADS', '16'))
+        self.executor = ThreadPoolExecutor(max_workers=view_threads, thread_name_prefix='asgi-view')
+        self.loader = loader if loader is not None else get_async_loader()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] == 'http' and scope['method'] == 'GET' and scope['path'].startswith('/api/'):
+            await self.prefetch(scope['path'], scope.get('query_string', b'').decode('latin-1'))
+        await _WsgiInstance(self.app, self.executor)(scope, receive, send)
+
+    def plan(self, path, query):
+        """The codes of the datasets a request needs, empty if the response is cached (or it isn't a chart)"""
+        item = BatchItem(path, MultiDict(parse_qsl(query, keep_blank_values=True)))
+        with self.app.app_context():
+            return plan(self.app, [item])
+
+    async def prefetch(self, path, query):
+        datasets = await self.loader.run(self.plan, path, query)
+        if datasets:
+            try:
+                await self.loader.load_many(datasets)
+            except Exception:
+                # the view reports the error itself
+                pass
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.loader.aclose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+def create_asgi_app():
+    from app import create_app
+
+    return PrefetchingASGIApp(create_app())
@@ -0,0 +1,233 @@
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import httpx
+
+from .dataset_store import make_cache_key
+from .es_dataloader import RETRY_STATUS_CODES, _DatasetEntry, get_loader, validator_headers
+from .singleflight import file_lock
+
+"""
+Asyncio variant of the loader.
+
+The calls to Eurostat are made with httpx.AsyncClient, so a waiting call is only a coroutine
+in the event loop and not a blocked thread: one process can wait for hundreds of calls at the same time.
+Everything that needs the CPU (parsing the JSON, building the dfs) or the disk (the SQLite store)
+runs in a small thread pool, the event loop never waits for it.
+
+AsyncEurostatDataLoader wraps the normal loader and shares its store, frame cache, dimension indexes
+and derived structures, so a dataset loaded by the async loader is there for the sync views as well.
+Only the download is done differently:
+
+    loader = get_async_loader()
+    df_pop, df_crime = await loader.load_many(['tps00001', 'crim_off_cat'])
+"""
+
+
+class AsyncEurostatDataLoader:
+    def __init__(self, loader=None, max_connections=100, parse_workers=None):
+        """
+        Args:
+            loader (EurostatDataLoader): The loader whose caches & settings are used (default: the shared one)
+            max_connections (int): Most open connections to Eurostat, the other calls wait for a free one
+            parse_workers (int): Threads for parsing & the store (default: max_workers of the loader)
+        """
+        self.loader = loader if loader is not None else get_loader()
+        self.max_connections = max_connections
+        self.parse_workers = parse_workers or self.loader.max_workers
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        # the client & the running downloads belong to the event loop they were created in
+        self._loop = None
+        self._client = None
+        self._flights = {} # cache key -> asyncio.Task of the download
+
+    def _bind_loop(self):
+        """Creates the client for the running event loop (again, if the loader is used by a new loop)"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._flights = {}
+            # like requests: one number is the connect & the read timeout
+            timeout = self.loader.timeout
+            connect, read = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+            self._client = httpx.AsyncClient(
+                headers={"Accept-Encoding": "gzip, deflate", "Accept": "application/json"},
+                timeout=httpx.Timeout(read, connect=connect),
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=min(self.max_connections, 20)),
+            )
+        return loop
+
+    async def aclose(self):
+        """Closes the connections of the client (e.g. when the ASGI server shuts down)"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._loop = None
+
+    async def run(self, fn, *args, **kwargs):
+        """Runs a blocking function (parsing, SQLite ...) in the thread pool of the loader"""
+        loop = self._bind_loop()
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.parse_workers, thread_name_prefix='eurostat-parse')
+        return await loop.run_in_executor(self._executor, partial(fn, *args, **kwargs))
+
+    async def fetch_dataset(self, dataset_code, params=None):
+        """
+        Fetches the dataset JSON from the Eurostat API & using caching, like EurostatDataLoader.fetch_dataset
+
+        Returns:
+            dict: The JSON data returned by the API
+        """
+        entry = await self._fetch_entry(dataset_code, params)
+        # the payload is parsed in the pool, it can be several MB
+        return await self.run(lambda: entry.data)
+
+    async def _fetch_entry(self, dataset_code, params=None):
+        """Returns the _DatasetEntry of a key from the store or downloads it"""
+        params = dict(params) if params else {}
+        params.setdefault('format', 'json')
+        cache_key = make_cache_key(dataset_code, params)
+
+        cached = await self.run(self.loader.store.get, cache_key)
+        if cached is not None:
+            freshness = self.loader._freshness(cached.fetched_at)
+            if freshness != 'expired':
+                if freshness == 'stale':
+                    self.loader._refresh_in_background(dataset_code, params, cache_key)
+                return _DatasetEntry(cache_key, cached.payload, cached.fetched_at, cached.version)
+
+        # the coroutines asking for the same key wait for the same download
+        self._bind_loop()
+        task = self._flights.get(cache_key)
+        if task is None:
+            task = asyncio.ensure_future(self._download_entry(dataset_code, params, cache_key))
+            self._flights[cache_key] = task
+            task.add_done_callback(lambda _, flights=self._flights: flights.pop(cache_key, None))
+        # shield: a cancelled request does not cancel the download for the others
+        return await asyncio.shield(task)
+
+    async def _download_entry(self, dataset_code, params, cache_key):
+        """
+        Downloads an entry while holding the lock file of the key, like EurostatDataLoader._download_entry,
+        so only one process of this host calls Eurostat for it. Waiting for the lock blocks a thread
+        of the default executor (not the event loop), only the first coroutine of a key gets here.
+        """
+        loop = asyncio.get_running_loop()
+        lock = file_lock(self.loader.lock_dir, cache_key)
+        await loop.run_in_executor(None, lock.__enter__)
+        try:
+            now = time.time()
+            cached = await self.run(self.loader.store.get, cache_key)
+            if cached is not None and now - cached.fetched_at < self.loader.cache_expiry:
+                return _DatasetEntry(cache_key, cached.payload, cached.fetched_at, cached.version)
+
+            response = await self._request(dataset_code, params, cached)
+            return await self.run(self.loader._entry_from_response, dataset_code, cache_key, cached, response, now)
+        finally:
+            lock.__exit__(None, None, None)
+
+    async def _request(self, dataset_code, params, cached=None):
+        """Calls the Eurostat API with the retries & backoff of EurostatDataLoader._request, without blocking"""
+        url = f"{self.loader.base_url}/{dataset_code}"
+        headers = validator_headers(cached)
+        max_retries, retry_backoff = self.loader.max_retries, self.loader.retry_backoff
+
+        for attempt in range(max_retries + 1):
+            last_try = attempt == max_retries
+            try:
+                response = await self._client.get(url, params=params, headers=headers)
+            except httpx.TransportError as e:
+                if last_try:
+                    raise Exception(f"Error fetching dataset {dataset_code}: {e}")
+            else:
+                if response.status_code not in RETRY_STATUS_CODES or last_try:
+                    return response
+            # full jitter, so the workers don't retry all at the same time
+            await asyncio.sleep(random.uniform(0, retry_backoff * 2 ** attempt))
+
+    def _has_data(self, dataset_code, params, cache_key):
+        """
+        True if the loader can answer a load of the key without calling Eurostat: the df or the payload
+        of the key (or of the unfiltered dataset, which covers every filter) is there and not expired
+        """
+        loader = self.loader
+        keys = [cache_key]
+        if any(name != 'format' for name in params):
+            keys.append(make_cache_key(dataset_code, {'format': params.get('format', 'json')}))
+        for key in keys:
+            cached = loader.frames.get(key)
+            if cached is not None and loader._freshness(cached[1]) != 'expired':
+                return True
+            stored = loader.store.get_dimensions(key)
+            if stored is not None and loader._freshness(stored.fetched_at) != 'expired':
+                return True
+        return False
+
+    async def _ensure_downloaded(self, dataset_code, filters=None):
+        params = {'format': 'json'}
+        if filters:
+            params.update(filters)
+        cache_key = make_cache_key(dataset_code, params)
+        if not await self.run(self._has_data, dataset_code, params, cache_key):
+            await self._fetch_entry(dataset_code, params)
+
+    async def load_dataset(self, dataset_code, filters=None, dimensions=None, time=None):
+        """
+        Loads and parses a dataset, the arguments are the same as EurostatDataLoader.load_dataset.
+        The download is awaited in the event loop, the parsing runs in the thread pool.
+
+        Returns:
+            pd.DataFrame
+        """
+        await self._ensure_downloaded(dataset_code, filters)
+        return await self.run(self.loader.load_dataset, dataset_code, filters, dimensions, time)
+
+    async def load_derived(self, dataset_code, builder, filters=None):
+        """Like EurostatDataLoader.load_derived, the builder runs in the thread pool"""
+        await self._ensure_downloaded(dataset_code, filters)
+        return await self.run(self.loader.load_derived, dataset_code, builder, filters)
+
+    async def load_combined(self, datasets, builder):
+        """Like EurostatDataLoader.load_combined, all datasets are downloaded at the same time first"""
+        jobs = self.loader._jobs(datasets)
+        await asyncio.gather(*(self._ensure_downloaded(job['dataset_code'], job.get('filters')) for job in jobs))
+        return await self.run(self.loader.load_combined, jobs, builder)
+
+    async def load_many(self, datasets):
+        """
+        Loads several datasets at the same time, the datasets are in the format of EurostatDataLoader.load_many
+
+        Returns:
+            list: The dfs (or derived structures) in the same order as the datasets
+        """
+        jobs = self.loader._jobs(datasets)
+        return await asyncio.gather(*(
+            self.load_derived(**job) if 'builder' in job else self.load_dataset(**job)
+            for job in jobs
+        ))
+
+    async def get_dimensions(self, dataset_code, filters=None):
+        """Like EurostatDataLoader.get_dimensions"""
+        await self._ensure_downloaded(dataset_code, filters)
+        return await self.run(self.loader.get_dimensions, dataset_code, filters)
+
+
+_shared_async_loader = None
+_shared_async_loader_lock = threading.Lock()
+
+def get_async_loader():
+    """Returns the async loader of this process, it wraps the shared loader of get_loader()"""
+    global _shared_async_loader
+    if _shared_async_loader is None:
+        with _shared_async_loader_lock:
+            if _shared_async_loader is None:
+                _shared_async_loader = AsyncEurostatDataLoader()
+    return _shared_async_loader
@@ -0,0 +1,179 @@
+"""
+batch.py
+
+This file defines the batch endpoints, which build several charts in one request:
+    POST /api/batch           with the charts & their params in the body
+    GET  /api/<question>/all  all charts of a question with the same params
+
+The datasets needed by the charts that are not cached yet are loaded once (in parallel) before
+the charts are built, then the charts are built in parallel through their normal (cached) endpoints.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlsplit
+
+from flask import Blueprint, current_app, make_response, request
+from werkzeug.datastructures import MultiDict
+
+from app import cache
+from .es_dataloader import get_loader
+from .json_encoder import json_response, raw_json
+from .payload_formats import response_options
+
+batch_bp = Blueprint('batch', __name__)
+
+# most charts in one batch request
+MAX_BATCH_SIZE = 20
+
+# charts built at the same time
+BATCH_WORKERS = 4
+
+
+class BatchItem:
+    def __init__(self, path, params):
+        """
+        A chart of a batch request
+
+        Args:
+            path (str): Path of the chart endpoint, e.g. '/api/question1/chart1'
+            params (MultiDict): The query params of the chart
+        """
+        self.path = path
+        self.params = params
+        self.view = None
+        self.view_args = {}
+        self.key = None
+        self.error = None
+
+
+def parse_item(item):
+    """
+    Reads a chart of the request body:
+        "question1/chart1?geo=DE&geo=FR" or {"chart": "/api/question1/chart1", "params": {"geo": ["DE", "FR"]}}
+
+    Returns:
+        BatchItem
+    """
+    if isinstance(item, str):
+        parts = urlsplit(item)
+        path, params = parts.path, MultiDict(parse_qsl(parts.query))
+    elif isinstance(item, dict) and isinstance(item.get('chart'), str):
+        path, params = item['chart'], MultiDict()
+        for name, value in (item.get('params') or {}).items():
+            for v in value if isinstance(value, list) else [value]:
+                params.add(name, str(v))
+    else:
+        raise ValueError("every chart must be a path or an object with 'chart' and 'params'")
+
+    if not path.startswith('/'):
+        path = '/' + path
+    if not path.startswith('/api/'):
+        path = '/api' + path
+    # the results are always JSON
+    params.poplist('format')
+    return BatchItem(path, params)
+
+
+def plan(app, items):
+    """
+    Finds the endpoint & cache key of every chart
+
+    Returns:
+        list: The codes of the datasets needed by the charts that are not cached
+    """
+    datasets = []
+    for item in items:
+        with app.test_request_context(item.path, query_string=item.params):
+            view = app.view_functions.get(request.url_rule.endpoint) if request.url_rule else None
+            if view is None or not hasattr(view, 'cache_params'):
+                item.error = (404, f"Unknown chart: {item.path}")
+                continue
+            item.view, item.view_args = view, request.view_args
+            item.key = cache.make_key(request.path, view.cache_params, request.args, response_options())
+        if cache.get(item.key) is None:
+            datasets.extend(d for d in view.datasets if d not in datasets)
+    return datasets
+
+
+def render(app, item):
+    """
+    Builds one chart through its endpoint
+
+    Returns:
+        dict: chart, params, status & the response of the chart
+    """
+    result = {"chart": item.path, "params": item.params.to_dict(flat=False)}
+    if item.error is not None:
+        status, error = item.error
+        result.update(status=status, response={"chart_data": None, "interactive_data": None, "error": error})
+        return result
+
+    with app.test_request_context(item.path, query_string=item.params):
+        try:
+            response = make_response(item.view(**item.view_args))
+            result.update(status=response.status_code, response=raw_json(response.get_data()))
+        except Exception as e:
+            result.update(status=500, response={
+                "chart_data": None, "interactive_data": None, "error": f"Error creating chart data: {e}"})
+    return result
+
+
+def run_batch(items):
+    """Loads the datasets of the charts once and builds the charts in parallel"""
+    app = current_app._get_current_object()
+    start = time.perf_counter()
+
+    datasets = plan(app, items)
+    if datasets:
+        try:
+            get_loader().load_many(datasets)
+        except Exception:
+            # the charts that need the dataset report the error themselves
+            pass
+
+    with ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix='chart-batch') as pool:
+        results = list(pool.map(lambda item: render(app, item), items))
+
+    return json_response({
+        "results": results,
+        "datasets": datasets,
+        "seconds": round(time.perf_counter() - start, 3)
+    })
+
+
+"""------Batch endpoints------"""
+
+
+# Several charts in one request
+@batch_bp.route('/batch', methods=['POST'])
+def batch():
+    body = request.get_json(silent=True)
+    charts = body.get('charts') if isinstance(body, dict) else body
+    if not isinstance(charts, list) or not charts:
+        return json_response({"error": "The body must be a list of charts (or {\"charts\": [...]})"}, status=400)
+    if len(charts) > MAX_BATCH_SIZE:
+        return json_response({"error": f"At most {MAX_BATCH_SIZE} charts per request"}, status=400)
+
+    try:
+        items = [parse_item(chart) for chart in charts]
+    except ValueError as e:
+        return json_response({"error": str(e)}, status=400)
+    return run_batch(items)
+
+
+# All charts of a question, the query params are passed to every chart
+@batch_bp.route('/<question>/all', methods=['GET'])
+def question_all(question):
+    prefix = f"/api/{question}/"
+    paths = sorted(
+        rule.rule for rule in current_app.url_map.iter_rules()
+        if rule.rule.startswith(prefix) and not rule.arguments and not rule.rule.endswith('/filters')
+        and hasattr(current_app.view_functions.get(rule.endpoint), 'cache_params')
+    )
+    if not paths:
+        return json_response({"error": f"Unknown question: {question}"}, status=404)
+
+    params = MultiDict(request.args)
+    params.poplist('format')
+    return run_batch([BatchItem(path, MultiDict(params)) for path in paths])
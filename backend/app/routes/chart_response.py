@@ -1,5 +1,6 @@
 # just a helper class to format the response
-from flask import jsonify
+from .json_encoder import json_response
+from .payload_formats import payload_response
 
 
 class ChartResponse:
@@ -33,8 +34,20 @@ class ChartResponse:
     def to_json(self):
         """
         Converts the response object to JSON format for HTTP(S) response.
+        chart_data may be a DataFrame (encoded as a list of records) or contain NumPy arrays.
         """
-        return jsonify({
+        return json_response({
+            "chart_data": self.chart_data,
+            "interactive_data": self.interactive_data,
+            "error": self.error
+        })
+
+    def to_response(self):
+        """
+        Converts the response object to the format asked for by the request (?format= or Accept header),
+        JSON like to_json by default. See payload_formats for the compact formats.
+        """
+        return payload_response({
             "chart_data": self.chart_data,
             "interactive_data": self.interactive_data,
             "error": self.error
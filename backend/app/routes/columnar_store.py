@@ -0,0 +1,128 @@
+import hashlib
+import os
+import shutil
+import uuid
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    from pyarrow import ipc
+except ImportError: # optional, without pyarrow the loader just parses the JSON again
+    pa = None
+
+"""
+On-disk store for the parsed datasets in the Arrow IPC (Feather v2) format.
+
+Every dataset version is split into one file per time period:
+    <root>/<hash of cache key>/<version>/time=<period>.arrow
+The files are uncompressed, so they can be memory-mapped. A load that only needs
+some years reads only their files, and after a restart the workers open these
+files instead of parsing the JSON payload again.
+"""
+
+# position of the row in the parsed df, used to restore the original row order
+ROW_COLUMN = '__row'
+# empty table with the schema of the df, so a read that matches no period still knows the columns
+SCHEMA_FILE = '_schema.arrow'
+
+
+def _partition_name(period):
+    return f"time={period}.arrow"
+
+
+class ColumnarStore:
+    def __init__(self, root='eurostat_cache.columns'):
+        """
+        Args:
+            root (str): Directory of the store (created on first write)
+        """
+        self.root = root
+
+    @property
+    def available(self):
+        """The store needs pyarrow"""
+        return pa is not None
+
+    def _key_dir(self, cache_key):
+        return os.path.join(self.root, hashlib.sha1(cache_key.encode()).hexdigest()[:20])
+
+    def has(self, cache_key, version):
+        return self.available and os.path.isdir(os.path.join(self._key_dir(cache_key), version))
+
+    def write(self, cache_key, version, df):
+        """
+        Writes a parsed df, partitioned by its time column, and removes the older versions of the key.
+        The files are written into a temporary directory first, which is then renamed, so readers
+        never see a half written version.
+        """
+        if not self.available:
+            return
+        key_dir = self._key_dir(cache_key)
+        target = os.path.join(key_dir, version)
+        if os.path.isdir(target):
+            return
+
+        tmp = os.path.join(key_dir, f".tmp-{uuid.uuid4().hex}")
+        os.makedirs(tmp)
+        try:
+            df = df.assign(**{ROW_COLUMN: np.arange(len(df), dtype=np.int64)})
+            if 'time' in df.columns:
+                partitions = df.groupby('time', sort=False)
+            else:
+                partitions = [('all', df)]
+            schema = pa.Schema.from_pandas(df, preserve_index=False)
+            self._write_table(os.path.join(tmp, SCHEMA_FILE), schema.empty_table())
+            for period, part in partitions:
+                table = pa.Table.from_pandas(part, schema=schema, preserve_index=False)
+                self._write_table(os.path.join(tmp, _partition_name(period)), table)
+            os.rename(tmp, target)
+        except OSError:
+            # another process was faster with the same version
+            shutil.rmtree(tmp, ignore_errors=True)
+            if not os.path.isdir(target):
+                raise
+
+        for name in os.listdir(key_dir):
+            if name != version and not name.startswith('.tmp-'):
+                shutil.rmtree(os.path.join(key_dir, name), ignore_errors=True)
+
+    @staticmethod
+    def _write_table(path, table):
+        with pa.OSFile(path, 'wb') as sink:
+            with ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+    def read(self, cache_key, version, times=None):
+        """
+        Reads a df written by write (memory-mapped)
+
+        Args:
+            cache_key (str): The cache key of the dataset
+            version (str): The version of the dataset
+            times (list): Only read these time periods (default: all)
+
+        Returns:
+            pd.DataFrame: in the original row order, or None if the version is not stored
+        """
+        if not self.has(cache_key, version):
+            return None
+        version_dir = os.path.join(self._key_dir(cache_key), version)
+        try:
+            names = sorted(os.listdir(version_dir))
+            if times is not None:
+                wanted = {_partition_name(t) for t in times} | {SCHEMA_FILE}
+                names = [name for name in names if name in wanted]
+
+            # the tables keep a reference to the mapped files, so they are not closed here
+            tables = [
+                ipc.open_file(pa.memory_map(os.path.join(version_dir, name), 'r')).read_all()
+                for name in names
+            ]
+        except (OSError, pa.ArrowInvalid):
+            # removed by a newer version in the meantime
+            return None
+
+        df = pa.concat_tables(tables).to_pandas()
+        order = np.argsort(df[ROW_COLUMN].to_numpy(), kind='stable')
+        return df.take(order).drop(columns=[ROW_COLUMN]).reset_index(drop=True)
@@ -0,0 +1,185 @@
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from urllib.parse import parse_qsl, urlencode
+
+"""
+Persistent store for the raw Eurostat responses.
+
+Every cache key is its own row in a SQLite database (WAL mode), so several
+gunicorn workers can read and write the same file at the same time.
+SQLite takes care of the locking between the processes, a lookup only reads
+the row that was asked for and a write only touches its own row.
+"""
+
+# bump this when the table layout changes, old cache files are then recreated
+SCHEMA_VERSION = 3
+
+# a row of the store, version identifies the content of the payload (changes when Eurostat updates the data)
+# etag & last_modified are the validators sent by Eurostat, used to revalidate an expired entry
+StoredDataset = namedtuple('StoredDataset', ['payload', 'fetched_at', 'version', 'etag', 'last_modified'])
+StoredDimensions = namedtuple('StoredDimensions', ['payload', 'fetched_at', 'version'])
+
+
+def make_cache_key(dataset_code, params=None):
+    """
+    Builds a stable string key for a dataset request.
+    The params are sorted (and so are the values of multi value params), so the
+    same request always gets the same key, no matter in which order the filters were given.
+
+    Example: make_cache_key('crim_off_cat', {'time': ['2020', '2019'], 'format': 'json'})
+    -> 'crim_off_cat?format=json&time=2019&time=2020'
+    """
+    pairs = []
+    for name, value in (params or {}).items():
+        values = value if isinstance(value, (list, tuple, set)) else [value]
+        pairs.extend((str(name), str(v)) for v in values)
+    query = urlencode(sorted(pairs))
+    return f"{dataset_code}?{query}" if query else dataset_code
+
+
+def parse_cache_key(cache_key):
+    """
+    Reverse of make_cache_key
+
+    Returns:
+        tuple: (dataset_code, {param: [values]})
+    """
+    dataset_code, _, query = cache_key.partition('?')
+    params = {}
+    for name, value in parse_qsl(query, keep_blank_values=True):
+        params.setdefault(name, []).append(value)
+    return dataset_code, params
+
+
+class DatasetStore:
+    def __init__(self, path='eurostat_cache.sqlite3', timeout=30):
+        """
+        Opens (or creates) the store
+
+        Args:
+            path (str): Path to the SQLite file
+            timeout (int): Seconds to wait for a lock held by another process
+        """
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._setup()
+
+    def _connect(self):
+        """Returns the connection of the current thread (sqlite connections can't be shared between threads)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _setup(self):
+        """Creates the tables, or recreates them if they were made by an older version"""
+        conn = self._connect()
+        with conn:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version != SCHEMA_VERSION:
+                conn.execute("DROP TABLE IF EXISTS datasets")
+                conn.execute("DROP TABLE IF EXISTS dimension_indexes")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS datasets (
+                    key TEXT PRIMARY KEY,
+                    dataset_code TEXT NOT NULL,
+                    payload BLOB NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    version TEXT NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT
+                )
+                """
+            )
+            # the dimension index is kept in its own table, so reading it never touches the payload
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS dimension_indexes (
+                    key TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    version TEXT NOT NULL
+                )
+                """
+            )
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def get(self, key):
+        """
+        Reads a single entry
+
+        Returns:
+            StoredDataset: (payload bytes, fetched_at unix timestamp, version, etag, last_modified)
+                or None if the key is unknown
+        """
+        row = self._connect().execute(
+            "SELECT payload, fetched_at, version, etag, last_modified FROM datasets WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        return StoredDataset(bytes(row[0]), *row[1:])
+
+    def get_dimensions(self, key):
+        """
+        Reads the dimension index of a single entry (without the payload)
+
+        Returns:
+            StoredDimensions: (index JSON, fetched_at unix timestamp, version) or None if the key is unknown
+        """
+        row = self._connect().execute(
+            "SELECT payload, fetched_at, version FROM dimension_indexes WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        return StoredDimensions(*row)
+
+    def put(self, key, dataset_code, payload, version, dimensions, fetched_at=None, etag=None, last_modified=None):
+        """
+        Writes (or replaces) a single entry and its dimension index
+
+        Args:
+            key (str): Key from make_cache_key
+            dataset_code (str): The Eurostat dataset code
+            payload (bytes): The raw JSON response body
+            version (str): Version of the payload
+            dimensions (str): The dimension index as JSON (DimensionIndex.to_json)
+            fetched_at (float): Unix timestamp of the download (default: now)
+            etag (str): ETag header of the response
+            last_modified (str): Last-Modified header of the response
+        """
+        if fetched_at is None:
+            fetched_at = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO datasets (key, dataset_code, payload, fetched_at, version, etag, last_modified) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, dataset_code, sqlite3.Binary(payload), fetched_at, version, etag, last_modified)
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO dimension_indexes (key, payload, fetched_at, version) VALUES (?, ?, ?, ?)",
+                (key, dimensions, fetched_at, version)
+            )
+
+    def touch(self, key, fetched_at=None):
+        """Marks an entry as fresh again (after Eurostat told us it has not changed)"""
+        if fetched_at is None:
+            fetched_at = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute("UPDATE datasets SET fetched_at = ? WHERE key = ?", (fetched_at, key))
+            conn.execute("UPDATE dimension_indexes SET fetched_at = ? WHERE key = ?", (fetched_at, key))
+
+    def delete(self, key):
+        """Removes a single entry"""
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM datasets WHERE key = ?", (key,))
+            conn.execute("DELETE FROM dimension_indexes WHERE key = ?", (key,))
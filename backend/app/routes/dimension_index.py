@@ -0,0 +1,141 @@
+import json
+from collections import Counter
+
+"""
+Lightweight index of the dimensions of a dataset (codes & labels of geo, time, iccs ...).
+It is built once when a dataset is downloaded and stored next to (not inside) the payload,
+so the dropdowns of the charts can be built without loading the values of the dataset.
+"""
+
+
+class Dimension:
+    def __init__(self, name, codes, labels):
+        """
+        Args:
+            name (str): Name of the dimension, e.g. 'geo'
+            codes (list): Codes ordered by their position in the dataset, e.g. ['BE', 'BG', ...]
+            labels (list): Labels in the same order, e.g. ['Belgium', 'Bulgaria', ...]
+        """
+        self.name = name
+        self.codes = codes
+        self.labels = labels
+        self.code_to_label = dict(zip(codes, labels))
+        self.label_to_code = dict(zip(labels, codes))
+        # labels of more than one code, e.g. two codes of an old & a new classification
+        self.shared_labels = {label for label, count in Counter(labels).items() if count > 1}
+
+    def __len__(self):
+        return len(self.codes)
+
+    def label(self, code):
+        """Returns the label of a code (or the code itself if it is unknown)"""
+        return self.code_to_label.get(code, code)
+
+    def code(self, label):
+        """Returns the code of a label (or None if it is unknown)"""
+        return self.label_to_code.get(label)
+
+    def has_code(self, code):
+        return code in self.code_to_label
+
+    def has_unique_label(self, code):
+        """True if no other code has the label of this code"""
+        return self.label(code) not in self.shared_labels
+
+
+class DimensionIndex:
+    def __init__(self, dimensions):
+        """
+        Args:
+            dimensions (list): Dimension objects in the order of the dataset
+        """
+        self.dimensions = {dim.name: dim for dim in dimensions}
+        # the format returned by EurostatDataLoader.get_dimensions, built only once
+        self._as_dict = {
+            dim.name: {"codes": dim.codes, "labels": dim.labels}
+            for dim in dimensions
+        }
+
+    @classmethod
+    def from_jsonstat(cls, data):
+        """Builds the index from the JSON returned by the Eurostat API"""
+        if 'dimension' not in data:
+            raise Exception("Invalid data format: 'dimension' not found.")
+
+        # order of dimensions to keep order
+        if 'id' in data['dimension']:
+            dim_order = data['dimension']['id']
+        else:
+            dim_order = list(data['dimension'].keys())
+
+        dimensions = []
+        for dim in dim_order:
+            if dim in ['id', 'size']:
+                continue
+            category = data['dimension'][dim]['category']
+            index = category['index']
+            if isinstance(index, list):
+                codes = list(index)
+            else:
+                codes = [code for code, _ in sorted(index.items(), key=lambda x: x[1])]
+            labels = [category.get('label', {}).get(code, code) for code in codes]
+            dimensions.append(Dimension(dim, codes, labels))
+        return cls(dimensions)
+
+    @classmethod
+    def from_json(cls, payload):
+        """Reads an index written by to_json"""
+        return cls([Dimension(name, dim["codes"], dim["labels"]) for name, dim in json.loads(payload).items()])
+
+    def to_json(self):
+        return json.dumps(self._as_dict)
+
+    def __contains__(self, name):
+        return name in self.dimensions
+
+    def __getitem__(self, name):
+        return self.dimensions[name]
+
+    def names(self):
+        return list(self.dimensions.keys())
+
+    def sizes(self):
+        return [len(dim) for dim in self.dimensions.values()]
+
+    def as_dict(self):
+        """
+        Returns {dim: {"codes": [...], "labels": [...]}}.
+        The dict is shared, so it must not be changed by the caller.
+        """
+        return self._as_dict
+
+    def select(self, filters):
+        """
+        Returns the index of a filtered request, like {'geo': ['DE', 'FR']}: the filtered dimensions
+        only keep the requested codes (in the order of the dataset), the others are kept as they are
+        """
+        dimensions = []
+        for name, dim in self.dimensions.items():
+            if name in filters:
+                wanted = set(filters[name])
+                selected = [(code, label) for code, label in zip(dim.codes, dim.labels) if code in wanted]
+                dim = Dimension(name, [code for code, _ in selected], [label for _, label in selected])
+            dimensions.append(dim)
+        return DimensionIndex(dimensions)
+
+    def unknown_values(self, filters):
+        """
+        Checks request filters like {'geo': ['DE', 'XX'], 'time': '2020'} against the index
+
+        Returns:
+            dict: The codes that don't exist in the dataset per dimension, e.g. {'geo': ['XX']}
+        """
+        unknown = {}
+        for name, values in (filters or {}).items():
+            if name not in self.dimensions:
+                continue
+            values = values if isinstance(values, (list, tuple, set)) else [values]
+            missing = [v for v in values if not self.dimensions[name].has_code(str(v))]
+            if missing:
+                unknown[name] = missing
+        return unknown
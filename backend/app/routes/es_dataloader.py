@@ -1,50 +1,153 @@
+import hashlib
+import json
 import os
-import pickle
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 import requests
+from requests.adapters import HTTPAdapter
+import numpy as np
 import pandas as pd
-import itertools
-from datetime import datetime
+
+from .columnar_store import ColumnarStore
+from .dataset_store import DatasetStore, make_cache_key, parse_cache_key
+from .dimension_index import DimensionIndex
+from .frame_cache import FrameCache, protect_frame
+from .singleflight import SingleFlight, file_lock
 
 """
 !! DISCLAIMER !!
 This class has been created with the help of AI.
 """
 
-def _make_hashable(obj):
-    """Unfortunately lists are not hashable in python, so we need to convert them to tuples"""
-    if isinstance(obj, list):
-        return tuple(_make_hashable(item) for item in obj)
-    elif isinstance(obj, dict):
-        return tuple((k, _make_hashable(v)) for k, v in sorted(obj.items()))
+def _decode_values(value, total):
+    """
+    Decodes the JSON-stat 'value' field (dict or list form) into two numpy arrays:
+    the sorted flat indices of the cells that are present and their values
+    """
+    if isinstance(value, dict):
+        positions = np.fromiter((int(k) for k in value.keys()), dtype=np.int64, count=len(value))
+        values = list(value.values())
     else:
-        return obj
+        positions = np.fromiter((i for i, v in enumerate(value) if v is not None), dtype=np.int64)
+        values = [value[i] for i in positions]
+
+    values = np.asarray(values) if values else np.empty(0)
+    if values.dtype == object:
+        values = values.astype(float)
+
+    # the api sends the keys in order, but sort just in case
+    if len(positions) > 1 and np.any(positions[1:] < positions[:-1]):
+        order = np.argsort(positions, kind='stable')
+        positions, values = positions[order], values[order]
+
+    # cells outside of the cube are ignored
+    in_range = positions < total
+    if not in_range.all():
+        positions, values = positions[in_range], values[in_range]
+
+    return positions, values
+
+EUROSTAT_API_URL = "https://ec.europa.eu/eurostat/api/dissemination/statistics/1.0/data"
+
+# status codes that are worth another try (rate limit & temporary server errors)
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# dimensions whose codes are a column of the parsed df as well (see parse_data)
+CODE_COLUMNS = {'geo': 'geo_code'}
+
+class _DatasetEntry:
+    """A payload of the cache together with its metadata, the JSON is only parsed when needed"""
+    def __init__(self, cache_key, payload, fetched_at, version):
+        self.cache_key = cache_key
+        self.payload = payload
+        self.fetched_at = fetched_at
+        self.version = version
+        self._data = None
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = json.loads(self.payload)
+        return self._data
+
+def validator_headers(cached):
+    """The headers of a conditional request for an expired entry of the store (None -> no headers)"""
+    headers = {}
+    if cached is not None:
+        if cached.etag:
+            headers['If-None-Match'] = cached.etag
+        if cached.last_modified:
+            headers['If-Modified-Since'] = cached.last_modified
+    return headers
+
+def _make_session(pool_size):
+    """Creates a keep-alive session, so the TLS connections to Eurostat are reused"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Accept-Encoding": "gzip, deflate", "Accept": "application/json"})
+    return session
 
 class EurostatDataLoader:
-    def __init__(self, cache_file='eurostat_cache.pkl', cache_expiry=3600):
+    def __init__(self, cache_file='eurostat_cache.sqlite3', cache_expiry=3600, frame_cache_bytes=256 * 1024 * 1024, max_workers=4,
+                 timeout=(5, 60), max_retries=3, retry_backoff=0.5, stale_grace=3600, base_url=None):
         """
         Initializes the loader
         
         Args:
-            cache_file (str): Path to the cache file
+            cache_file (str): Path to the cache file (SQLite database, shared by all workers).
+                The parsed datasets are stored next to it in <cache_file>.columns (needs pyarrow)
             cache_expiry (int): Cache expiry time in seconds (default: 1 hour)
+            frame_cache_bytes (int): Memory budget for the parsed dfs kept in memory (default: 256 MB)
+            max_workers (int): Max number of datasets loaded at the same time by load_many (default: 4)
+            timeout (tuple): (connect, read) timeout in seconds for every call to Eurostat (default: 5s, 60s)
+            max_retries (int): How often a failed call is retried (default: 3)
+            retry_backoff (float): Base of the exponential backoff between retries in seconds (default: 0.5)
+            stale_grace (int): Seconds after the expiry in which the expired data is still returned
+                while it is refreshed in the background (default: 1 hour, 0 turns it off).
+                Older data is always refreshed before it is returned.
+            base_url (str): URL of the data endpoint of the API, e.g. of a local stand-in server
+                (default: EUROSTAT_API_URL from the environment or the real Eurostat API)
         """
         self.cache_file = cache_file
         self.cache_expiry = cache_expiry # seconds
-        self.cache = {}
-        self._load_cache()
-    
-    def _load_cache(self):
-        """Loads cached data from disk if available"""
-        if os.path.exists(self.cache_file):
-            with open(self.cache_file, 'rb') as f:
-                self.cache = pickle.load(f)
-        else:
-            self.cache = {}
-    
-    def _save_cache(self):
-        """Saves the current cache to disk as a python pickle (.pkl) file"""
-        with open(self.cache_file, 'wb') as f:
-            pickle.dump(self.cache, f)
+        self.base_url = (base_url or os.environ.get('EUROSTAT_API_URL') or EUROSTAT_API_URL).rstrip('/')
+        self.store = DatasetStore(cache_file)
+        self.columns = ColumnarStore(f"{cache_file}.columns")
+        self.frames = FrameCache(frame_cache_bytes)
+        self.dimension_indexes = {} # cache key -> (DimensionIndex, fetched_at, version)
+        self.slice_sources = {} # cache key of a sliced df -> (cache key, params) of the df it was cut from
+        self.derived = {} # (cache key, builder) -> (version, result of the builder)
+        self.max_workers = max_workers
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.session = _make_session(max(10, max_workers))
+        # only one upstream call per key at a time: threads of this process & other processes
+        self._flights = SingleFlight()
+        self.lock_dir = f"{cache_file}.locks"
+        # stale-while-revalidate
+        self.stale_grace = stale_grace
+        self._refreshing = set()
+        self._refresh_lock = threading.Lock()
+        self._background_pool = None
+        # versions of the datasets used by the current request (see record_versions)
+        self._local = threading.local()
+
+    def _freshness(self, fetched_at):
+        """Returns 'fresh', 'stale' (expired, but within the grace period) or 'expired'"""
+        age = time.time() - fetched_at
+        if age < self.cache_expiry:
+            return 'fresh'
+        if age < self.cache_expiry + self.stale_grace:
+            return 'stale'
+        return 'expired'
     
     def fetch_dataset(self, dataset_code, params=None):
         """
@@ -57,82 +160,159 @@ class EurostatDataLoader:
         Returns:
             dict: The JSON data returned by the API :D
         """
+        return self._fetch_entry(dataset_code, params).data
+
+    def _fetch_entry(self, dataset_code, params=None):
+        """
+        Same as fetch_dataset, but returns a _DatasetEntry with the raw payload,
+        the unix timestamp of the download and the version of the payload
+        """
         if params is None:
             params = {'format': 'json'}
         else:
             params.setdefault('format', 'json')
         
-        # generating the hashed key for the cache
-        # TODO: make this more robust / maybe use a string hash idk
-        hashable_params = _make_hashable(params) # example: (('format', 'json'), ('time', ('2019', '2020')))
-        cache_key = (dataset_code, frozenset(hashable_params)) # example: ('ilc_mddw06', frozenset({('time', ('2019', '2020')), ('format', 'json')}))
-        print(hashable_params)
-        print(cache_key)
-        now = datetime.now()
+        # stable string key for the cache, example: 'crim_off_cat?format=json&time=2019&time=2020'
+        cache_key = make_cache_key(dataset_code, params)
         
         # when data is already in cache and not expired return it instead of fetching it again
-        if cache_key in self.cache:
-            cached_response, timestamp = self.cache[cache_key]
-            if (now - timestamp).total_seconds() < self.cache_expiry:
-                return cached_response
+        cached = self.store.get(cache_key)
+        if cached is not None:
+            freshness = self._freshness(cached.fetched_at)
+            if freshness != 'expired':
+                if freshness == 'stale':
+                    self._refresh_in_background(dataset_code, params, cache_key)
+                return _DatasetEntry(cache_key, cached.payload, cached.fetched_at, cached.version)
         
-        url = f"https://ec.europa.eu/eurostat/api/dissemination/statistics/1.0/data/{dataset_code}"
-        response = requests.get(url, params=params)
+        # the other threads asking for the same key wait for this one
+        return self._flights.do(cache_key, lambda: self._download_entry(dataset_code, params, cache_key))
+
+    def _download_entry(self, dataset_code, params, cache_key):
+        """
+        Downloads an entry while holding the lock file of the key, so only one process
+        of this host calls Eurostat for it. The others find the fresh entry in the store afterwards.
+        """
+        with file_lock(self.lock_dir, cache_key):
+            now = time.time()
+            cached = self.store.get(cache_key)
+            if cached is not None and now - cached.fetched_at < self.cache_expiry:
+                return _DatasetEntry(cache_key, cached.payload, cached.fetched_at, cached.version)
+
+            response = self._request(dataset_code, params, cached)
+            return self._entry_from_response(dataset_code, cache_key, cached, response, now)
+
+    def _entry_from_response(self, dataset_code, cache_key, cached, response, now):
+        """
+        Turns the answer of Eurostat into an entry and writes it to the store
+
+        Args:
+            cached: The expired entry of the store (or None) whose validators were sent
+            response: The response of the call, anything with status_code, content & headers
+            now (float): Unix timestamp of the download
+        """
+        # expired entry, but Eurostat says it has not changed -> keep it & only update the timestamp
+        if response.status_code == 304 and cached is not None:
+            self.store.touch(cache_key, now)
+            known = self.dimension_indexes.get(cache_key)
+            if known is not None and known[2] == cached.version:
+                self.dimension_indexes[cache_key] = (known[0], now, cached.version)
+            return _DatasetEntry(cache_key, cached.payload, now, cached.version)
+
         if response.status_code == 200:
-            data = response.json()
-            # update the cache
-            self.cache[cache_key] = (data, now)
-            self._save_cache()
-            return data
+            # the version changes only when the content changes
+            version = hashlib.sha1(response.content).hexdigest()[:16]
+            entry = _DatasetEntry(cache_key, response.content, now, version)
+            index = self._index_of(entry)
+            # update the cache, only this entry is written
+            self.store.put(
+                cache_key, dataset_code, response.content, version, index.to_json(), now,
+                etag=response.headers.get('ETag'),
+                last_modified=response.headers.get('Last-Modified')
+            )
+            return entry
         else:
             raise Exception(f"Error fetching dataset {dataset_code}: {response.status_code}")
+
+    def _request(self, dataset_code, params, cached=None):
+        """
+        Calls the Eurostat API with a timeout and retries failed calls with exponential backoff & jitter.
+        If an expired entry is given, its validators are sent, so Eurostat can answer with 304 Not Modified.
+        """
+        url = f"{self.base_url}/{dataset_code}"
+        headers = validator_headers(cached)
+
+        for attempt in range(self.max_retries + 1):
+            last_try = attempt == self.max_retries
+            try:
+                response = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if last_try:
+                    raise Exception(f"Error fetching dataset {dataset_code}: {e}")
+            else:
+                if response.status_code not in RETRY_STATUS_CODES or last_try:
+                    return response
+            # full jitter, so the workers don't retry all at the same time
+            time.sleep(random.uniform(0, self.retry_backoff * 2 ** attempt))
+
+    def _index_of(self, entry):
+        """Returns the dimension index of an entry, built only once per version and kept in memory"""
+        known = self.dimension_indexes.get(entry.cache_key)
+        if known is not None and known[2] == entry.version:
+            index = known[0]
+        else:
+            index = DimensionIndex.from_jsonstat(entry.data)
+        self.dimension_indexes[entry.cache_key] = (index, entry.fetched_at, entry.version)
+        return index
     
-    def parse_data(self, data):
+    def parse_data(self, data, sparse=False, index=None):
         """
         Parses the JSON data into a pandas df.
+
+        Only the cells present in data['value'] are decoded. Their flat indices are
+        mapped to per-dimension positions with numpy (unravel against the dimension
+        sizes) and the df is built column by column, so we never build the python
+        tuples for every possible combination of the dimensions.
         
         Args:
             data (dict): The JSON data from the Eurostat API
+            sparse (bool): Only return rows for cells that have a value (default: False,
+                which returns every combination with NaN for the empty cells)
+            index (DimensionIndex): Dimension index of the data, built from the data if not given
             
         Returns:
             pd.DataFrame
         """
 
-        if 'dimension' not in data:
-            raise Exception("Invalid data format: 'dimension' not found.")
-        
-        # order of dimensions to keep order
-        if 'id' in data['dimension']:
-            dim_order = data['dimension']['id']
-        else:
-            dim_order = list(data['dimension'].keys())
+        if index is None:
+            index = DimensionIndex.from_jsonstat(data)
 
-        # create a dict with all possible values for each dimension
-        dim_values = {}
-        geo_map = {}
-        for dim in dim_order:
-            if dim in ['id', 'size']:
-                continue
-            category = data['dimension'][dim]['category']
-            sorted_categories = sorted(category['index'].items(), key=lambda x: x[1])
-            
-            if dim == "geo":
-                labels = [category['label'].get(k, k) for k, _ in sorted_categories]
-                dim_values[dim] = labels
-                geo_map = dict(zip(labels, [k for k, _ in sorted_categories]))
-            else:
-                dim_values[dim] = [category['label'].get(k, k) for k, _ in sorted_categories]
+        # the labels of each dimension (ordered by their position)
+        dim_values = {name: index[name].labels for name in index.names()}
+        geo_map = index['geo'].label_to_code if 'geo' in index else {}
+
+        sizes = [len(labels) for labels in dim_values.values()]
+        total = int(np.prod(sizes, dtype=np.int64))
+
+        positions, values = _decode_values(data.get('value', {}), total)
 
-        # this gets us all possible combinations of the dimensions
-        all_combinations = list(itertools.product(*[dim_values[dim] for dim in dim_values]))
+        if sparse:
+            flat_index = positions
+        else:
+            # every combination is returned, the missing cells stay NaN
+            flat_index = np.arange(total, dtype=np.int64)
+            if len(positions) != total:
+                dense_values = np.full(total, np.nan)
+                dense_values[positions] = values
+                values = dense_values
 
-        # get the values for each combination
-        values = []
-        for idx in range(len(all_combinations)):
-            values.append(data['value'].get(str(idx), None))
+        # flat index -> position in each dimension (last dimension changes fastest)
+        coords = np.unravel_index(flat_index, sizes) if sizes else ()
 
-        # create a DataFrame from the data
-        df = pd.DataFrame(all_combinations, columns=list(dim_values.keys()))
+        # create a DataFrame from the data, one column per dimension
+        columns = {}
+        for (dim, labels), coord in zip(dim_values.items(), coords):
+            columns[dim] = np.asarray(labels, dtype=object)[coord]
+        df = pd.DataFrame(columns, columns=list(dim_values.keys()))
         df['value'] = values
 
         # Falls die Dimension geo existiert, füge eine extra Spalte "geo_code" hinzu
@@ -142,7 +322,7 @@ class EurostatDataLoader:
         return df
 
 
-    def load_dataset(self, dataset_code, filters=None, dimensions=None):
+    def load_dataset(self, dataset_code, filters=None, dimensions=None, time=None):
         """
         Loads and parses a dataset from Eurostat, with optional filtering.
         
@@ -150,6 +330,8 @@ class EurostatDataLoader:
             dataset_code (str): The Eurostat dataset code.
             filters (dict): Additional query params like {'time': ['2019', '2020'], 'geo': 'EU27_2020'}.
             dimensions (list): List of dimensions to be included in the resulting df
+            time (list): Only return these time periods, e.g. ['2020']. Unlike filters this is not sent
+                to Eurostat, the periods are taken from the cached dataset (only their files are read)
             
         Returns:
             pd.DataFrame
@@ -157,11 +339,16 @@ class EurostatDataLoader:
         params = {'format': 'json'}
         if filters:
             params.update(filters)
-            
-        data = self.fetch_dataset(dataset_code, params)
-        df = self.parse_data(data)
+
+        cache_key = make_cache_key(dataset_code, params)
+        if time is None:
+            df = self._load_frame(dataset_code, params, cache_key)
+        else:
+            times = [str(t) for t in (time if isinstance(time, (list, tuple, set)) else [time])]
+            df = self._load_time_slice(dataset_code, params, cache_key, times)
         
         print(set(df.columns))
+        self._record_version(cache_key)
 
         # filter the dataset for the requested dimensions of diemensions parameter
         if dimensions:
@@ -171,31 +358,530 @@ class EurostatDataLoader:
             
         return df
 
+    def _load_frame(self, dataset_code, params, cache_key):
+        """Returns the whole df of a cache key: from memory, from the columnar store or parsed from the payload"""
+        # a df cut out of a bigger one is refreshed through the bigger one, see _load_slice
+        source = self.slice_sources.get(cache_key)
+        if source is not None:
+            return self._load_slice(dataset_code, cache_key, *source)
+
+        # already parsed dfs are kept in memory, so a warm request does no file I/O & no JSON parsing
+        cached = self.frames.get(cache_key)
+        freshness = self._freshness(cached[1]) if cached is not None else 'expired'
+        if freshness != 'expired':
+            if freshness == 'stale':
+                self._refresh_in_background(dataset_code, params, cache_key)
+            return cached[0]
+
+        # e.g. after a restart: the parsed df is still on disk
+        df = self._read_columns(dataset_code, params, cache_key)
+        if df is not None:
+            self.frames.put(cache_key, df, *self._known_version(cache_key))
+            return protect_frame(df)
+
+        # a filtered request can often be cut out of a dataset we already have
+        df = self._slice_from_superset(dataset_code, params, cache_key)
+        if df is not None:
+            return df
+
+        return self._frame_from_entry(cache_key, self._fetch_entry(dataset_code, params), cached)
+
+    def _load_slice(self, dataset_code, cache_key, source_key, source_params):
+        """
+        Returns a df that was cut out of a bigger one. It has the fetched_at & version of the bigger df,
+        so when it gets stale only the bigger df is refreshed and the slice is cut again from the new one
+        (and not downloaded on its own, that would be one call to Eurostat per filter).
+        """
+        cached = self.frames.get(cache_key)
+        known = self.dimension_indexes.get(source_key)
+        if cached is not None and known is not None and known[2] == cached[2]:
+            if known[1] > cached[1]:
+                # the bigger df was revalidated (304) since, the slice is as new as it is
+                self.frames.touch(cache_key, known[1])
+                cached = (cached[0], known[1], cached[2])
+            freshness = self._freshness(cached[1])
+            if freshness != 'expired':
+                if freshness == 'stale':
+                    self._refresh_in_background(dataset_code, source_params, source_key)
+                return cached[0]
+
+        # new version, expired or no longer in memory -> cut it again
+        superset = self._load_frame(dataset_code, source_params, source_key)
+        index, fetched_at, version = self.dimension_indexes[source_key]
+        df = self._cut_slice(cache_key, superset, index, fetched_at, version, source_key, source_params)
+        if df is not None:
+            return df
+
+        # the new version can't answer the filters anymore (e.g. a code was removed) -> ask Eurostat
+        self.slice_sources.pop(cache_key, None)
+        return self._frame_from_entry(cache_key, self._fetch_entry(dataset_code, self._params_of(cache_key)))
+
+    @staticmethod
+    def _slice_filters(params):
+        """The filters of a request as {dimension: [codes]}"""
+        return {
+            name: [str(v) for v in (values if isinstance(values, (list, tuple, set)) else [values])]
+            for name, values in params.items() if name != 'format'
+        }
+
+    @staticmethod
+    def _params_of(cache_key):
+        """The request params of a cache key, single values are not in a list (like the params of load_dataset)"""
+        _, params = parse_cache_key(cache_key)
+        return {name: values[0] if len(values) == 1 else values for name, values in params.items()}
+
+    @staticmethod
+    def _sliceable(index, filters):
+        """
+        True if the rows of the filters can be found in a df with this index: every code must exist
+        (Eurostat answers unknown codes with an error, a slice would be an empty df) and, where the df
+        only holds the labels, the label of a code must not be shared with another code
+        """
+        for name, codes in filters.items():
+            if name not in index:
+                return False
+            dim = index[name]
+            if not all(dim.has_code(code) for code in codes):
+                return False
+            if name not in CODE_COLUMNS and not all(dim.has_unique_label(code) for code in codes):
+                return False
+        return True
+
+    def _cut_slice(self, cache_key, superset, index, fetched_at, version, source_key, source_params):
+        """
+        Cuts the rows of a filtered request out of a bigger df and caches them with the version
+        & the (selected) dimension index of the bigger df, so the responses built on it can be revalidated
+
+        Returns:
+            pd.DataFrame or None if the filters can't be answered from the df (see _sliceable)
+        """
+        filters = self._slice_filters(self._params_of(cache_key))
+        if not self._sliceable(index, filters):
+            return None
+
+        # the filters are codes, the df holds the labels (and the codes of geo in geo_code)
+        mask = np.ones(len(superset), dtype=bool)
+        for name, codes in filters.items():
+            if name in CODE_COLUMNS:
+                mask &= superset[CODE_COLUMNS[name]].isin(codes).to_numpy()
+            else:
+                mask &= superset[name].isin([index[name].label(code) for code in codes]).to_numpy()
+        df = superset[mask].reset_index(drop=True)
+
+        self.dimension_indexes[cache_key] = (index.select(filters), fetched_at, version)
+        self.slice_sources[cache_key] = (source_key, source_params)
+        self.frames.put(cache_key, df, fetched_at, version)
+        return protect_frame(df)
+
+    def _slice_from_superset(self, dataset_code, params, cache_key):
+        """
+        Answers a filtered request by slicing a cached df that contains all the requested rows
+        (the unfiltered dataset or one with wider filters), instead of asking Eurostat again.
+
+        Returns:
+            pd.DataFrame or None if there is no covering entry
+        """
+        filters = self._slice_filters(params)
+        if not filters:
+            return None
+
+        # 1. parsed dfs in memory
+        candidates = []
+        for key in self.frames.keys():
+            if key != cache_key and '#' not in key and self._covers(key, dataset_code, params, filters):
+                candidates.append(key)
+
+        # 2. the unfiltered dataset in the store (it covers every filter)
+        base_params = {'format': params.get('format', 'json')}
+        base_key = make_cache_key(dataset_code, base_params)
+        stored = None
+        if base_key not in candidates:
+            stored = self.store.get_dimensions(base_key)
+            if stored is not None and self._freshness(stored.fetched_at) != 'expired':
+                candidates.append(base_key)
+
+        for key in candidates:
+            # checked before the df is loaded: unknown codes & ambiguous labels go to Eurostat
+            known = self.dimension_indexes.get(key)
+            index = known[0] if known is not None else None
+            if index is None and key == base_key and stored is not None:
+                index = DimensionIndex.from_json(stored.payload)
+            if index is None:
+                continue
+            if not self._sliceable(index, filters):
+                return None
+
+            if key == base_key and key not in self.frames.keys():
+                superset = self._load_frame(dataset_code, base_params, base_key)
+                fetched_at, version = self._known_version(base_key)
+            else:
+                cached = self.frames.get(key)
+                if cached is None or self._freshness(cached[1]) == 'expired':
+                    continue
+                superset, fetched_at, version = cached
+
+            # a slice of a slice is refreshed through the df the first one was cut from
+            source_key, source_params = self.slice_sources.get(key, (key, self._params_of(key)))
+            df = self._cut_slice(cache_key, superset, self.dimension_indexes[key][0], fetched_at, version, source_key, source_params)
+            if df is not None:
+                return df
+
+        return None
+
+    @staticmethod
+    def _covers(key, dataset_code, params, filters):
+        """True if the entry of key contains every row of a request with these filters"""
+        code, key_params = parse_cache_key(key)
+        if code != dataset_code or key_params.pop('format', ['json']) != [params.get('format', 'json')]:
+            return False
+        for name, values in key_params.items():
+            if name not in filters or not set(filters[name]) <= set(values):
+                return False
+        return True
+
+    def _load_time_slice(self, dataset_code, params, cache_key, times):
+        """Returns only the rows of some time periods of a cache key"""
+        slice_key = f"{cache_key}#time={','.join(sorted(times))}"
+        current = self.dimension_indexes.get(cache_key)
+
+        cached = self.frames.get(slice_key)
+        if cached is not None and self._freshness(cached[1]) != 'expired' \
+                and (current is None or current[2] == cached[2]):
+            return cached[0]
+
+        # the whole dataset is in memory -> slice it
+        whole = self.frames.get(cache_key)
+        if whole is not None and self._freshness(whole[1]) != 'expired':
+            df, fetched_at, version = whole
+            df = df[df['time'].isin(times)].reset_index(drop=True)
+        else:
+            # only read the files of the requested periods
+            df = self._read_columns(dataset_code, params, cache_key, times)
+            if df is not None:
+                fetched_at, version = self._known_version(cache_key)
+            else:
+                df = self._load_frame(dataset_code, params, cache_key)
+                df = df[df['time'].isin(times)].reset_index(drop=True)
+                fetched_at, version = self._known_version(cache_key)
+
+        self.frames.put(slice_key, df, fetched_at, version)
+        return protect_frame(df)
+
+    def _known_version(self, cache_key):
+        """(fetched_at, version) of the newest payload of a key known to this process"""
+        known = self.dimension_indexes.get(cache_key)
+        return known[1], known[2]
+
+    def _read_columns(self, dataset_code, params, cache_key, times=None):
+        """Reads the parsed df of the current version from the columnar store (None if it isn't there)"""
+        if not self.columns.available:
+            return None
+        stored = self.store.get_dimensions(cache_key)
+        if stored is None:
+            return None
+        freshness = self._freshness(stored.fetched_at)
+        if freshness == 'expired' or not self.columns.has(cache_key, stored.version):
+            return None
+        if freshness == 'stale':
+            self._refresh_in_background(dataset_code, params, cache_key)
+
+        df = self.columns.read(cache_key, stored.version, times)
+        if df is not None:
+            known = self.dimension_indexes.get(cache_key)
+            if known is None or known[2] != stored.version:
+                self.dimension_indexes[cache_key] = (DimensionIndex.from_json(stored.payload), stored.fetched_at, stored.version)
+        return df
+
+    def _frame_from_entry(self, cache_key, entry, cached=None):
+        """Returns the parsed df of an entry and puts it into the frame cache (replacing the old df)"""
+        if cached is not None and cached[2] == entry.version:
+            # revalidated, the parsed df is still up to date
+            self.frames.touch(cache_key, entry.fetched_at)
+            return cached[0]
+        df = self.parse_data(entry.data, index=self._index_of(entry))
+        self.frames.put(cache_key, df, entry.fetched_at, entry.version)
+        # written in the background, the request does not wait for it
+        if self.columns.available and not self.columns.has(cache_key, entry.version):
+            self._run_in_background(self._write_columns, cache_key, entry.version, df)
+        return protect_frame(df)
+
+    def _write_columns(self, cache_key, version, df):
+        try:
+            self.columns.write(cache_key, version, df)
+        except Exception as e:
+            print(f"Writing {cache_key} to the columnar store failed: {e}")
+
+    def _run_in_background(self, fn, *args):
+        with self._refresh_lock:
+            if self._background_pool is None:
+                self._background_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='eurostat-background')
+        self._background_pool.submit(fn, *args)
+
+    def _refresh_in_background(self, dataset_code, params, cache_key):
+        """
+        Refreshes a stale entry in a background thread, the request that found it does not wait.
+        The new payload, dimension index & parsed df replace the old ones once they are ready.
+        """
+        with self._refresh_lock:
+            if cache_key in self._refreshing:
+                return
+            self._refreshing.add(cache_key)
+        self._run_in_background(self._refresh, dataset_code, dict(params), cache_key)
+
+    def _refresh(self, dataset_code, params, cache_key):
+        try:
+            entry = self._flights.do(cache_key, lambda: self._download_entry(dataset_code, params, cache_key))
+            self._index_of(entry)
+            # only parse it again if the df is used by this process
+            cached = self.frames.get(cache_key)
+            if cached is not None:
+                self._frame_from_entry(cache_key, entry, cached)
+        except Exception as e:
+            print(f"Background refresh of {cache_key} failed: {e}")
+        finally:
+            with self._refresh_lock:
+                self._refreshing.discard(cache_key)
+
+    def load_derived(self, dataset_code, builder, filters=None):
+        """
+        Returns a structure derived from a dataset (e.g. a precomputed aggregate cube), built only
+        once per dataset version. A new version (Eurostat updated the data) builds it again.
+
+        Args:
+            dataset_code (str): The Eurostat dataset code.
+            builder (callable): Gets the df of the dataset and returns the derived structure,
+                the result is shared between requests so it must not be changed
+            filters (dict): Additional query params, like in load_dataset
+
+        Returns:
+            The result of builder(df)
+        """
+        return self.load_combined([{'dataset_code': dataset_code, 'filters': filters}], builder)
+
+    def load_combined(self, datasets, builder):
+        """
+        Like load_derived, but for a structure built from several datasets (e.g. a panel joining them).
+        It is built again as soon as one of the datasets gets a new version.
+
+        Args:
+            datasets (list): The datasets in the format of load_many
+            builder (callable): Gets the loaded datasets (in the same order) as arguments
+
+        Returns:
+            The result of builder(*datasets)
+        """
+        jobs = self._jobs(datasets)
+        cache_keys = []
+        for job in jobs:
+            params = {'format': 'json'}
+            if job.get('filters'):
+                params.update(job['filters'])
+            cache_keys.append((job['dataset_code'], params, make_cache_key(job['dataset_code'], params)))
+        # time & dimensions change the df the builder gets, so they are part of the key (not of the version)
+        key = (
+            tuple(self._view_key(cache_key, job) for (_, _, cache_key), job in zip(cache_keys, jobs)),
+            f"{builder.__module__}.{builder.__qualname__}"
+        )
+
+        # built for the current versions already -> the datasets are not needed at all
+        known = [self.dimension_indexes.get(k) for _, _, k in cache_keys]
+        derived = self.derived.get(key)
+        if derived is not None and all(k is not None for k in known) and derived[0] == tuple(k[2] for k in known):
+            freshness = [self._freshness(k[1]) for k in known]
+            if 'expired' not in freshness:
+                for (dataset_code, params, cache_key), state in zip(cache_keys, freshness):
+                    if state == 'stale':
+                        self._refresh_in_background(dataset_code, params, cache_key)
+                    self._record_version(cache_key)
+                return derived[1]
+
+        inputs = self.load_many(jobs)
+        versions = tuple(self._known_version(k)[1] for _, _, k in cache_keys)
+        if any(k is not None and k[2] != version for k, version in zip(known, versions)):
+            # a version changed while the datasets were loaded, so we don't know which one they have
+            return builder(*inputs)
+
+        derived = self.derived.get(key)
+        if derived is not None and derived[0] == versions:
+            return derived[1]
+
+        result = self._flights.do(key + versions, lambda: builder(*inputs))
+        self.derived[key] = (versions, result)
+        return result
+
+    def load_many(self, datasets):
+        """
+        Loads several independent datasets at the same time (in a bounded thread pool),
+        so a cold request waits for the slowest dataset instead of the sum of all of them.
+
+        Args:
+            datasets (list): Dataset codes, (dataset_code, filters) tuples or dicts with the
+                arguments of load_dataset (or of load_derived if they have a builder), e.g.
+                ['tps00001', ('crim_off_cat', {'geo': ['DE']}), {'dataset_code': 'tec00115', 'time': ['2020']}]
+
+        Returns:
+            list: The dfs (or derived structures) in the same order as the datasets, e.g.
+                df_pop, df_crime = loader.load_many(['tps00001', 'crim_off_cat'])
+        """
+        jobs = self._jobs(datasets)
+        versions = getattr(self._local, 'versions', None)
+
+        def run(job):
+            # the pool threads record the versions for the request that started them
+            previous = getattr(self._local, 'versions', None)
+            self._local.versions = versions
+            try:
+                if 'builder' in job:
+                    return self.load_derived(**job)
+                return self.load_dataset(**job)
+            finally:
+                self._local.versions = previous
+
+        # nested calls (e.g. from a builder of load_combined) don't wait for their own pool
+        nested = threading.current_thread().name.startswith('eurostat-loader')
+        if len(jobs) <= 1 or nested:
+            return [run(job) for job in jobs]
+
+        pool = self._get_pool()
+        futures = [pool.submit(run, job) for job in jobs]
+        return [future.result() for future in futures]
+
+    @staticmethod
+    def _view_key(cache_key, job):
+        """
+        Key of the df a job of load_many gets: the cache key plus the time periods & dimensions it selects,
+        e.g. 'crim_off_cat?format=json#time=2019,2020#dimensions=geo,iccs'
+        """
+        key = cache_key
+        time = job.get('time')
+        if time is not None:
+            times = [str(t) for t in (time if isinstance(time, (list, tuple, set)) else [time])]
+            key += f"#time={','.join(sorted(times))}"
+        if job.get('dimensions'):
+            # in the given order, it is the order of the columns
+            key += f"#dimensions={','.join(job['dimensions'])}"
+        return key
+
+    @staticmethod
+    def _jobs(datasets):
+        """Turns the datasets of load_many into dicts with the arguments of load_dataset / load_derived"""
+        jobs = []
+        for dataset in datasets:
+            if isinstance(dataset, str):
+                jobs.append({'dataset_code': dataset})
+            elif isinstance(dataset, dict):
+                jobs.append(dataset)
+            else:
+                jobs.append(dict(zip(['dataset_code', 'filters'], dataset)))
+        return jobs
+
+    def _get_pool(self):
+        """Creates the thread pool on first use (and not when importing, so it works with forking servers)"""
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='eurostat-loader')
+        return self._pool
+
     def get_dimensions(self, dataset_code, filters=None):
         """
         Extracts & retrieves all dimensions from a Eurostat dataset.
+
+        Returns:
+            dict: {dim: {"codes": [...], "labels": [...]}}, shared between requests so don't change it
+        """
+        return self.get_dimension_index(dataset_code, filters).as_dict()
+
+    def get_dimension_index(self, dataset_code, filters=None):
+        """
+        Returns the DimensionIndex of a dataset (codes, labels & the maps between them).
+        Uses the index in memory or the one in the store, the payload is only loaded when both are expired.
         """
-        
         params = {'format': 'json'}
         if filters:
             params.update(filters)
-            
-        data = self.fetch_dataset(dataset_code, params)
-        dimensions = {}
-        if 'id' in data['dimension']:
-            dim_order = data['dimension']['id']
-        else:
-            dim_order = list(data['dimension'].keys())
-            
-        for dim in dim_order:
-            if dim in ['id', 'size']:
+
+        cache_key = make_cache_key(dataset_code, params)
+
+        known = self.dimension_indexes.get(cache_key)
+        if known is None or self._freshness(known[1]) == 'expired':
+            stored = self.store.get_dimensions(cache_key)
+            if stored is not None and self._freshness(stored.fetched_at) != 'expired':
+                known = (DimensionIndex.from_json(stored.payload), stored.fetched_at, stored.version)
+                self.dimension_indexes[cache_key] = known
+
+        if known is not None:
+            freshness = self._freshness(known[1])
+            if freshness == 'stale':
+                self._refresh_in_background(dataset_code, params, cache_key)
+            if freshness != 'expired':
+                self._record_version(cache_key)
+                return known[0]
+
+        index = self._index_of(self._fetch_entry(dataset_code, params))
+        self._record_version(cache_key)
+        return index
+
+    @contextmanager
+    def record_versions(self):
+        """
+        Collects the versions of all datasets loaded by this thread (and the pool threads it uses)
+        inside of the with block, e.g. to derive the ETag of a response from them.
+
+            with loader.record_versions() as versions:
+                df = loader.load_dataset('crim_off_cat')
+            versions -> {'crim_off_cat?format=json': '3f2a...'}
+        """
+        previous = getattr(self._local, 'versions', None)
+        versions = {}
+        self._local.versions = versions
+        try:
+            yield versions
+        finally:
+            self._local.versions = previous
+
+    def _record_version(self, cache_key):
+        versions = getattr(self._local, 'versions', None)
+        if versions is not None:
+            known = self.dimension_indexes.get(cache_key)
+            versions[cache_key] = known[2] if known is not None else None
+
+    def current_versions(self, cache_keys):
+        """
+        The versions of some cache keys that are still valid (not expired), without loading anything
+
+        Returns:
+            dict: {cache_key: version} or None if one of the keys is unknown or expired
+        """
+        versions = {}
+        for cache_key in cache_keys:
+            # a sliced df gets the version of the df it is cut from (see _load_slice)
+            source_key = self.slice_sources.get(cache_key, (cache_key,))[0]
+            known = self.dimension_indexes.get(source_key)
+            if known is not None and self._freshness(known[1]) != 'expired':
+                versions[cache_key] = known[2]
                 continue
-            dim_info = data['dimension'][dim]
-            dimensions[dim] = {
-                "codes": list(dim_info["category"]["index"].keys()),
-                "labels": [dim_info["category"]["label"].get(code, code) for code in dim_info["category"]["index"].keys()]
-            }
-        return dimensions
+            stored = self.store.get_dimensions(source_key)
+            if stored is None or self._freshness(stored.fetched_at) == 'expired':
+                return None
+            versions[cache_key] = stored.version
+        return versions
+
+_shared_loader = None
+_shared_loader_lock = threading.Lock()
+
+def get_loader():
+    """
+    Returns the loader shared by all requests of this process (created on first use).
+    The memory budget of its frame cache can be set with EUROSTAT_FRAME_CACHE_MB.
+    """
+    global _shared_loader
+    if _shared_loader is None:
+        with _shared_loader_lock:
+            if _shared_loader is None:
+                frame_cache_mb = int(os.environ.get('EUROSTAT_FRAME_CACHE_MB', '256'))
+                _shared_loader = EurostatDataLoader(frame_cache_bytes=frame_cache_mb * 1024 * 1024)
+    return _shared_loader
 
 if __name__ == '__main__':
     loader = EurostatDataLoader(cache_expiry=1800)
@@ -0,0 +1,35 @@
+from app import cache
+from .chart_response import ChartResponse
+from .es_dataloader import get_loader
+
+"""
+Endpoints with only the filter options (interactive_data) of a chart.
+
+Every chart gets <chart>/filters next to it, e.g. /api/question1/chart1/filters.
+The frontend can fetch the options once and then request the chart with ?interactive_data=0,
+so a changed filter only costs the chart_data. The options are built from the dimension index
+of the datasets, so the cached response is revalidated with the dataset versions like a chart.
+"""
+
+
+def add_filters_endpoint(blueprint, chart, build, params=None, timeout=1800):
+    """
+    Adds <chart>/filters to a blueprint
+
+    Args:
+        blueprint (Blueprint): The blueprint of the question
+        chart (str): Rule of the chart, e.g. '/chart1'
+        build (callable): Gets the loader and returns the interactive_data of the chart,
+            it may read the request params declared in params (e.g. the selected year as default)
+        params (dict): The query params read by build, see ResponseCache.cached
+        timeout (int): Seconds the response stays valid
+    """
+    def filters():
+        return ChartResponse(interactive_data=build(get_loader())).to_response()
+
+    endpoint = f"{chart.strip('/')}_filters"
+    filters.__name__ = endpoint
+    blueprint.add_url_rule(
+        f"{chart}/filters", endpoint=endpoint, methods=['GET'],
+        view_func=cache.cached(timeout=timeout, params=params)(filters)
+    )
@@ -0,0 +1,116 @@
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+"""
+In-memory LRU cache for already parsed datasets (pandas DataFrames).
+The cache is bounded by the memory used by the cached frames, not by the number of entries.
+"""
+
+
+def _pandas_major():
+    return int(pd.__version__.split('.')[0])
+
+
+def enable_copy_on_write():
+    """
+    Turns on pandas Copy-on-Write (always on since pandas 3.0).
+    With Copy-on-Write a shallow copy of a cached frame can be handed out safely,
+    every write on it copies the touched data first.
+    """
+    if _pandas_major() == 2:
+        pd.set_option("mode.copy_on_write", True)
+
+
+def _copy_on_write_enabled():
+    if _pandas_major() >= 3:
+        return True
+    try:
+        return pd.get_option("mode.copy_on_write") is True
+    except Exception:
+        return False
+
+
+def protect_frame(df):
+    """
+    Returns a copy of a (cached) df that can be changed without changing the original.
+    With Copy-on-Write a shallow copy is enough, otherwise we have to copy the data.
+    """
+    return df.copy(deep=not _copy_on_write_enabled())
+
+
+def frame_nbytes(df):
+    """Memory used by a df in bytes (including the python strings of object columns)"""
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+class FrameCache:
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        """
+        Initializes the cache
+
+        Args:
+            max_bytes (int): Memory budget for all cached frames together (default: 256 MB)
+        """
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries = OrderedDict() # key -> (df, fetched_at, version, nbytes)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Returns (df, fetched_at, version) for the key or None.
+        The df is a protected copy, changing it does not change the cached frame.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+        df, fetched_at, version, _ = entry
+        return protect_frame(df), fetched_at, version
+
+    def touch(self, key, fetched_at):
+        """Updates the download time of an entry whose payload did not change"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries[key] = (entry[0], fetched_at, entry[2], entry[3])
+
+    def put(self, key, df, fetched_at, version=None):
+        """Adds a frame and evicts the least recently used ones until the budget fits again"""
+        nbytes = frame_nbytes(df)
+        if nbytes > self.max_bytes:
+            # would evict everything else, so we don't cache it at all
+            self.pop(key)
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[3]
+            self._entries[key] = (df, fetched_at, version, nbytes)
+            self.current_bytes += nbytes
+            while self.current_bytes > self.max_bytes and self._entries:
+                _, (_, _, _, evicted_bytes) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_bytes
+
+    def pop(self, key):
+        """Removes a single entry"""
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[3]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def keys(self):
+        """Snapshot of the cached keys (most recently used last)"""
+        with self._lock:
+            return list(self._entries.keys())
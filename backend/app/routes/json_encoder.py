@@ -0,0 +1,118 @@
+import json
+import uuid
+
+import numpy as np
+import pandas as pd
+from flask import Response, jsonify
+
+try:
+    import orjson
+except ImportError: # optional, without orjson the responses are encoded by flask.jsonify
+    orjson = None
+
+"""
+Fast JSON encoding of the chart responses.
+
+With orjson the responses are encoded in C, NumPy arrays & scalars are supported natively and
+NaN / inf become null (the stdlib encoder writes NaN, which is not valid JSON).
+DataFrames can be passed as they are: a df at the top level of the response is written as a list
+of records from its columns (see records_json). The keys are sorted like flask.jsonify does it.
+Every float is written by orjson (shortest repr that reads back as the same float), so a value
+is encoded the same way no matter where it is in the response.
+Already encoded JSON (e.g. the cached body of a chart) can be embedded anywhere with raw_json.
+"""
+
+# options of every orjson.dumps of the responses
+ORJSON_OPTIONS = orjson.OPT_SORT_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS if orjson else None
+
+
+def _default(obj):
+    """Types orjson can't encode by itself"""
+    if isinstance(obj, pd.DataFrame):
+        return obj.to_dict(orient='records')
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return obj.tolist()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+class RawJSON:
+    def __init__(self, body):
+        """JSON bytes that are inserted into the output as they are"""
+        self.body = body
+
+
+def raw_json(body):
+    """
+    Wraps encoded JSON so it can be part of a response without decoding it
+    (decoded if orjson is missing, the fallback encoder can't insert raw JSON)
+    """
+    if orjson is None:
+        return json.loads(body)
+    return RawJSON(body)
+
+
+def records_json(df):
+    """
+    Encodes a df as a JSON list of records (keys sorted, NaN as null), with the same float encoding
+    as the rest of the response. The rows are zipped from the columns (tolist is done in C per column),
+    which is a lot faster than df.to_dict(orient='records').
+    """
+    columns = sorted(df.columns)
+    values = [df[column].tolist() for column in columns]
+    return orjson.dumps([dict(zip(columns, row)) for row in zip(*values)], default=_default, option=ORJSON_OPTIONS)
+
+
+def encode(obj):
+    """
+    Encodes a response to JSON bytes
+
+    Args:
+        obj (dict): The response, the values may be DataFrames, NumPy arrays ...
+
+    Returns:
+        bytes
+    """
+    # the dfs at the top level are replaced by placeholders & inserted as raw JSON afterwards
+    frames = {}
+    if isinstance(obj, dict):
+        obj = dict(obj)
+        for key, value in obj.items():
+            if isinstance(value, pd.DataFrame):
+                placeholder = f"__dataframe_{uuid.uuid4().hex}__"
+                frames[placeholder] = value
+                obj[key] = placeholder
+
+    # raw JSON (anywhere in obj) is replaced by placeholders as well
+    fragments = {}
+
+    def default(value):
+        if isinstance(value, RawJSON):
+            placeholder = f"__raw_json_{uuid.uuid4().hex}__"
+            fragments[placeholder] = value.body
+            return placeholder
+        return _default(value)
+
+    body = orjson.dumps(obj, default=default, option=ORJSON_OPTIONS)
+    for placeholder, df in frames.items():
+        body = body.replace(f'"{placeholder}"'.encode(), records_json(df), 1)
+    for placeholder, fragment in fragments.items():
+        body = body.replace(f'"{placeholder}"'.encode(), fragment, 1)
+    return body
+
+
+def json_response(obj, status=200):
+    """Returns a flask Response with obj encoded as JSON (with orjson if it is installed)"""
+    if orjson is None:
+        if isinstance(obj, dict):
+            obj = {
+                key: _default(value) if isinstance(value, (pd.DataFrame, pd.Series, np.ndarray)) else value
+                for key, value in obj.items()
+            }
+        response = jsonify(obj)
+        response.status_code = status
+        return response
+    return Response(encode(obj), status=status, mimetype='application/json')
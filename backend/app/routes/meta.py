@@ -0,0 +1,52 @@
+"""
+meta.py
+
+This file defines the metadata endpoints: the dimensions (codes & labels for the dropdowns)
+of the datasets used by the charts, together with their current version.
+"""
+
+from flask import Blueprint
+
+from app import cache
+from .dataset_store import make_cache_key
+from .es_dataloader import get_loader
+from .payload_formats import payload_response
+
+
+meta_bp = Blueprint('meta', __name__)
+
+# every dataset loaded by one of the chart endpoints
+CHART_DATASETS = [
+    'crim_off_cat',
+    'tps00001',
+    'tec00115',
+    'crim_gen_reg',
+    'crim_just_bri',
+    'crim_just_job',
+    'crim_just_sex',
+    'hlth_dhc130',
+]
+
+
+# List of the datasets
+@meta_bp.route('', methods=['GET'])
+def datasets():
+    return payload_response({"datasets": CHART_DATASETS})
+
+
+# Dimensions of a dataset, cached until the dataset gets a new version
+@meta_bp.route('/<dataset>', methods=['GET'])
+@cache.cached(timeout=1800)
+def dataset_meta(dataset):
+    if dataset not in CHART_DATASETS:
+        return payload_response({"error": f"Unknown dataset: {dataset}"}, status=404)
+
+    loader = get_loader()
+    dimensions = loader.get_dimensions(dataset)
+    versions = loader.current_versions([make_cache_key(dataset, {'format': 'json'})]) or {}
+
+    return payload_response({
+        "dataset": dataset,
+        "version": next(iter(versions.values()), None),
+        "dimensions": dimensions
+    })
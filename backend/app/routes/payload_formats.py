@@ -0,0 +1,225 @@
+import json
+
+import numpy as np
+import pandas as pd
+from flask import Response, request
+
+from .json_encoder import _default, encode, json_response, orjson
+
+try:
+    import msgpack
+except ImportError: # optional, without msgpack the format is not offered
+    msgpack = None
+
+try:
+    import pyarrow as pa
+except ImportError: # optional, without pyarrow the format is not offered
+    pa = None
+
+"""
+Compact payload formats of the chart responses.
+
+The JSON list of records repeats every key (geo, geo_code, crime_rate_per_100k ...) in every record.
+A client can ask for a column oriented payload instead, with ?format=<name> or the Accept header
+(?format= wins, the default stays the JSON of ChartResponse.to_json):
+
+    json      application/json                       the records as before
+    columns   application/vnd.chart-columns+json     tables as {"length": n, "columns": {name: [...]}}
+    msgpack   application/msgpack                    the same as "columns", encoded with MessagePack
+    arrow     application/vnd.apache.arrow.stream    chart_data as an Arrow IPC stream, the other keys
+                                                     are JSON in the metadata of the schema
+
+Only tables are changed: a DataFrame or a list of flat records at the top level of the response.
+Numeric columns are written as arrays, text columns are dictionary encoded
+({"dictionary": [distinct values], "codes": [position in dictionary, -1 for null]}).
+Other chart data (nested dicts like the pivot of question 1) is written as it is.
+
+With ?interactive_data=0 the filter options are left out of a chart response, a client that
+fetched them once from <chart>/filters only gets the chart_data when a filter changes.
+"""
+
+DEFAULT_FORMAT = 'json'
+
+# format name -> mimetype of the response
+FORMATS = {
+    'json': 'application/json',
+    'columns': 'application/vnd.chart-columns+json',
+    'msgpack': 'application/msgpack',
+    'arrow': 'application/vnd.apache.arrow.stream',
+}
+
+# mimetypes of the Accept header -> format name (the first one wins if the client has no preference)
+ACCEPT_MIMETYPES = {
+    'application/json': 'json',
+    'application/vnd.chart-columns+json': 'columns',
+    'application/msgpack': 'msgpack',
+    'application/x-msgpack': 'msgpack',
+    'application/vnd.apache.arrow.stream': 'arrow',
+}
+
+
+def available_formats():
+    """The formats that can be encoded with the installed packages"""
+    return [
+        name for name in FORMATS
+        if not (name == 'msgpack' and msgpack is None) and not (name == 'arrow' and pa is None)
+    ]
+
+
+def request_format():
+    """
+    The payload format asked for by the current request
+
+    Returns:
+        str: Name of the format or None if ?format= names a format that is unknown (or not installed)
+    """
+    formats = available_formats()
+    name = request.args.get('format')
+    if name is not None:
+        return name if name in formats else None
+    mimetypes = [mimetype for mimetype, name in ACCEPT_MIMETYPES.items() if name in formats]
+    best = request.accept_mimetypes.best_match(mimetypes, default=FORMATS[DEFAULT_FORMAT])
+    return ACCEPT_MIMETYPES[best]
+
+
+def request_includes_interactive_data():
+    """False if the current request asks to leave out the interactive_data (?interactive_data=0)"""
+    return request.args.get('interactive_data', '1').lower() not in ('0', 'false', 'no')
+
+
+def response_options():
+    """
+    The options of the current request that change the response without being params of a chart:
+    the payload format and ?interactive_data=0. Only the options that are not the default are returned.
+
+    Returns:
+        dict: {name: [value]}, e.g. {'format': ['arrow']}, or None if ?format= names an unknown format
+    """
+    payload_format = request_format()
+    if payload_format is None:
+        return None
+    options = {}
+    if payload_format != DEFAULT_FORMAT:
+        options['format'] = [payload_format]
+    if not request_includes_interactive_data():
+        options['interactive_data'] = ['0']
+    return options
+
+
+def as_table(value):
+    """Returns value as a DataFrame if it is a table (a df or a non-empty list of flat records), otherwise None"""
+    if isinstance(value, pd.DataFrame):
+        return value
+    if isinstance(value, list) and value and all(isinstance(record, dict) for record in value):
+        if all(not isinstance(v, (dict, list)) for record in value for v in record.values()):
+            return pd.DataFrame(value)
+    return None
+
+
+def columns_table(df):
+    """
+    A df as one array per column (sorted by name), text columns are dictionary encoded
+
+    Returns:
+        dict: {'length': number of rows, 'columns': {name: np.ndarray or {'dictionary': [...], 'codes': np.ndarray}}}
+    """
+    columns = {}
+    for name in sorted(df.columns):
+        column = df[name]
+        if pd.api.types.is_numeric_dtype(column) or pd.api.types.is_bool_dtype(column):
+            columns[name] = column.to_numpy()
+        else:
+            codes, dictionary = pd.factorize(column)
+            columns[name] = {'dictionary': np.asarray(dictionary, dtype=object), 'codes': codes}
+    return {'length': len(df), 'columns': columns}
+
+
+def _columnar(obj):
+    """Replaces the tables at the top level of a response by their columns"""
+    if not isinstance(obj, dict):
+        return obj
+    result = {}
+    for key, value in obj.items():
+        table = as_table(value)
+        result[key] = columns_table(table) if table is not None else value
+    return result
+
+
+def _json_bytes(obj):
+    if orjson is not None:
+        return encode(obj)
+    return json.dumps(obj, default=_default, sort_keys=True).encode()
+
+
+def _msgpack_default(obj):
+    if isinstance(obj, pd.DataFrame):
+        return columns_table(obj)
+    return _default(obj)
+
+
+def msgpack_body(obj):
+    """Encodes a response with MessagePack (tables as columns)"""
+    return msgpack.packb(_columnar(obj), default=_msgpack_default, use_bin_type=True)
+
+
+def arrow_body(obj):
+    """
+    Encodes a response as an Arrow IPC stream: the rows are chart_data (if it is a table),
+    the other keys of the response are JSON in the metadata of the schema
+    """
+    table = as_table(obj.get('chart_data'))
+    metadata = {}
+    if table is not None:
+        table = table[sorted(table.columns)]
+        arrow_table = pa.Table.from_pandas(table, preserve_index=False)
+        for i, field in enumerate(arrow_table.schema):
+            if pa.types.is_string(field.type) or pa.types.is_large_string(field.type):
+                arrow_table = arrow_table.set_column(i, field.name, arrow_table.column(i).dictionary_encode())
+    else:
+        arrow_table = pa.table({})
+        metadata['chart_data'] = _json_bytes(obj.get('chart_data'))
+    for key, value in obj.items():
+        if key != 'chart_data':
+            metadata[key] = _json_bytes(value)
+    arrow_table = arrow_table.replace_schema_metadata(metadata)
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, arrow_table.schema) as writer:
+        writer.write_table(arrow_table)
+    return sink.getvalue().to_pybytes()
+
+
+def payload_response(obj, status=200):
+    """
+    Returns a flask Response with obj in the format asked for by the request (JSON by default),
+    without the interactive_data if the request asks for it
+
+    Args:
+        obj (dict): The response, e.g. {'chart_data': df, 'interactive_data': {...}, 'error': None}
+        status (int): HTTP status
+
+    Returns:
+        Response: 400 with an error if ?format= names an unknown format
+    """
+    payload_format = request_format()
+    if payload_format is None:
+        return json_response({
+            "chart_data": None,
+            "interactive_data": None,
+            "error": f"Unknown format, use one of: {', '.join(available_formats())}"
+        }, status=400)
+
+    if isinstance(obj, dict) and not request_includes_interactive_data():
+        obj = {key: value for key, value in obj.items() if key != 'interactive_data'}
+
+    if payload_format == 'json':
+        response = json_response(obj, status)
+    elif payload_format == 'columns':
+        response = Response(_json_bytes(_columnar(obj)), status=status, mimetype=FORMATS['columns'])
+    elif payload_format == 'msgpack':
+        response = Response(msgpack_body(obj), status=status, mimetype=FORMATS['msgpack'])
+    else:
+        response = Response(arrow_body(obj), status=status, mimetype=FORMATS['arrow'])
+    # the format depends on the Accept header of the request
+    response.vary.add('Accept')
+    return response
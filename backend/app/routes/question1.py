@@ -9,7 +9,10 @@ from flask import Blueprint, request
 
 from app import cache
 from .chart_response import ChartResponse
-from .es_dataloader import EurostatDataLoader
+from .es_dataloader import get_loader
+from .filter_options import add_filters_endpoint
+from ..utils.crime_cube import CrimeCube
+from ..utils.per_capita_panel import load_panel
 from ..utils.preprocessing_question1 import (
     process_crime_data_chart1,
     process_crime_data_chart3,
@@ -38,6 +41,17 @@ def get_interactive_data(loader, dataset):
     }
 
 
+# Interactive data of chart 4 (the years of the panel)
+def get_interactive_data_chart4():
+    return {
+        "time": {
+            "values": [str(y) for y in range(2013, 2023)],
+            "multiple": False,
+            "default": "2015"
+        }
+    }
+
+
 # Get filters from the request parameters
 def get_filters():
     filters = {}
@@ -57,59 +71,64 @@ def get_filters():
 
 # Chart 1 endpoint
 @question1_bp.route('/chart1', methods=['GET'])
-@cache.cached(timeout=1800, query_string=True)
+@cache.cached(timeout=1800, params={'time': [], 'geo': []},
+              datasets=['crim_off_cat'])
 def chart1():
-    loader = EurostatDataLoader()
+    loader = get_loader()
     resp = ChartResponse()
     resp.set_interactive_data(get_interactive_data(loader, 'crim_off_cat'))
 
     try:
-        df = loader.load_dataset('crim_off_cat', filters=get_filters())
-        resp.set_chart_data(process_crime_data_chart1(df))
+        # answered from the precomputed cube of the whole dataset
+        cube = loader.load_derived('crim_off_cat', CrimeCube.from_frame)
+        filters = get_filters() or {}
+        resp.set_chart_data(process_crime_data_chart1(cube, filters.get('geo'), filters.get('time')))
     except Exception as e:
         resp.set_error(f"Error creating chart data: {e}")
 
-    return resp.to_json()
+    return resp.to_response()
 
 
 # Chart 3 endpoint
 @question1_bp.route('/chart3', methods=['GET'])
-@cache.cached(timeout=1800, query_string=True)
+@cache.cached(timeout=1800, params={'time': [], 'geo': []},
+              datasets=['crim_off_cat'])
 def chart3():
-    loader = EurostatDataLoader()
+    loader = get_loader()
     resp = ChartResponse()
     resp.set_interactive_data(get_interactive_data(loader, 'crim_off_cat'))
 
     try:
-        df = loader.load_dataset('crim_off_cat', filters=get_filters())
-        resp.set_chart_data(process_crime_data_chart3(df))
+        # answered from the precomputed cube of the whole dataset
+        cube = loader.load_derived('crim_off_cat', CrimeCube.from_frame)
+        filters = get_filters() or {}
+        resp.set_chart_data(process_crime_data_chart3(cube, filters.get('geo'), filters.get('time')))
     except Exception as e:
         resp.set_error(f"Error creating chart data: {e}")
 
-    return resp.to_json()
+    return resp.to_response()
 
 
 # Chart 4 endpoint
 @question1_bp.route('/chart4', methods=['GET'])
-@cache.cached(timeout=1800, query_string=True)
+@cache.cached(timeout=1800, params={'time': "2015"},
+              datasets=['tps00001', 'tec00115', 'crim_off_cat'])
 def chart4():
-    loader = EurostatDataLoader(cache_expiry=1800)
+    loader = get_loader()
 
     time_param = int(request.args.get('time', default="2015"))
-    df_pop = loader.load_dataset('tps00001')
-    df_crime = loader.load_dataset('crim_off_cat')
-
-    chart_data = process_crime_data_chart4(df_pop, df_crime, time_param)
+    chart_data = process_crime_data_chart4(load_panel(loader), time_param)
 
     response = ChartResponse(
         chart_data=chart_data,
-        interactive_data={
-            "time": {
-                "values": [str(y) for y in range(2013, 2023)],
-                "multiple": False,
-                "default": "2015"
-            }
-        }
+        interactive_data=get_interactive_data_chart4()
     )
 
-    return response.to_json() 
+    return response.to_response()
+
+
+# Filter options of the charts (<chart>/filters)
+add_filters_endpoint(question1_bp, '/chart1', lambda loader: get_interactive_data(loader, 'crim_off_cat'))
+add_filters_endpoint(question1_bp, '/chart3', lambda loader: get_interactive_data(loader, 'crim_off_cat'))
+add_filters_endpoint(question1_bp, '/chart4', lambda loader: get_interactive_data_chart4())
+
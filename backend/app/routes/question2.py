@@ -7,8 +7,9 @@ It might include generated or modified code.
 
 from flask import Blueprint, request
 
-from .es_dataloader import EurostatDataLoader
+from .es_dataloader import get_loader
 from .chart_response import ChartResponse
+from .filter_options import add_filters_endpoint
 from app import cache
 from ..utils.preprocessing_question2 import (
     get_chart1_data,
@@ -47,9 +48,10 @@ def filter_dataset(loader, filters):
 
 # Chart 1 endpoint
 @question2_bp.route('/chart1', methods=['GET'])
-@cache.cached(timeout=1800, query_string=True)
+@cache.cached(timeout=1800, params={'time': [], 'geo': None},
+              datasets=['crim_gen_reg'])
 def chart1():
-    loader = EurostatDataLoader()
+    loader = get_loader()
     resp = ChartResponse(chart_data=None)
 
     interactive_data = get_interactive_data(loader, 'crim_gen_reg',False)
@@ -73,14 +75,15 @@ def chart1():
     except Exception as e:
         resp.set_error(f"Failed to build chart data: {e}")
 
-    return resp.to_json()
+    return resp.to_response()
 
 
 # Chart 2 endpoint
 @question2_bp.route('/chart2', methods=['GET'])
-@cache.cached(timeout=1800, query_string=True)
+@cache.cached(timeout=1800, params={'time': [], 'geo': None},
+              datasets=['crim_gen_reg'])
 def chart2():
-    loader = EurostatDataLoader()
+    loader = get_loader()
     resp = ChartResponse(chart_data=None)
 
     interactive_data = get_interactive_data(loader, 'crim_gen_reg', True)
@@ -104,4 +107,9 @@ def chart2():
     except Exception as e:
         resp.set_error(f"Failed to build chart data: {e}")
 
-    return resp.to_json()
+    return resp.to_response()
+
+
+# Filter options of the charts (<chart>/filters)
+add_filters_endpoint(question2_bp, '/chart1', lambda loader: get_interactive_data(loader, 'crim_gen_reg', False))
+add_filters_endpoint(question2_bp, '/chart2', lambda loader: get_interactive_data(loader, 'crim_gen_reg', True))
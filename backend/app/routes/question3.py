@@ -7,8 +7,9 @@ It might include generated or modified code.
 
 from flask import Blueprint, request
 
-from .es_dataloader import EurostatDataLoader
+from .es_dataloader import get_loader
 from .chart_response import ChartResponse
+from .filter_options import add_filters_endpoint
 from app import cache
 from ..utils.preprocessing_question3 import (
     processing_data_for_q3
@@ -16,6 +17,9 @@ from ..utils.preprocessing_question3 import (
 
 question3_bp = Blueprint('question3', __name__)
 
+# query params of both charts (read by get_filters_from_request)
+Q3_PARAMS = {'time': [], 'geo': [], 'unit': "Number", 'legal_status': "PER_SUSP"}
+
 
 # Helper function to prepare interactive data for chart1
 def prepare_interactive_data_chart1(dims):
@@ -85,9 +89,10 @@ def get_filters_from_request():
 
 # Chart 1 Endpoint
 @question3_bp.route('/chart1', methods=['GET'])
-@cache.cached(timeout=1800, query_string=True)
+@cache.cached(timeout=1800, params=Q3_PARAMS,
+              datasets=['crim_just_bri'])
 def chart1():
-    loader = EurostatDataLoader()
+    loader = get_loader()
     resp = ChartResponse(chart_data=None)
 
     dims = loader.get_dimensions('crim_just_bri')
@@ -102,19 +107,20 @@ def chart1():
         df = processing_data_for_q3(df, unit)
 
         resp.set_chart_data(
-            df[["time", "geo", "geo_code", "value"]].to_dict(orient="records"))
+            df[["time", "geo", "geo_code", "value"]])
 
     except Exception as e:
         resp.set_error(f"Failed to build chart data: {e}")
 
-    return resp.to_json()
+    return resp.to_response()
 
 
 # Chart 5 Endpoint
 @question3_bp.route('/chart5', methods=['GET'])
-@cache.cached(timeout=1800, query_string=True)
+@cache.cached(timeout=1800, params=Q3_PARAMS,
+              datasets=['crim_just_bri'])
 def chart5():
-    loader = EurostatDataLoader()
+    loader = get_loader()
     resp = ChartResponse(chart_data=None)
 
     dims = loader.get_dimensions('crim_just_bri')
@@ -129,9 +135,16 @@ def chart5():
         df = processing_data_for_q3(df, unit)
 
         resp.set_chart_data(
-            df[["time", "geo", "geo_code", "value"]].to_dict(orient="records"))
+            df[["time", "geo", "geo_code", "value"]])
 
     except Exception as e:
         resp.set_error(f"Failed to build chart data: {e}")
 
-    return resp.to_json()
+    return resp.to_response()
+
+
+# Filter options of the charts (<chart>/filters)
+add_filters_endpoint(question3_bp, '/chart1',
+                     lambda loader: prepare_interactive_data_chart1(loader.get_dimensions('crim_just_bri')))
+add_filters_endpoint(question3_bp, '/chart5',
+                     lambda loader: prepare_interactive_data_chart5(loader.get_dimensions('crim_just_bri')))
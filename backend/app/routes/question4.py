@@ -7,8 +7,10 @@ It might include generated or modified code.
 
 from flask import Blueprint, request
 
-from .es_dataloader import EurostatDataLoader
+from .es_dataloader import get_loader
 from .chart_response import ChartResponse
+from .filter_options import add_filters_endpoint
+from ..utils.per_capita_panel import load_panel
 from app import cache
 from ..utils.preprocessing_question4 import (
     preprocess_and_merge_data_chart1,
@@ -20,116 +22,142 @@ from ..utils.preprocessing_question4 import (
 question4_bp = Blueprint('question4', __name__)
 
 
+# Interactive data of chart 1, dropdown values come from the dimension index, no need to scan the dfs
+def get_interactive_data_chart1(loader, time_param, iccs_param):
+    return {
+        "time": {
+            "values": loader.get_dimensions('tps00001')['time']['labels'],
+            "multiple": False,
+            "default": time_param
+        },
+        "iccs": {
+            "values": loader.get_dimensions('crim_off_cat')['iccs']['labels'],
+            "multiple": False,
+            "default": iccs_param
+        }
+    }
+
+
+# Interactive data of chart 2
+def get_interactive_data_chart2(loader, geo_param):
+    crime_dims = loader.get_dimensions('crim_off_cat')
+    return {
+        "geo": {
+            "labels": crime_dims['geo']['labels'],
+            "values": crime_dims['geo']['codes'],
+            "multiple": False,
+            "default": geo_param,
+        }
+    }
+
+
+# Interactive data of chart 3, the geos are the ones with data in the merged df
+def get_interactive_data_chart3(loader, year, iccs, merged):
+    all_codes = merged['geo_code'].unique().tolist()
+    all_labels = merged['country'].unique().tolist()
+    return {
+        "time": {"values": sorted(loader.get_dimensions('tps00001')['time']['labels']), "multiple": False, "default": year},
+        "iccs": {"values": sorted(loader.get_dimensions('crim_off_cat')['iccs']['labels']), "multiple": False, "default": iccs},
+        "geo": {"labels":sorted(all_labels),"values": sorted(all_codes), "multiple": True, "default": None}
+    }
+
+
 # Chart 1 endpoint
 @question4_bp.route('/chart1', methods=['GET'])
-@cache.cached(timeout=1800, query_string=True)
+@cache.cached(timeout=1800, params={'time': "2020", 'iccs': "Intentional homicide"},
+              datasets=['tps00001', 'tec00115', 'crim_off_cat'])
 def chart1():
-    loader = EurostatDataLoader(cache_expiry=1800)
+    loader = get_loader()
 
     time_param = request.args.get('time', default="2020")
     iccs_param = request.args.get('iccs', default="Intentional homicide")
     year = str(time_param)
 
-    pop_df = loader.load_dataset('tps00001')
-    gdp_df = loader.load_dataset('tec00115')
-    crime_df = loader.load_dataset('crim_off_cat')
-
+    # population, GDP & crime are already joined in the panel
     filtered_df = preprocess_and_merge_data_chart1(
-        pop_df,
-        gdp_df,
-        crime_df,
+        load_panel(loader),
         year,
         iccs_param
     )
 
-    resp = ChartResponse(chart_data=filtered_df.to_dict(orient='records'), interactive_data={
-        "time": {
-            "values": pop_df['time'].unique().tolist(),
-            "multiple": False,
-            "default": time_param
-        },
-        "iccs": {
-            "values": crime_df['iccs'].unique().tolist(),
-            "multiple": False,
-            "default": iccs_param
-        }
-    })
+    resp = ChartResponse(chart_data=filtered_df,
+                         interactive_data=get_interactive_data_chart1(loader, time_param, iccs_param))
 
-    return resp.to_json()
+    return resp.to_response()
 
 
 # Chart 2 endpoint
 @question4_bp.route('/chart2', methods=['GET'])
-@cache.cached(timeout=1800, query_string=True)
+@cache.cached(timeout=1800, params={'geo': "DE"},
+              datasets=['tps00001', 'tec00115', 'crim_off_cat'])
 def chart2():
-    loader = EurostatDataLoader(cache_expiry=1800)
+    loader = get_loader()
     geo_param = request.args.get('geo', default="DE")
 
-    df_pop = loader.load_dataset('tps00001') 
-    df_crime = loader.load_dataset('crim_off_cat')
-    df_gdp = loader.load_dataset('tec00115')
-
-    geo_codes = df_crime['geo_code'].unique().tolist()
-    geo_labels = loader.get_dimensions('crim_off_cat')['geo']['labels']
+    panel = load_panel(loader)
 
     final_df = preprocess_and_merge_data_chart2(
-        df_pop,
-        df_gdp,
-        df_crime,
+        panel,
         geo_param
     )
 
     response = ChartResponse(
-        chart_data=final_df.to_dict(orient='records'),
-        interactive_data={
-            "geo": {
-                "labels": geo_labels,
-                "values": geo_codes,
-                "multiple": False,
-                "default": geo_param,
-            }
-        }
+        chart_data=final_df,
+        interactive_data=get_interactive_data_chart2(loader, geo_param)
     )
 
-    return response.to_json()
+    return response.to_response()
 
 
 # Chart 3 endpoint
 @question4_bp.route('/chart3', methods=['GET'])
-@cache.cached(timeout=1800, query_string=True)
+@cache.cached(timeout=1800, params={'time': "2020", 'iccs': "Intentional homicide", 'geo': []},
+              datasets=['tps00001', 'tec00115', 'crim_off_cat'])
 def chart3():
-    loader = EurostatDataLoader(cache_expiry=1800)
+    loader = get_loader()
 
     year = request.args.get('time', default="2020")
     iccs = request.args.get('iccs', default="Intentional homicide")
     geo_codes = request.args.getlist('geo')
 
-    df_pop = loader.load_dataset('tps00001')
-    df_gdp = loader.load_dataset('tec00115')
-    df_crime = loader.load_dataset('crim_off_cat')
-
     merged = preprocess_and_merge_data_chart3(
-        df_pop,
-        df_gdp,
-        df_crime,
+        load_panel(loader),
         year,
         iccs
     )
 
     all_codes = merged['geo_code'].unique().tolist()
-    all_labels = merged['country'].unique().tolist()
     valid_codes = [code for code in geo_codes if code in all_codes]
     filtered = merged[merged['geo_code'].isin(valid_codes)]
 
     resp = ChartResponse(
         chart_data=filtered[['country','geo_code','population','gdp_growth','crime_rate_per_100k']]
-        .dropna()
-        .to_dict(orient='records'),
-        interactive_data={
-            "time": {"values": sorted(df_pop['time'].unique().tolist()), "multiple": False, "default": year},
-            "iccs": {"values": sorted(df_crime['iccs'].unique().tolist()), "multiple": False, "default": iccs},
-            "geo": {"labels":sorted(all_labels),"values": sorted(all_codes), "multiple": True, "default": None}
-        }
+        .dropna(),
+        interactive_data=get_interactive_data_chart3(loader, year, iccs, merged)
     )
 
-    return resp.to_json()
+    return resp.to_response()
+
+
+# Filter options of the charts (<chart>/filters), the selected values are the defaults
+add_filters_endpoint(
+    question4_bp, '/chart1',
+    lambda loader: get_interactive_data_chart1(
+        loader, request.args.get('time', "2020"), request.args.get('iccs', "Intentional homicide")),
+    params={'time': "2020", 'iccs': "Intentional homicide"}
+)
+add_filters_endpoint(
+    question4_bp, '/chart2',
+    lambda loader: get_interactive_data_chart2(loader, request.args.get('geo', "DE")),
+    params={'geo': "DE"}
+)
+
+
+def chart3_filters(loader):
+    year = request.args.get('time', default="2020")
+    iccs = request.args.get('iccs', default="Intentional homicide")
+    merged = preprocess_and_merge_data_chart3(load_panel(loader), year, iccs)
+    return get_interactive_data_chart3(loader, year, iccs, merged)
+
+
+add_filters_endpoint(question4_bp, '/chart3', chart3_filters, params={'time': "2020", 'iccs': "Intentional homicide"})
@@ -5,14 +5,18 @@ This file defines the routes and API endpoints for Question 5.
 It might include generated or modified code.
 """
 
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, request
 
-from .es_dataloader import EurostatDataLoader
+from .es_dataloader import get_loader
 from app import cache
 from .chart_response import ChartResponse
+from .filter_options import add_filters_endpoint
+from .payload_formats import payload_response
+from .response_cache import Param
+from ..utils.crime_cube import CrimeCube
 from ..utils.preprocessing_question5 import (
-    preprocessing_police_data_for_chart1,
-    preprocessing_crime_data_for_chart1,
+    CHART1_DATASETS,
+    merge_police_and_crime_for_chart1,
     filter_and_format_data_for_chart1,
     preprocess_and_format_data_for_chart2
 )
@@ -21,78 +25,102 @@ from ..utils.preprocessing_question5 import (
 question5_bp = Blueprint('question5', __name__)
 
 
+# Interactive data of chart 1
+def get_interactive_data_chart1(loader, crime_type):
+    dims = loader.get_dimensions('crim_off_cat')
+    return {
+        "geo": {
+            "labels": dims['geo']['labels'],
+            "values": dims['geo']['codes'],
+            "multiple": True,
+            "default": None
+            },
+
+        "iccs": {
+            "values": dims['iccs']['labels'],
+            "multiple": False, 
+            "default": crime_type
+            }
+    }
+
+
+# Interactive data of chart 2
+def get_interactive_data_chart2(loader, year, crime_type):
+    return {
+        "time": {
+            "values": sorted(loader.get_dimensions('crim_just_job')['time']['labels']),
+            "multiple": False, 
+            "default": year
+            },
+        "iccs": {
+            "values": sorted(loader.get_dimensions('crim_off_cat')['iccs']['labels']),
+            "multiple": False, 
+            "default": crime_type},
+    }
+
+
 #Endpoint for Chat 1
 @question5_bp.route('/chart1', methods=['GET'])
-@cache.cached(timeout=1800, query_string=True)
+@cache.cached(timeout=1800, params={'geo': Param(separator=','), 'iccs': "Intentional homicide"},
+              datasets=['crim_just_job', 'crim_off_cat'])
 def chart1():
-    loader = EurostatDataLoader(cache_expiry=1800)
+    loader = get_loader()
 
     geo_param = request.args.get('geo')
     crime_type = request.args.get('iccs', "Intentional homicide")
     
-    dims = loader.get_dimensions('crim_off_cat')
-    df_police = loader.load_dataset('crim_just_job')
-    df_crime = loader.load_dataset('crim_off_cat')
-
-    df_police = preprocessing_police_data_for_chart1(df_police)
-    df_crime = preprocessing_crime_data_for_chart1(df_crime, crime_type)
+    # police & crime per 100k of all crime types, merged once per version of the datasets
+    merged = loader.load_combined(CHART1_DATASETS, merge_police_and_crime_for_chart1)
 
     times, series = filter_and_format_data_for_chart1(
-        df_police, df_crime, geo_param)
+        merged, crime_type, geo_param)
 
     chart_data= {
        "times": times, 
        "series": series
        }
     
-    interactive_data = {
-        "geo": {
-            "labels": dims['geo']['labels'],
-            "values": dims['geo']['codes'],
-            "multiple": True,
-            "default": None
-            },
-
-        "iccs": {
-            "values": dims['iccs']['labels'],
-            "multiple": False, 
-            "default": crime_type
-            }
-    }
+    interactive_data = get_interactive_data_chart1(loader, crime_type)
 
     resp = ChartResponse(
         chart_data= chart_data,interactive_data= interactive_data)
 
-    return resp.to_json()
+    return resp.to_response()
 
 
 # Endpoint for Chart 2 
 @question5_bp.route('/chart2', methods=['GET'])
-@cache.cached(timeout=1800, query_string=True)
+@cache.cached(timeout=1800, params={'time': "2020", 'iccs': "Intentional homicide"},
+              datasets=['crim_just_job', 'crim_off_cat'])
 def chart2():
-    loader = EurostatDataLoader(cache_expiry=1800)
+    loader = get_loader()
 
     year = request.args.get('time', "2020")
     crime_type = request.args.get('iccs', "Intentional homicide") 
 
-    df_police = loader.load_dataset('crim_just_job')
-    df_crime = loader.load_dataset('crim_off_cat')
+    df_police, crime_cube = loader.load_many([
+        {'dataset_code': 'crim_just_job', 'time': [year]},
+        {'dataset_code': 'crim_off_cat', 'builder': CrimeCube.from_frame}
+    ])
 
-    av_times = sorted(df_police['time'].unique().tolist())
     merged = preprocess_and_format_data_for_chart2(
-        df_police, df_crime, year, crime_type)
-
-    return jsonify({
-        "chart_data": merged.to_dict(orient='records'),
-        "interactive_data": {
-            "time": {
-                "values": av_times,
-                "multiple": False, 
-                "default": year
-                },
-            "iccs": {
-                "values": sorted(df_crime['iccs'].unique().tolist()),
-                "multiple": False, 
-                "default": crime_type},
-        }
+        df_police, crime_cube, year, crime_type)
+
+    return payload_response({
+        "chart_data": merged,
+        "interactive_data": get_interactive_data_chart2(loader, year, crime_type)
     })
+
+
+# Filter options of the charts (<chart>/filters), the selected values are the defaults
+add_filters_endpoint(
+    question5_bp, '/chart1',
+    lambda loader: get_interactive_data_chart1(loader, request.args.get('iccs', "Intentional homicide")),
+    params={'iccs': "Intentional homicide"}
+)
+add_filters_endpoint(
+    question5_bp, '/chart2',
+    lambda loader: get_interactive_data_chart2(
+        loader, request.args.get('time', "2020"), request.args.get('iccs', "Intentional homicide")),
+    params={'time': "2020", 'iccs': "Intentional homicide"}
+)
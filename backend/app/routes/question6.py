@@ -9,9 +9,10 @@ It might include generated or modified code.
 from flask import Blueprint, request
 import pandas as pd
 
-from .es_dataloader import EurostatDataLoader
+from .es_dataloader import get_loader
 from app import cache
 from .chart_response import ChartResponse
+from .filter_options import add_filters_endpoint
 from ..utils.preprocessing_question6 import (
     preprocessing_data_chart1,
     aggregate_dataframe
@@ -38,49 +39,77 @@ def get_filters():
     return filters if filters else None
 
 
+# Interactive data of chart 1
+def get_interactive_data_chart1(dims):
+    return {
+        "geo": {
+            "values": dims['geo']['codes'] if 'geo' in dims else [],
+            "labels": dims['geo']['labels'] if 'geo' in dims else [],
+            "multiple": True,
+            "default": None
+        },
+        "time": {
+            "values": dims['time']['codes'] if 'time' in dims else [],
+            "labels": dims['time']['labels'] if 'time' in dims else [],
+            "multiple": True,
+            "default": None
+        }
+    }
+
+
+# Interactive data of chart 2
+def get_interactive_data_chart2(dims):
+    return {
+        "geo": {
+            "labels": dims.get('geo', {}).get('labels', []),
+            "values": dims.get('geo', {}).get('codes', []),
+            "multiple": False,
+            "default": None
+        },
+        "time": {
+            "values": dims.get('time', {}).get('codes', []),
+            "multiple": True,
+            "default": None
+        },
+        "leg_stat": {
+            "values": dims.get('leg_stat', {}).get('codes', []),
+            "labels": dims.get('leg_stat', {}).get('labels', []),
+            "multiple": False,
+            "default": "PER_SUSP"
+        }
+    }
+
+
 """------Endpoints for Question 6------"""
 
 # Endppoint for Chart 1
 @question6_bp.route('/chart1', methods=['GET'])
-@cache.cached(timeout=1800, query_string=True)
+@cache.cached(timeout=1800, params={'time': [], 'geo': [], 'leg_stat': []},
+              datasets=['crim_just_sex'])
 def chart1():
-    loader = EurostatDataLoader()
+    loader = get_loader()
     
     dims = loader.get_dimensions('crim_just_sex')
-    filter_geo = dims['geo']['codes'] if 'geo' in dims else []
-    filter_time = dims['time']['codes'] if 'time' in dims else []
 
     df = loader.load_dataset('crim_just_sex', filters=get_filters())
     df = preprocessing_data_chart1(df)
 
     aggregated = aggregate_dataframe(df)
 
-    interactive_data = {
-        "geo": {
-            "values": filter_geo,
-            "labels": dims['geo']['labels'] if 'geo' in dims else [],
-            "multiple": True,
-            "default": None
-        },
-        "time": {
-            "values": filter_time,
-            "labels": dims['time']['labels'] if 'time' in dims else [],
-            "multiple": True,
-            "default": None
-        }
-    }
+    interactive_data = get_interactive_data_chart1(dims)
 
     resp = ChartResponse(
         chart_data=aggregated, interactive_data=interactive_data)
     
-    return resp.to_json()
+    return resp.to_response()
 
 
 #Endpoint for Chart 2
 @question6_bp.route('/chart2', methods=['GET'])
-@cache.cached(timeout=1800, query_string=True)
+@cache.cached(timeout=1800, params={'time': [], 'geo': [], 'leg_stat': []},
+              datasets=['crim_just_sex'])
 def chart2():
-    loader = EurostatDataLoader()
+    loader = get_loader()
 
     dims = loader.get_dimensions('crim_just_sex')
     df = loader.load_dataset('crim_just_sex', filters=get_filters())
@@ -100,27 +129,14 @@ def chart2():
         "female": pivot.get('Females', pd.Series(dtype=float)).tolist()
     }
 
-    interactive_data = {
-        "geo": {
-            "labels": dims.get('geo', {}).get('labels', []),
-            "values": dims.get('geo', {}).get('codes', []),
-            "multiple": False,
-            "default": None
-        },
-        "time": {
-            "values": dims.get('time', {}).get('codes', []),
-            "multiple": True,
-            "default": None
-        },
-        "leg_stat": {
-            "values": dims.get('leg_stat', {}).get('codes', []),
-            "labels": dims.get('leg_stat', {}).get('labels', []),
-            "multiple": False,
-            "default": "PER_SUSP"
-        }
-    }
+    interactive_data = get_interactive_data_chart2(dims)
     
     resp = ChartResponse(
         chart_data=chart_data, interactive_data=interactive_data)
 
-    return resp.to_json()
+    return resp.to_response()
+
+
+# Filter options of the charts (<chart>/filters)
+add_filters_endpoint(question6_bp, '/chart1', lambda loader: get_interactive_data_chart1(loader.get_dimensions('crim_just_sex')))
+add_filters_endpoint(question6_bp, '/chart2', lambda loader: get_interactive_data_chart2(loader.get_dimensions('crim_just_sex')))
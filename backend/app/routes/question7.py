@@ -8,8 +8,9 @@ It might include generated or modified code.
 
 from flask import Blueprint, jsonify, request
 
-from .es_dataloader import EurostatDataLoader
+from .es_dataloader import get_loader
 from .chart_response import ChartResponse
+from .filter_options import add_filters_endpoint
 from app import cache
 from ..utils.preprocessing_question7 import (
     preprocess_q7,
@@ -32,14 +33,47 @@ def get_filters():
         return filters
     
 
+# Interactive data of chart 1 (without the EU & euro area aggregates)
+def get_interactive_data_chart1(dims):
+    filter_geo_codes, filter_geo_labels = filter_geo_data(dims)
+    return {
+        "geo": {
+            "values": filter_geo_codes,
+            "labels": filter_geo_labels,
+            "multiple": True,
+            "default": "DE"
+        }
+    }
+
+
+# Interactive data of chart 2
+def get_interactive_data_chart2(dims):
+    filter_geo_codes, filter_geo_labels = filter_geo_data(dims)
+    filter_time = dims['time']['codes'] if 'time' in dims else []
+    return {
+        "geo": {
+            "values": filter_geo_codes,
+            "labels": filter_geo_labels,
+            "multiple": False,
+            "default": "DE"
+        },
+        "time": {
+            "values": filter_time,
+            "multiple": False,
+            "default": "2015"
+        }
+    }
+
+
 """------Endpoints for Question 7------"""
     
 
 # Endpoint for Chart 1
 @question7_bp.route('/chart1', methods=['GET'])
-@cache.cached(timeout=1800, query_string=True)
+@cache.cached(timeout=1800, params={'geo': []},
+              datasets=['hlth_dhc130'])
 def chart1():
-    loader = EurostatDataLoader()
+    loader = get_loader()
     geo_params = request.args.getlist('geo')
     filters = {'geo': geo_params} if geo_params else None
 
@@ -48,53 +82,33 @@ def chart1():
 
     chart_data = structure_chart_data(df)
 
-    dims = loader.get_dimensions('hlth_dhc130')
-    filter_geo_codes, filter_geo_labels = filter_geo_data(dims)
-
-    interactive_data = {
-        "geo": {
-            "values": filter_geo_codes,
-            "labels": filter_geo_labels,
-            "multiple": True,
-            "default": "DE"
-        }
-    }
+    interactive_data = get_interactive_data_chart1(loader.get_dimensions('hlth_dhc130'))
 
     resp = ChartResponse(
         chart_data=chart_data, interactive_data=interactive_data)
-    return resp.to_json()
+    return resp.to_response()
 
 
 # Endpoint for Chart 2
 @question7_bp.route('/chart2', methods=['GET'])
-@cache.cached(timeout=1800, query_string=True)
+@cache.cached(timeout=1800, params={'geo': [], 'time': []},
+              datasets=['hlth_dhc130'])
 def chart2():
-    loader = EurostatDataLoader()    
+    loader = get_loader()
 
     df = loader.load_dataset('hlth_dhc130', filters= get_filters())
     df = preprocess_q7(df)
 
     result = dict(zip(df['age'], df['value']))
     
-    dims = loader.get_dimensions('hlth_dhc130')
-    filter_geo_codes, filter_geo_labels = filter_geo_data(dims)
-    filter_time = dims['time']['codes'] if 'time' in dims else []
-    
-    interactive_data = {
-        "geo": {
-            "values": filter_geo_codes,
-            "labels": filter_geo_labels,
-            "multiple": False,
-            "default": "DE"
-        },
-        "time": {
-            "values": filter_time,
-            "multiple": False,
-            "default": "2015"
-        }
-    }
+    interactive_data = get_interactive_data_chart2(loader.get_dimensions('hlth_dhc130'))
     
     resp = ChartResponse(
         chart_data=result, interactive_data=interactive_data)
     
-    return resp.to_json()
\ No newline at end of file
+    return resp.to_response()
+
+
+# Filter options of the charts (<chart>/filters)
+add_filters_endpoint(question7_bp, '/chart1', lambda loader: get_interactive_data_chart1(loader.get_dimensions('hlth_dhc130')))
+add_filters_endpoint(question7_bp, '/chart2', lambda loader: get_interactive_data_chart2(loader.get_dimensions('hlth_dhc130')))
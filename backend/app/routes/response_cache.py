@@ -0,0 +1,426 @@
+import functools
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, namedtuple
+from contextlib import nullcontext
+
+from flask import Response, make_response, request
+
+from .dataset_store import make_cache_key
+from .payload_formats import response_options
+
+try:
+    import brotli
+except ImportError: # optional, without brotli the responses are only compressed with gzip
+    brotli = None
+
+"""
+Response cache for the chart endpoints, shared by all gunicorn workers of a host.
+
+The encoded response bodies are stored in a SQLite database (WAL mode, like the dataset store),
+so a chart that was built by one worker is a cache hit in every other worker.
+The keys are canonical: only the declared params of an endpoint are used, multi value params
+are sorted and missing params are filled in with their defaults, so
+    /api/question4/chart1, /api/question4/chart1?time=2020 & /api/question4/chart1?iccs=...&time=2020
+are all the same entry when 2020 is the default.
+
+Every entry is stored together with its gzip & brotli compressed body, so the compression is done
+once and not per request. The ETag of an entry is derived from its canonical key, the versions of
+the datasets it was built from and its body. A request with a matching If-None-Match gets a 304.
+An expired entry whose datasets still have the same versions is used again without rebuilding it.
+"""
+
+# bump this when the table layout changes, old cache files are then recreated
+SCHEMA_VERSION = 3
+
+# request header of the warm-up requests, they are not counted as usage
+WARMUP_HEADER = 'X-Cache-Warmup'
+
+CachedResponse = namedtuple(
+    'CachedResponse', ['body', 'mimetype', 'status', 'etag', 'versions', 'gzip', 'br', 'expires_at'])
+
+# bodies smaller than this are not compressed
+MIN_COMPRESS_SIZE = 1024
+
+
+class Param:
+    def __init__(self, default=None, multiple=False, separator=None):
+        """
+        A query param of a chart endpoint
+
+        Args:
+            default: Value used when the param is missing (a list for multi value params)
+            multiple (bool): The param can be given several times, e.g. ?geo=DE&geo=FR
+            separator (str): The values are given in one param, e.g. ?geo=DE,FR with separator ','
+        """
+        self.default = default
+        self.multiple = multiple
+        self.separator = separator
+
+    def values(self, args, name):
+        """The canonical values of the param in the request args (sorted & without duplicates if multi value)"""
+        if self.multiple:
+            values = args.getlist(name)
+        elif self.separator is not None:
+            value = args.get(name)
+            values = [v for v in value.split(self.separator) if v] if value else []
+        else:
+            value = args.get(name)
+            return [value] if value is not None else self._default_values()
+
+        if not values:
+            return self._default_values()
+        return sorted(set(values))
+
+    def _default_values(self):
+        if self.default is None:
+            return []
+        if isinstance(self.default, (list, tuple)):
+            return [str(v) for v in self.default]
+        return [str(self.default)]
+
+
+def make_params(params):
+    """
+    Turns the params of an endpoint into Param objects.
+    A plain default value declares a single value param, a list declares a multi value param:
+        {'time': "2020", 'geo': []} -> time defaults to 2020, geo can be given several times
+    """
+    spec = {}
+    for name, param in (params or {}).items():
+        if isinstance(param, Param):
+            spec[name] = param
+        elif isinstance(param, (list, tuple)):
+            spec[name] = Param(default=list(param), multiple=True)
+        else:
+            spec[name] = Param(default=param)
+    return spec
+
+
+class ResponseCache:
+    def __init__(self, path=None, default_timeout=1500, timeout=30, usage_flush_interval=30, keep_expired=86400):
+        """
+        Args:
+            path (str): Path to the SQLite file (default: RESPONSE_CACHE_FILE or response_cache.sqlite3)
+            default_timeout (int): Seconds an entry stays valid if the endpoint sets no timeout
+            timeout (int): Seconds to wait for a lock held by another process
+            usage_flush_interval (int): Seconds between the writes of the request counts (used by the warm-up)
+            keep_expired (int): Seconds an expired entry is kept, it is used again if its datasets did not change
+        """
+        self.path = path
+        self.default_timeout = default_timeout
+        self.timeout = timeout
+        self.keep_expired = keep_expired
+        # set by init_app: record the dataset versions used by a view & look up the current ones
+        self.record_versions = None
+        self.current_versions = None
+        self._local = threading.local()
+        self._ready = False
+        self._setup_lock = threading.Lock()
+        # requests per key, counted in memory and added to the usage table from time to time
+        self.usage_flush_interval = usage_flush_interval
+        self._usage = Counter()
+        self._usage_lock = threading.Lock()
+        self._usage_flushed_at = time.time()
+
+    def init_app(self, app, record_versions=None, current_versions=None):
+        """
+        Reads the path of the cache file from the app config (RESPONSE_CACHE_FILE)
+
+        Args:
+            app (Flask): The app
+            record_versions (callable): Returns a context manager that collects the {cache key: version}
+                of the datasets loaded inside of it (EurostatDataLoader.record_versions)
+            current_versions (callable): Gets cache keys and returns their current {cache key: version}
+                or None if one of them is unknown (EurostatDataLoader.current_versions)
+        """
+        self.record_versions = record_versions
+        self.current_versions = current_versions
+        if self.path is None:
+            self.path = app.config.get(
+                'RESPONSE_CACHE_FILE', os.environ.get('RESPONSE_CACHE_FILE', 'response_cache.sqlite3'))
+        app.extensions['response_cache'] = self
+
+    def _connect(self):
+        """Returns the connection of the current thread, the tables are created on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            if self.path is None:
+                self.path = os.environ.get('RESPONSE_CACHE_FILE', 'response_cache.sqlite3')
+            conn = sqlite3.connect(self.path, timeout=self.timeout)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._setup(conn)
+        return conn
+
+    def _setup(self, conn):
+        with self._setup_lock:
+            if self._ready:
+                return
+            with conn:
+                version = conn.execute("PRAGMA user_version").fetchone()[0]
+                if version != SCHEMA_VERSION:
+                    conn.execute("DROP TABLE IF EXISTS responses")
+                    conn.execute("DROP TABLE IF EXISTS usage")
+                conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS responses (
+                        key TEXT PRIMARY KEY,
+                        body BLOB NOT NULL,
+                        mimetype TEXT NOT NULL,
+                        status INTEGER NOT NULL,
+                        etag TEXT NOT NULL,
+                        versions TEXT,
+                        gzip BLOB,
+                        br BLOB,
+                        created_at REAL NOT NULL,
+                        expires_at REAL NOT NULL
+                    )
+                    """
+                )
+                # how often a key was requested, kept when the response expires
+                conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS usage (
+                        key TEXT PRIMARY KEY,
+                        path TEXT NOT NULL,
+                        hits INTEGER NOT NULL,
+                        last_used REAL NOT NULL
+                    )
+                    """
+                )
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            self._ready = True
+
+    @staticmethod
+    def make_key(path, spec, args, options=None):
+        """
+        Builds the canonical key of a request
+
+        Example: make_key('/api/question1/chart1', {'geo': Param(multiple=True)}, args of ?geo=FR&geo=DE&x=1)
+        -> '/api/question1/chart1?geo=DE&geo=FR'
+
+        The response options (payload_formats.response_options, e.g. the payload format) are part of
+        the key, no matter if the format was asked for with ?format= or the Accept header.
+        """
+        values = {name: param.values(args, name) for name, param in spec.items()}
+        values.update(options or {})
+        return make_cache_key(path, values)
+
+    def get(self, key, include_expired=False):
+        """
+        Returns the CachedResponse of a key or None if it is missing (or expired)
+
+        Args:
+            key (str): Key from make_key
+            include_expired (bool): Also return expired entries (that are not removed yet)
+        """
+        query = "SELECT body, mimetype, status, etag, versions, gzip, br, expires_at FROM responses WHERE key = ?"
+        args = (key,)
+        if not include_expired:
+            query += " AND expires_at > ?"
+            args += (time.time(),)
+        row = self._connect().execute(query, args).fetchone()
+        if row is None:
+            return None
+        body, mimetype, status, etag, versions, gzipped, br, expires_at = row
+        return CachedResponse(
+            bytes(body), mimetype, status, etag,
+            json.loads(versions) if versions else None,
+            bytes(gzipped) if gzipped is not None else None,
+            bytes(br) if br is not None else None,
+            expires_at
+        )
+
+    def set(self, key, body, mimetype, status=200, timeout=None, versions=None):
+        """
+        Stores an encoded response body with its compressed variants (and removes old expired entries)
+
+        Args:
+            versions (dict): {cache key: version} of the datasets the response was built from
+
+        Returns:
+            CachedResponse: The stored entry
+        """
+        now = time.time()
+        timeout = self.default_timeout if timeout is None else timeout
+        if versions and None in versions.values():
+            versions = None # a dataset without a known version, so the entry is never used after it expired
+
+        etag = make_etag(key, versions, body)
+        gzipped = br = None
+        if len(body) >= MIN_COMPRESS_SIZE:
+            gzipped = gzip.compress(body, compresslevel=6)
+            if brotli is not None:
+                br = brotli.compress(body, quality=9)
+
+        entry = CachedResponse(body, mimetype, status, etag, versions, gzipped, br, now + timeout)
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM responses WHERE expires_at <= ?", (now - self.keep_expired,))
+            conn.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(key, body, mimetype, status, etag, versions, gzip, br, created_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, sqlite3.Binary(body), mimetype, status, etag,
+                 json.dumps(versions, sort_keys=True) if versions else None,
+                 sqlite3.Binary(gzipped) if gzipped is not None else None,
+                 sqlite3.Binary(br) if br is not None else None,
+                 now, entry.expires_at)
+            )
+        return entry
+
+    def touch(self, key, timeout=None):
+        """Makes an expired entry valid again (its datasets did not change)"""
+        timeout = self.default_timeout if timeout is None else timeout
+        conn = self._connect()
+        with conn:
+            conn.execute("UPDATE responses SET expires_at = ? WHERE key = ?", (time.time() + timeout, key))
+
+    def delete(self, key):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+
+    def clear(self):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM responses")
+
+    def record_usage(self, key):
+        """Counts a request of a key, the counts are written every usage_flush_interval seconds"""
+        with self._usage_lock:
+            self._usage[key] += 1
+            due = time.time() - self._usage_flushed_at >= self.usage_flush_interval
+        if due:
+            self.flush_usage()
+
+    def flush_usage(self):
+        """Adds the counted requests to the usage table"""
+        with self._usage_lock:
+            counts, self._usage = self._usage, Counter()
+            self._usage_flushed_at = time.time()
+        if not counts:
+            return
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "INSERT INTO usage (key, path, hits, last_used) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET hits = hits + excluded.hits, last_used = excluded.last_used",
+                [(key, key.partition('?')[0], hits, now) for key, hits in counts.items()]
+            )
+
+    def most_used(self, path, limit=5):
+        """
+        The most requested keys of an endpoint
+
+        Returns:
+            list: Keys (path with canonical query string), most requested first
+        """
+        self.flush_usage()
+        rows = self._connect().execute(
+            "SELECT key FROM usage WHERE path = ? ORDER BY hits DESC, last_used DESC LIMIT ?", (path, limit)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def cached(self, timeout=None, params=None, datasets=None):
+        """
+        Caches the encoded response of a chart endpoint under its canonical key.
+        Only successful (200) responses are cached.
+
+        Args:
+            timeout (int): Seconds the response stays valid (default: default_timeout)
+            params (dict): The query params read by the endpoint with their defaults, see make_params.
+                Params that are not declared are not part of the key (the endpoint must not read them)
+            datasets (list): Codes of the datasets the endpoint loads, so they can be loaded
+                before several charts are built at once (see batch)
+        """
+        spec = make_params(params)
+
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                options = response_options()
+                if options is None:
+                    # unknown format, the view answers with an error
+                    return view(*args, **kwargs)
+                key = self.make_key(request.path, spec, request.args, options)
+                if WARMUP_HEADER not in request.headers:
+                    self.record_usage(key)
+
+                entry = self.get(key, include_expired=True)
+                if entry is not None and entry.expires_at <= time.time():
+                    # expired, but still up to date if the datasets have the same versions
+                    if entry.versions and self.current_versions is not None \
+                            and self.current_versions(list(entry.versions)) == entry.versions:
+                        self.touch(key, timeout)
+                    else:
+                        entry = None
+                if entry is not None:
+                    return self._respond(entry)
+
+                recorder = self.record_versions() if self.record_versions is not None else nullcontext()
+                with recorder as versions:
+                    response = make_response(view(*args, **kwargs))
+                if response.status_code == 200 and not response.direct_passthrough:
+                    entry = self.set(key, response.get_data(), response.mimetype, response.status_code,
+                                     timeout, versions)
+                    return self._respond(entry)
+                return response
+
+            # read by tools that enumerate the endpoints & their params
+            wrapper.cache_params = spec
+            wrapper.datasets = list(datasets or [])
+            return wrapper
+        return decorator
+
+    @staticmethod
+    def _respond(entry):
+        """
+        Builds the response of a cached entry for the current request:
+        304 if the client has it already, otherwise the body in the best accepted encoding
+        """
+        encodings = [('br', entry.br), ('gzip', entry.gzip)]
+        if request.if_none_match:
+            for tag in [entry.etag] + [f"{entry.etag}-{name}" for name, _ in encodings]:
+                if request.if_none_match.contains(tag):
+                    response = Response(status=304)
+                    response.set_etag(tag)
+                    response.headers['Cache-Control'] = 'no-cache'
+                    response.vary.update(['Accept', 'Accept-Encoding'])
+                    return response
+
+        body, encoding = entry.body, None
+        for name, compressed in encodings:
+            if compressed is not None and request.accept_encodings[name] > 0:
+                body, encoding = compressed, name
+                break
+
+        response = Response(body, status=entry.status, mimetype=entry.mimetype)
+        if encoding is not None:
+            response.headers['Content-Encoding'] = encoding
+            response.set_etag(f"{entry.etag}-{encoding}")
+        else:
+            response.set_etag(entry.etag)
+        # the browser may keep the response, but has to revalidate it (cheap with the ETag)
+        response.headers['Cache-Control'] = 'no-cache'
+        response.vary.update(['Accept', 'Accept-Encoding'])
+        return response
+
+
+def make_etag(key, versions, body):
+    """
+    Strong ETag of a response: changes with the canonical params (key), the versions of the datasets
+    and the body (so a new version of the code that builds another body gets another ETag)
+    """
+    digest = hashlib.sha1(key.encode())
+    digest.update(json.dumps(versions, sort_keys=True).encode())
+    digest.update(hashlib.sha1(body).digest())
+    return digest.hexdigest()[:32]
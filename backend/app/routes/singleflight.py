@@ -0,0 +1,84 @@
+import hashlib
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError: # windows, there we only coalesce inside of one process
+    fcntl = None
+
+"""
+Request coalescing for the upstream fetches.
+
+SingleFlight makes sure that only one thread of a process runs the fetch for a key,
+the other threads wait for it and get the same result.
+file_lock does the same between processes (gunicorn workers) with a lock file per key.
+"""
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {} # key -> _Call
+
+    def do(self, key, fn):
+        """
+        Runs fn() once for all threads that ask for the same key at the same time
+
+        Returns:
+            The result of fn(), the waiting threads get the same result (or exception)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+@contextmanager
+def file_lock(lock_dir, key):
+    """
+    Holds an exclusive lock on a lock file for the key, shared by all processes on this host
+
+    Args:
+        lock_dir (str): Directory for the lock files (created if missing)
+        key (str): The cache key
+    """
+    if fcntl is None:
+        yield
+        return
+
+    os.makedirs(lock_dir, exist_ok=True)
+    path = os.path.join(lock_dir, hashlib.sha1(key.encode()).hexdigest() + '.lock')
+    with open(path, 'a') as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+
+"""
+Remapping of categories, e.g. several ICCS crime categories that are shown as one category.
+
+The mapping is applied to the small table of the distinct categories, not to every row:
+the rows keep integer codes (like a pandas Categorical) and only get a new code through a
+lookup array, so grouping by the merged categories is a bincount / np.add.at on the codes.
+"""
+
+
+class CategoryMap:
+    def __init__(self, mapping):
+        """
+        Args:
+            mapping (dict): Category -> category it is merged into, e.g. {'Sexual assault': 'Sexual crimes'}.
+                Categories that are not in the mapping stay as they are
+        """
+        self.mapping = dict(mapping)
+
+    def target(self, category):
+        """The category a category is merged into"""
+        return self.mapping.get(category, category)
+
+    def lookup(self, categories):
+        """
+        Merges a table of categories
+
+        Args:
+            categories (list): The distinct categories, e.g. the labels of pd.factorize
+
+        Returns:
+            tuple: (merged categories sorted by name like a groupby,
+                np.ndarray with the position of every category in the merged categories)
+        """
+        targets = [self.target(category) for category in categories]
+        merged = sorted(set(targets))
+        merged_pos = {category: i for i, category in enumerate(merged)}
+        return merged, np.array([merged_pos[target] for target in targets], dtype=int)
+
+    def remap_codes(self, codes, categories):
+        """
+        New codes for the rows (codes into categories, -1 for missing values stays -1)
+
+        Returns:
+            tuple: (codes into the merged categories, merged categories)
+        """
+        merged, lookup = self.lookup(categories)
+        codes = np.asarray(codes)
+        return np.where(codes >= 0, lookup[np.maximum(codes, 0)], -1), merged
+
+    def remap(self, values):
+        """
+        Merges the categories of a column
+
+        Args:
+            values (pd.Series): Any column, it is turned into a Categorical first if it isn't one
+
+        Returns:
+            pd.Series: Categorical with the merged categories (same index as values)
+        """
+        categorical = values.array if isinstance(values.dtype, pd.CategoricalDtype) else pd.Categorical(values)
+        codes, merged = self.remap_codes(categorical.codes, list(categorical.categories))
+        return pd.Series(pd.Categorical.from_codes(codes, categories=merged), index=values.index, name=values.name)
+
+
+# ICCS categories shown as one category in the charts of question 1, applied when the crime cube is built
+ICCS_MERGES = CategoryMap({
+    "Sexual exploitation": "Sexual crimes",
+    "Sexual violence": "Sexual crimes",
+    "Sexual assault": "Sexual crimes",
+})
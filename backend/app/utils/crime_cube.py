@@ -0,0 +1,174 @@
+import numpy as np
+import pandas as pd
+
+from .category_map import ICCS_MERGES
+
+"""
+Precomputed aggregate cube of the crim_off_cat dataset (police recorded offences by category).
+
+The values are kept in a dense NumPy array indexed by the positions of geo, year, crime category
+and unit, together with the sums that the charts need. The cube is built once per dataset version
+(EurostatDataLoader.load_derived), so a chart request only slices it and sums a few small axes
+instead of grouping the whole table again.
+"""
+
+
+class CrimeCube:
+    def __init__(self, values, geos, geo_codes, years, categories, units):
+        """
+        Args:
+            values (np.ndarray): Values with the shape (geo, year, category, unit), NaN where Eurostat has no value
+            geos (list): Labels of the geo axis, e.g. ['Belgium', 'Bulgaria', ...]
+            geo_codes (list): Codes of the geo axis, e.g. ['BE', 'BG', ...]
+            years (list): Labels of the year axis, e.g. ['2008', '2009', ...]
+            categories (list): Labels of the category axis (iccs)
+            units (list): Labels of the unit axis, in the order of the dataset
+        """
+        self.values = values
+        self.geos = list(geos)
+        self.geo_codes = list(geo_codes)
+        self.years = list(years)
+        self.categories = list(categories)
+        self.units = list(units)
+
+        self.geo_pos = {code: i for i, code in enumerate(self.geo_codes)}
+        self.year_pos = {year: i for i, year in enumerate(self.years)}
+        self.category_pos = {category: i for i, category in enumerate(self.categories)}
+
+        # cells with a value & number of values per (geo, year, category)
+        self.observed = ~np.isnan(values)
+        self.counts = self.observed.sum(axis=3)
+        # sum over all units, a missing value counts as 0 (like a pandas groupby sum)
+        self.totals = np.nansum(values, axis=3)
+
+        # sums of the merged categories (ICCS_MERGES), the axis is sorted by name (like a groupby)
+        self.merged_categories, self.merged_codes = ICCS_MERGES.lookup(self.categories)
+        self.merged_totals = np.zeros(self.totals.shape[:2] + (len(self.merged_categories),))
+        np.add.at(self.merged_totals, (slice(None), slice(None), self.merged_codes), self.totals)
+
+    @classmethod
+    def from_frame(cls, df):
+        """
+        Builds the cube from the df returned by load_dataset('crim_off_cat').
+        Other dimensions (like freq) are summed up.
+        """
+        axes = []
+        for column in ['geo', 'time', 'iccs', 'unit']:
+            positions, labels = pd.factorize(df[column].to_numpy())
+            axes.append((positions, labels))
+        shape = tuple(len(labels) for _, labels in axes)
+
+        values = df['value'].to_numpy(dtype=float)
+        has_value = ~np.isnan(values)
+        flat = np.ravel_multi_index([positions[has_value] for positions, _ in axes], shape)
+        size = int(np.prod(shape))
+        sums = np.bincount(flat, weights=values[has_value], minlength=size)
+        counts = np.bincount(flat, minlength=size)
+        cube = np.where(counts > 0, sums, np.nan).reshape(shape)
+
+        geo_positions, geos = axes[0]
+        first_rows = np.unique(geo_positions, return_index=True)[1]
+        geo_codes = df['geo_code'].to_numpy()[first_rows]
+
+        return cls(cube, geos, geo_codes, axes[1][1], axes[2][1], axes[3][1])
+
+    def geo_index(self, codes=None):
+        """Positions of the geo codes (all geos if codes is None, unknown & repeated codes are skipped)"""
+        if codes is None:
+            return np.arange(len(self.geo_codes))
+        return np.array([self.geo_pos[c] for c in dict.fromkeys(codes) if c in self.geo_pos], dtype=int)
+
+    def year_index(self, years=None):
+        """Positions of the years (all years if years is None, unknown & repeated years are skipped)"""
+        if years is None:
+            return np.arange(len(self.years))
+        years = dict.fromkeys(str(y) for y in years)
+        return np.array([self.year_pos[y] for y in years if y in self.year_pos], dtype=int)
+
+    def merged_sums(self, geo=None, time=None):
+        """
+        Sums of the merged categories over the selected years
+
+        Returns:
+            tuple: (geo positions, array with the shape (geo, merged category)),
+                without any geo if nothing was selected
+        """
+        geo_index = self.geo_index(geo)
+        year_index = self.year_index(time)
+        if len(year_index) == 0:
+            geo_index = geo_index[:0]
+        return geo_index, self.merged_totals[np.ix_(geo_index, year_index)].sum(axis=1)
+
+    def geo_totals(self, year):
+        """
+        Sum over all categories & units per geo for one year
+
+        Returns:
+            tuple: (geo positions, totals) only for the geos that have at least one value
+        """
+        if str(year) not in self.year_pos:
+            return np.array([], dtype=int), np.array([])
+        t = self.year_pos[str(year)]
+        geo_index = np.flatnonzero(self.counts[:, t, :].sum(axis=1) > 0)
+        return geo_index, self.totals[geo_index, t, :].sum(axis=1)
+
+    def year_totals(self, geo_code):
+        """
+        Sum over all categories & units per year for one geo
+
+        Returns:
+            tuple: (year positions, totals) only for the years that have at least one value
+        """
+        if geo_code not in self.geo_pos:
+            return np.array([], dtype=int), np.array([])
+        g = self.geo_pos[geo_code]
+        year_index = np.flatnonzero(self.counts[g, :, :].sum(axis=1) > 0)
+        return year_index, self.totals[g, year_index, :].sum(axis=1)
+
+    def category_values(self, year, category):
+        """
+        Values of one category & year per geo and unit
+
+        Returns:
+            np.ndarray: shape (geo, unit) or None if the year or the category is unknown
+        """
+        if str(year) not in self.year_pos or category not in self.category_pos:
+            return None
+        return self.values[:, self.year_pos[str(year)], self.category_pos[category], :]
+
+    def unit_table(self, category, years=None, fill_value=None):
+        """
+        Values of one category as a table with one column per unit (like a pivot_table over the units)
+
+        Args:
+            category (str): The crime category (iccs label)
+            years (list): Only these years (default: all)
+            fill_value (float): Value for the missing cells. Without it the rows and unit columns
+                that have no value at all are left out (like the pivot_table default)
+
+        Returns:
+            pd.DataFrame: columns geo, time, geo_code & one per unit, sorted by geo and time
+        """
+        columns = ['geo', 'time', 'geo_code']
+        if category not in self.category_pos:
+            return pd.DataFrame(columns=columns + self.units)
+
+        year_index = self.year_index(years)
+        values = self.values[:, year_index, self.category_pos[category], :]
+        if fill_value is None:
+            has_value = ~np.isnan(values)
+            geo_rows, year_rows = np.nonzero(has_value.any(axis=2))
+            units = [i for i in range(len(self.units)) if has_value[:, :, i].any()]
+        else:
+            values = np.where(np.isnan(values), fill_value, values)
+            geo_rows, year_rows = np.indices(values.shape[:2]).reshape(2, -1)
+            units = range(len(self.units))
+
+        table = pd.DataFrame({
+            'geo': [self.geos[i] for i in geo_rows],
+            'time': [self.years[i] for i in year_index[year_rows]],
+            'geo_code': [self.geo_codes[i] for i in geo_rows],
+        })
+        for i in units:
+            table[self.units[i]] = values[geo_rows, year_rows, i]
+        return table.sort_values(['geo', 'time', 'geo_code'], ignore_index=True)
@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+
+"""
+Numbering of the groups of some columns of a df, like groupby(columns, sort=False).ngroup(),
+without building a groupby: every column is factorized and the codes are combined into one integer.
+"""
+
+
+def number_groups(df, columns):
+    """
+    Numbers the groups of the columns in the order they first appear in the df
+
+    Args:
+        df (pd.DataFrame): The rows
+        columns (list): The columns of a group, e.g. ['geo', 'time']
+
+    Returns:
+        tuple: (group, first_rows, positions, labels)
+            group: group number of every row
+            first_rows: position of the first row of every group, in the order of the group numbers
+            positions: per column the codes of the rows (pd.factorize)
+            labels: per column the distinct values, positions index into them
+    """
+    positions, labels = zip(*(pd.factorize(df[column].to_numpy()) for column in columns))
+    flat = np.ravel_multi_index(positions, tuple(len(l) for l in labels))
+    _, first_rows, group = np.unique(flat, return_index=True, return_inverse=True)
+    # np.unique numbers the groups by their sorted flat index -> renumber by the first row
+    order = np.argsort(first_rows, kind='stable')
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return rank[group.ravel()], first_rows[order], positions, labels
@@ -0,0 +1,171 @@
+import numpy as np
+import pandas as pd
+
+from .crime_cube import CrimeCube
+
+"""
+Shared per-capita panel of population (tps00001), GDP growth (tec00115) and crime (crim_off_cat).
+
+All values are aligned on one (geo_code, year) grid, so a chart indexes the rows of a year or
+of a country instead of filtering the three datasets and merging them on every request.
+The crime rate per 100k inhabitants and the changes to the previous year are computed when
+the panel is built, which happens once per version of the source datasets (load_panel).
+"""
+
+# the datasets the panel is built from, in the order of the arguments of PerCapitaPanel.from_sources
+PANEL_DATASETS = [
+    'tps00001',
+    'tec00115',
+    {'dataset_code': 'crim_off_cat', 'builder': CrimeCube.from_frame},
+]
+
+
+def load_panel(loader):
+    """Returns the panel of the current versions of the source datasets (built only once per version)"""
+    return loader.load_combined(PANEL_DATASETS, PerCapitaPanel.from_sources)
+
+
+def _grid_mean(df):
+    """
+    Mean of the values of a df per (geo_code, time)
+
+    Returns:
+        tuple: (geo codes, geo labels, years, array with the shape (geo, year), NaN without a value)
+    """
+    geo_positions, geo_codes = pd.factorize(df['geo_code'].to_numpy())
+    year_positions, years = pd.factorize(df['time'].to_numpy())
+    geo_labels = df['geo'].to_numpy()[np.unique(geo_positions, return_index=True)[1]]
+
+    shape = (len(geo_codes), len(years))
+    values = df['value'].to_numpy(dtype=float)
+    has_value = ~np.isnan(values)
+    flat = np.ravel_multi_index((geo_positions[has_value], year_positions[has_value]), shape)
+    sums = np.bincount(flat, weights=values[has_value], minlength=shape[0] * shape[1])
+    counts = np.bincount(flat, minlength=shape[0] * shape[1])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.where(counts > 0, sums / counts, np.nan).reshape(shape)
+    return list(geo_codes), list(geo_labels), list(years), means
+
+
+def _change_pct(values, complete):
+    """
+    Change to the previous year in %, per geo (row).
+    Only the years marked as complete are compared, so the previous year is the last complete one.
+    """
+    change = np.full(values.shape, np.nan)
+    for g in range(values.shape[0]):
+        positions = np.flatnonzero(complete[g])
+        if len(positions) > 1:
+            series = values[g, positions]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                change[g, positions[1:]] = (series[1:] / series[:-1] - 1) * 100
+    return change
+
+
+class PerCapitaPanel:
+    def __init__(self, table, crime, categories, units, years):
+        """
+        Args:
+            table (pd.DataFrame): One row per (geo_code, year), geo-major and sorted by year within a geo
+            crime (np.ndarray): Crime values with the shape (row of the table, category, unit)
+            categories (list): Labels of the category axis of crime (iccs)
+            units (list): Labels of the unit axis of crime
+            years (list): The sorted years of the grid
+        """
+        self.table = table
+        self.crime = crime
+        self.categories = list(categories)
+        self.category_pos = {category: i for i, category in enumerate(self.categories)}
+        self.units = list(units)
+        self.years = list(years)
+        self.year_pos = {year: i for i, year in enumerate(self.years)}
+        self.geo_codes = list(table['geo_code'].to_numpy()[::max(len(self.years), 1)])
+        self.geo_pos = {code: i for i, code in enumerate(self.geo_codes)}
+
+    @classmethod
+    def from_sources(cls, pop_df, gdp_df, cube):
+        """
+        Builds the panel from the population & GDP dfs and the crime cube.
+        Several values of one geo & year (e.g. more than one unit of GDP) are averaged.
+        """
+        pop_codes, pop_labels, pop_years, population = _grid_mean(pop_df)
+        gdp_codes, gdp_labels, gdp_years, gdp_growth = _grid_mean(gdp_df)
+
+        # the geos keep the order of the population dataset, the others are added at the end
+        geo_codes, geo_labels = [], []
+        for codes, labels in [(pop_codes, pop_labels), (gdp_codes, gdp_labels), (cube.geo_codes, cube.geos)]:
+            for code, label in zip(codes, labels):
+                if code not in geo_codes:
+                    geo_codes.append(code)
+                    geo_labels.append(label)
+        geo_pos = {code: i for i, code in enumerate(geo_codes)}
+        years = sorted(set(pop_years) | set(gdp_years) | set(cube.years))
+        year_pos = {year: i for i, year in enumerate(years)}
+        shape = (len(geo_codes), len(years))
+
+        def align(values, codes, source_years):
+            """Puts a (geo, year) array of one source onto the grid"""
+            grid = np.full(shape + values.shape[2:], np.nan)
+            present = np.zeros(shape, dtype=bool)
+            rows = np.array([geo_pos[c] for c in codes], dtype=int)
+            columns = np.array([year_pos[y] for y in source_years], dtype=int)
+            grid[np.ix_(rows, columns)] = values
+            present[np.ix_(rows, columns)] = True
+            return grid, present
+
+        population, pop_present = align(population, pop_codes, pop_years)
+        gdp_growth, gdp_present = align(gdp_growth, gdp_codes, gdp_years)
+        # total over all categories & units, NaN if the crime dataset has no value at all
+        totals = np.where(cube.counts.sum(axis=2) > 0, cube.totals.sum(axis=2), np.nan)
+        total_crime, crime_present = align(totals, cube.geo_codes, cube.years)
+        crime, _ = align(cube.values, cube.geo_codes, cube.years)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            crime_rate_per_100k = (total_crime / population) * 100000
+
+        # years with a value in all three datasets, the changes are computed between them
+        complete = ~np.isnan(population) & ~np.isnan(gdp_growth) & ~np.isnan(total_crime)
+
+        table = pd.DataFrame({
+            'geo_code': np.repeat(np.array(geo_codes, dtype=object), len(years)),
+            'geo': np.repeat(np.array(geo_labels, dtype=object), len(years)),
+            'year': np.tile(np.array(years, dtype=object), len(geo_codes)),
+            'population': population.ravel(),
+            'gdp_growth': gdp_growth.ravel(),
+            'total_crime': total_crime.ravel(),
+            'crime_rate_per_100k': crime_rate_per_100k.ravel(),
+            'population_change_pct': _change_pct(population, complete).ravel(),
+            'total_crime_change_pct': _change_pct(total_crime, complete).ravel(),
+            # the geo & year exist in all three datasets (even if some values are missing)
+            'covered': (pop_present & gdp_present & crime_present).ravel(),
+            'complete': complete.ravel(),
+        })
+        crime = crime.reshape((len(geo_codes) * len(years),) + cube.values.shape[2:])
+        return cls(table, crime, cube.categories, cube.units, years)
+
+    def _year_rows(self, year):
+        if str(year) not in self.year_pos:
+            return np.array([], dtype=int)
+        return np.arange(len(self.geo_codes)) * len(self.years) + self.year_pos[str(year)]
+
+    def year(self, year):
+        """Rows of all geos for one year (in the order of the geos)"""
+        return self.table.iloc[self._year_rows(year)].reset_index(drop=True)
+
+    def geo(self, geo_code):
+        """Rows of all years for one geo (sorted by year)"""
+        if geo_code not in self.geo_pos:
+            return self.table.iloc[:0]
+        start = self.geo_pos[geo_code] * len(self.years)
+        return self.table.iloc[start:start + len(self.years)].reset_index(drop=True)
+
+    def category_values(self, year, category):
+        """
+        Crime values of one category for one year, aligned with the rows of year(year)
+
+        Returns:
+            np.ndarray: shape (geo, unit) or None if the year or the category is unknown
+        """
+        if str(year) not in self.year_pos or category not in self.category_pos:
+            return None
+        return self.crime[self._year_rows(year), self.category_pos[category], :]
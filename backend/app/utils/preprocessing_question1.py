@@ -3,63 +3,58 @@ Helper functions for preprocessing and preparing data for question 1
 (some parts are modified or generated with AI).
 """
 
+import numpy as np
+
+
 # Prepare chart 1 data
-def process_crime_data_chart1(df): # generated with AI
-    merge_categories = {"Sexual exploitation", "Sexual violence", "Sexual assault"}
-    df['iccs_merged'] = df['iccs'].apply(
-        lambda x: "Sexual crimes" if x in merge_categories else x)
-    
-    pivot = df.groupby(['geo', 'iccs_merged'])['value'].sum().unstack(fill_value=0) 
-    most_frequent_crime = df.groupby('iccs_merged')['value'].sum().idxmax() 
+def process_crime_data_chart1(cube, geo=None, time=None): # generated with AI
+    # sums per geo & merged category over the selected years, answered from the crime cube
+    geo_index, sums = cube.merged_sums(geo, time)
+    if len(geo_index) == 0:
+        # names the filter that leaves nothing, like the error of a filtered download did
+        name = 'geo' if len(cube.geo_index(geo)) == 0 else 'time'
+        raise ValueError(f"No data for the filter of {name}")
+    geos = [cube.geos[i] for i in geo_index]
+    order = sorted(range(len(geos)), key=lambda i: geos[i])
+
+    # the sums are already a (geo, category) table, the pivot is one column per category
+    names = [geos[i] for i in order]
+    pivot_data = {
+        category: dict(zip(names, column))
+        for category, column in zip(cube.merged_categories, sums[order].T.tolist())
+    }
+    most_frequent_crime = cube.merged_categories[int(np.argmax(sums.sum(axis=0)))]
 
     return {
-        "pivot_data": pivot.to_dict(),
+        "pivot_data": pivot_data,
         "most_frequent_crime": most_frequent_crime
     }
 
 
 # Prepare chart 3 data
-def process_crime_data_chart3(df):
-    merge_categories = {"Sexual exploitation", "Sexual violence", "Sexual assault"}
-    df['iccs_merged'] = df['iccs'].apply(
-    lambda x: "Sexual crimes" if x in merge_categories else x # modified with AI
-)
-    
-    crime_by_category = df.groupby('iccs_merged')['value'].sum().fillna(0)
+def process_crime_data_chart3(cube, geo=None, time=None):
+    geo_index, sums = cube.merged_sums(geo, time)
+    if len(geo_index) == 0:
+        return {"categories": [], "values": []}
 
     return {
-        "categories": crime_by_category.index.tolist(),
-        "values": crime_by_category.tolist()
+        "categories": list(cube.merged_categories),
+        "values": sums.sum(axis=0).tolist()
     }
 
 
 # Prepare chart 4 data and calculate crime rate per 100ks
-def process_crime_data_chart4(df_pop, df_crime, latest_year):
-    df_pop = (
-        df_pop.dropna(subset=['value'])
-        .rename(columns={'time': 'year', 'value': 'population'})
-        .assign(year=lambda d: d['year'].astype(int))  
-    ) # modified with AI
+def process_crime_data_chart4(panel, latest_year):
+    # crime rate per 100k is part of the panel, rows without population or crime are left out
+    df = panel.year(latest_year).dropna(subset=['crime_rate_per_100k'])
 
-    df_crime = (
-        df_crime.dropna(subset=['value'])
-        .rename(columns={'time': 'year', 'value': 'crime_count'})
-        .assign(year=lambda d: d['year'].astype(int))
-        .groupby(['geo_code', 'year'], as_index=False)['crime_count'].sum() 
-    ) # modified with AI
-
-    df_pop = df_pop[df_pop['year'] == latest_year][['geo_code', 'population']]
-    df_crime = df_crime[df_crime['year'] == latest_year][['geo_code', 'crime_count']]
-
-    if df_pop.empty or df_crime.empty:
+    if df.empty:
         return []
 
-    df = df_crime.merge(df_pop, on='geo_code', how='inner')
-    df['crime_rate_per_100k'] = (df['crime_count'] / df['population']) * 100000
-
     return (
-        df.sort_values('crime_rate_per_100k', ascending=False)
+        # ties keep the geo_code order of the merged rows
+        df.sort_values(['crime_rate_per_100k', 'geo_code'], ascending=[False, True])
         [['geo_code', 'crime_rate_per_100k']]
         .rename(columns={'geo_code': 'geo'})
         .to_dict(orient='records') 
-    ) # modified with AI
\ No newline at end of file
+    ) # modified with AI
@@ -3,87 +3,54 @@ Helper functions for preprocessing and preparing data for question 4
 (some parts are modified or generated with AI).
 """
 
+import numpy as np
+import pandas as pd
+
 
 # Combines population, GDP, and crime data for a given year and crime type.
-def preprocess_and_merge_data_chart1(pop_df, gdp_df, crime_df, year, iccs_param):
-    pop = pop_df[pop_df['time'] == year][['geo', 'value', 'geo_code']].drop_duplicates()
-    pop.columns = ['geo', 'population', 'geo_code']
-    
-    gdp = gdp_df[gdp_df['time'] == year][['geo', 'value']].drop_duplicates(subset=['geo']).dropna()
-    gdp.columns = ['geo', 'gdp_growth']
-    
-    crime = crime_df[(crime_df['time'] == year) & (crime_df['iccs'] == iccs_param)][['geo', 'value']]
-    crime = crime.drop_duplicates(subset=['geo'])
-    crime.columns = ['geo', 'crime_rate']
-    
-    merged_df = pop.merge(gdp, on='geo', how='inner').merge(crime, on='geo', how='inner') # modified with AI
+def preprocess_and_merge_data_chart1(panel, year, iccs_param):
+    columns = ['geo', 'population', 'geo_code', 'gdp_growth', 'crime_rate', 'crime_rate_per_100k']
+    values = panel.category_values(year, iccs_param)
+    if values is None:
+        return pd.DataFrame(columns=columns)
+
+    # the rows of the year are already aligned with the crime values (first unit per geo)
+    merged_df = panel.year(year).assign(crime_rate=values[:, 0])
     merged_df['crime_rate_per_100k'] = (merged_df['crime_rate'] / merged_df['population']) * 100000
-    
-    return merged_df.dropna(subset=['crime_rate_per_100k', 'gdp_growth'])
-
-
-
-#Aggregates crime, population, and GDP data over time for a specific location.
-def preprocess_and_merge_data_chart2(df_pop, df_gdp, df_crime, geo_param): # some parts are generated with AI
-    pop = df_pop[df_pop['geo_code'] == geo_param][['time', 'value']].dropna()
-    pop.columns = ['year', 'population']
-    pop['year'] = pop['year'].astype(int)
-
-    crime = df_crime[df_crime['geo_code'] == geo_param][['time', 'value']].dropna()
-    crime.columns = ['year', 'crime_count']
-    crime['year'] = crime['year'].astype(int)
-
-    crime = crime.groupby('year', as_index=False)['crime_count'].sum() 
-    crime.rename(columns={'crime_count': 'total_crime'}, inplace=True) 
 
-    gdp = df_gdp[df_gdp['geo_code'] == geo_param][['time', 'value']].dropna()
-    gdp.columns = ['year', 'gdp_growth']
-    gdp['year'] = gdp['year'].astype(int) 
-    gdp = gdp.groupby('year', as_index=False)['gdp_growth'].mean() # modified with AI
+    return merged_df[columns].dropna(subset=['crime_rate_per_100k', 'gdp_growth'])
 
-    merged_df = crime.merge(pop, on='year').merge(gdp, on='year')
 
-    merged_df['crime_rate_per_100k'] = (merged_df['total_crime'] / merged_df['population']) * 100000
 
-    merged_df.sort_values('year', inplace=True)
-    merged_df['population_change_pct'] = merged_df['population'].pct_change() * 100 # modified with AI
-    merged_df['gdp_growth_change_pct'] = merged_df['gdp_growth']
-    merged_df['total_crime_change_pct'] = merged_df['total_crime'].pct_change() * 100
-
-    merged_df = merged_df.dropna()
-
-    final_df = merged_df[[
-        'year',
-        'total_crime_change_pct',
-        'population_change_pct',
-        'gdp_growth_change_pct'
-    ]]
+#Aggregates crime, population, and GDP data over time for a specific location.
+def preprocess_and_merge_data_chart2(panel, geo_param): # some parts are generated with AI
+    # the changes to the previous year (with values in all three datasets) are part of the panel
+    merged_df = panel.geo(geo_param)
+    merged_df = merged_df[merged_df['complete']].dropna(
+        subset=['crime_rate_per_100k', 'population_change_pct', 'total_crime_change_pct'])
+
+    final_df = pd.DataFrame({
+        'year': merged_df['year'].astype(int),
+        'total_crime_change_pct': merged_df['total_crime_change_pct'],
+        'population_change_pct': merged_df['population_change_pct'],
+        'gdp_growth_change_pct': merged_df['gdp_growth']
+    })
     return final_df
 
 
 #Aggregates and normalizes crime, population, and GDP data for a specific year.
-def preprocess_and_merge_data_chart3(df_pop, df_gdp, df_crime, year, iccs): # modified with AI
-    pop = (
-        df_pop[df_pop['time'] == year]
-        .groupby(['geo', 'geo_code'], as_index=False)['value']
-        .mean()
-        .rename(columns={'geo': 'country', 'value': 'population'}) 
-    )
-
-    gdp = (
-        df_gdp[df_gdp['time'] == year]
-        .groupby(['geo', 'geo_code'], as_index=False)['value']
-        .mean()
-        .rename(columns={'geo': 'country', 'value': 'gdp_growth'}) 
-    )
-
-    crime = (
-        df_crime[(df_crime['time'] == year) & (df_crime['iccs'] == iccs)]
-        .groupby(['geo', 'geo_code'], as_index=False)['value']
-        .mean()
-        .rename(columns={'geo': 'country', 'value': 'crime_rate'}) 
-    )
-
-    merged = pop.merge(gdp, on='geo_code').merge(crime, on='geo_code')
+def preprocess_and_merge_data_chart3(panel, year, iccs): # modified with AI
+    columns = ['country', 'geo_code', 'population', 'gdp_growth', 'crime_rate', 'crime_rate_per_100k']
+    values = panel.category_values(year, iccs)
+    if values is None:
+        return pd.DataFrame(columns=columns)
+
+    # mean over the units per geo, only for geos that exist in all three datasets
+    counts = (~np.isnan(values)).sum(axis=1)
+    sums = np.nansum(values, axis=1)
+    merged = panel.year(year).assign(
+        crime_rate=np.divide(sums, counts, out=np.full(len(sums), np.nan), where=counts > 0)
+    ).rename(columns={'geo': 'country'})
+    merged = merged[merged['covered']]
     merged['crime_rate_per_100k'] = merged['crime_rate'] / merged['population'] * 100000
-    return merged
\ No newline at end of file
+    return merged[columns].sort_values(['country', 'geo_code'], ignore_index=True)
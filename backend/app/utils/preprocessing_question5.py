@@ -3,6 +3,11 @@ Helper functions for preprocessing and preparing data for question 5
 (some parts are modified or generated with AI).
 """
 
+import numpy as np
+import pandas as pd
+
+from .crime_cube import CrimeCube
+
 
 # Filters and formats police officer data per 100k inhabitants
 def preprocessing_police_data_for_chart1(df_police): # modified with AI
@@ -15,45 +20,73 @@ def preprocessing_police_data_for_chart1(df_police): # modified with AI
     return df_police
 
 
-# Filters and formats crime data per 100k inhabitants.
-def preprocessing_crime_data_for_chart1(df_crime, crime_type): # modiefied with AI
-    df_crime = (
-        df_crime.query("iccs==@crime_type")
-                .pivot_table(index=['geo','time', 'geo_code'], columns='unit', values='value')
-                .rename(columns={'Per hundred thousand inhabitants':'crime_per_100k'})
-                .reset_index().dropna(subset=['crime_per_100k']) 
-    )
-    return df_crime
+# Filters and formats crime data per 100k inhabitants (of all crime types at once).
+def preprocessing_crime_data_for_chart1(cube):
+    columns = ['geo', 'time', 'geo_code', 'iccs', 'crime_per_100k']
+    if 'Per hundred thousand inhabitants' not in cube.units:
+        return pd.DataFrame(columns=columns)
+    unit = cube.units.index('Per hundred thousand inhabitants')
+
+    # units with a value for a crime type (the unit columns of the crime type)
+    used = cube.observed.any(axis=(0, 1))
+    # a geo & year is only kept if all of these units have a value (like dropna after the merge)
+    complete = (cube.observed | ~used[np.newaxis, np.newaxis, :, :]).all(axis=3) & used[:, unit]
+    geo_rows, year_rows, category_rows = np.nonzero(complete)
+
+    return pd.DataFrame({
+        'geo': np.asarray(cube.geos, dtype=object)[geo_rows],
+        'time': np.asarray(cube.years, dtype=object)[year_rows],
+        'geo_code': np.asarray(cube.geo_codes, dtype=object)[geo_rows],
+        'iccs': np.asarray(cube.categories, dtype=object)[category_rows],
+        'crime_per_100k': cube.values[geo_rows, year_rows, category_rows, unit],
+    })
+
+
+# Merges police and crime data of all crime types, built once per version of the datasets (CHART1_DATASETS)
+def merge_police_and_crime_for_chart1(df_police, cube):
+    # rows with a value in every unit of the police data
+    df_police = df_police.dropna()[['geo', 'time', 'geo_code', 'police_per_100k']]
+    df_crime = preprocessing_crime_data_for_chart1(cube)
+
+    merged = df_police.merge(df_crime, on=['geo', 'time'], how='inner', suffixes=('_police', '_crime'))
+    merged['time'] = merged['time'].astype(int)
+    # sorted, so the rows of a crime type & geo are next to each other
+    return merged.sort_values(['iccs', 'geo', 'time'], kind='stable', ignore_index=True)
 
 
-# Merges police and crime data based on selected locations.
-def filter_and_format_data_for_chart1(df_police, df_crime, geo_param): # partially generated with AI
+# the precomputed police table & crime cube the merged table of chart 1 is built from
+CHART1_DATASETS = [
+    {'dataset_code': 'crim_just_job', 'builder': preprocessing_police_data_for_chart1},
+    {'dataset_code': 'crim_off_cat', 'builder': CrimeCube.from_frame},
+]
+
+
+# Selects the crime type & locations of the merged table and builds one series per location.
+def filter_and_format_data_for_chart1(merged, crime_type, geo_param):
     geos = geo_param.split(',') if geo_param else []
-    
+
+    selected = merged['iccs'] == crime_type
     if geos:
-        df_police = df_police[df_police['geo_code'].isin(geos)]
-        df_crime = df_crime[df_crime['geo_code'].isin(geos)]
-    
-    merged = df_police.merge(df_crime, on=['geo', 'time'], how='inner').dropna() # modified with AI
-    merged['time'] = merged['time'].astype(int)
-    
-    times = sorted(merged['time'].unique().tolist())
+        selected = selected & merged['geo_code_police'].isin(geos) & merged['geo_code_crime'].isin(geos)
+    merged = merged[selected]
+
+    time = merged['time'].to_numpy()
+    times = np.unique(time).tolist()
+
+    # the rows are sorted by geo & time, so every geo is one block of rows
+    rows = [list(row) for row in zip(time.tolist(), merged['police_per_100k'].tolist(), merged['crime_per_100k'].tolist())]
+    names, starts = np.unique(merged['geo'].to_numpy(), return_index=True)
+    ends = list(starts[1:]) + [len(rows)]
     series = [
-        {
-            "name": geo,
-            "data": merged[merged.geo == geo]
-                      .sort_values('time')
-                      .apply(lambda r: [r.time, r.police_per_100k, r.crime_per_100k], axis=1)
-                      .tolist() # modified with AI
-        }
-        for geo in sorted(merged['geo'].unique())
+        {"name": name, "data": rows[start:end]}
+        for name, start, end in zip(names.tolist(), starts.tolist(), ends)
     ]
-    
+
     return times, series
 
 
 # Merges police and crime data for a given year and crime type.
-def preprocess_and_format_data_for_chart2(df_police, df_crime, year, crime_type): 
+def preprocess_and_format_data_for_chart2(df_police, cube, year, crime_type): 
     df_police = (
         df_police.query("isco08=='Police officers' and sex=='Total'")
         .pivot_table(index=['geo','time'], columns='unit', values='value')
@@ -61,12 +94,12 @@ def preprocess_and_format_data_for_chart2(df_police, df_crime, year, crime_type)
         .reset_index() 
     ).query("time==@year").dropna() # modified with AI
 
-    df_crime_filtered = df_crime.query("time==@year")
-    
+    # sums per unit of the crime type in the year, missing values count as 0
+    # (the table only has rows of the crime type & the year, iccs is only the column of the output)
     df_total = (
-        df_crime_filtered
-        .pivot_table(index=['geo','time','iccs'], columns='unit', values='value', aggfunc='sum')
-        .reset_index() # modified with AI
+        cube.unit_table(crime_type, years=[year], fill_value=0)
+        .drop(columns=['geo_code'])
+        .assign(iccs=crime_type)
     )
    
     if 'Number' in df_total.columns:
@@ -75,9 +108,6 @@ def preprocess_and_format_data_for_chart2(df_police, df_crime, year, crime_type)
         df_total = df_total.rename(columns={'Per hundred thousand inhabitants':'crime_per_100k'})
 
 
-    df_total = df_total.query("iccs==@crime_type").dropna(subset=['geo', 'time']) # modified with AI
-
-
     merged = df_total.merge(df_police, on=['geo','time'], how='inner').dropna() # modified with AI
 
     return merged
\ No newline at end of file
@@ -3,8 +3,11 @@ Helper functions for preprocessing and preparing data for question 6
 (some parts are modified or generated with AI).
 """
 
+import numpy as np
 import pandas as pd
 
+from .grouping import number_groups
+
 
 def preprocessing_data_chart1(df):
     df = df.dropna()
@@ -13,30 +16,37 @@ def preprocessing_data_chart1(df):
     return df
 
 
+# the sexes of a leg_stat in the nested output, each with a Number & a Per100k value
+SEXES = ["Males", "Females", "Total"]
+
+
 # This function aggregates the DataFrame into a nested dictionary structure
 def aggregate_dataframe(df: pd.DataFrame) -> dict:
+    if df.empty:
+        return {}
+
+    # (geo, time, leg_stat) groups, numbered in the order they first appear in the df
+    group, first_rows, positions, labels = number_groups(df, ['geo', 'time', 'leg_stat'])
+
+    # cell of every row: group, sex & unit (every unit except Number is summed up as Per100k)
+    sex_positions, sex_labels = pd.factorize(df['sex'].to_numpy())
+    sex = np.array([SEXES.index(label) for label in sex_labels], dtype=int)[sex_positions]
+    unit = (df['unit'].to_numpy() != 'Number').astype(int)
+    cell = (group * len(SEXES) + sex) * 2 + unit
+
+    # sums in the order of the rows, cells without a row stay 0
+    cells_per_group = len(SEXES) * 2
+    size = len(first_rows) * cells_per_group
+    sums = np.bincount(cell, weights=df['value'].to_numpy(dtype=float), minlength=size).tolist()
+    counts = np.bincount(cell, minlength=size).tolist()
+    values = [total if count else 0 for total, count in zip(sums, counts)]
+
     aggregated = {}
-    
-    for record in df.to_dict(orient="records"):
-        geo = record["geo"]
-        time = record["time"]
-        sex = record["sex"]
-        leg_stat = record["leg_stat"]  
-        unit = record["unit"]         
-        value = record["value"]
-
-        if geo not in aggregated:
-            aggregated[geo] = {}
-        if time not in aggregated[geo]:
-            aggregated[geo][time] = {}
-        if leg_stat not in aggregated[geo][time]:
-            aggregated[geo][time][leg_stat] = {
-                "Males": {"Number": 0, "Per100k": 0},
-                "Females": {"Number": 0, "Per100k": 0},
-                "Total": {"Number": 0, "Per100k": 0}
-            } # modified with AI
-    
-        unit_key = "Number" if unit == "Number" else "Per100k"
-        aggregated[geo][time][leg_stat][sex][unit_key] += value
-    
-    return aggregated
\ No newline at end of file
+    geos, times, leg_stats = (l[p[first_rows]].tolist() for p, l in zip(positions, labels))
+    for i, (geo, time, leg_stat) in enumerate(zip(geos, times, leg_stats)):
+        cells = values[i * cells_per_group:(i + 1) * cells_per_group]
+        aggregated.setdefault(geo, {}).setdefault(time, {})[leg_stat] = {
+            label: {"Number": cells[2 * j], "Per100k": cells[2 * j + 1]} for j, label in enumerate(SEXES)
+        }
+
+    return aggregated
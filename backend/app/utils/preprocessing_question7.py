@@ -3,6 +3,10 @@ Helper functions for preprocessing and preparing data for question 7
 (some parts are modified or generated with AI).
 """
 
+import numpy as np
+
+from .grouping import number_groups
+
 
 # Cleans dataset, filters relevant columns, and removes unwanted geographical regions.
 def preprocess_q7(df): 
@@ -74,31 +78,25 @@ def filter_geo_data(dims):
 
 #Aggregates values and calculates percentages per geo and time.
 def structure_chart_data(df): # partially generated with AI
+    if df.empty:
+        return {}
 
-    aggregated = {}
-    for record in df.to_dict(orient="records"):
-        geo = record["geo"]
-        age = record["age"]
-        time = record["time"]
-        value = record["value"]
-
-        key = (geo, age, time)
-        aggregated[key] = aggregated.get(key, 0) + value
+    # (geo, age, time) groups, numbered in the order they first appear in the df
+    group, first_rows, positions, labels = number_groups(df, ['geo', 'age', 'time'])
 
-    geo_time_totals = {}
-    for (geo, age, time), value in aggregated.items():
-        key = (geo, time)
-        geo_time_totals[key] = geo_time_totals.get(key, 0) + value
+    # sum per group (in the order of the rows) and total of all ages per geo & time
+    values = np.bincount(group, weights=df['value'].to_numpy(dtype=float), minlength=len(first_rows))
+    geo_positions, _, time_positions = (p[first_rows] for p in positions)
+    geo_time = geo_positions * len(labels[2]) + time_positions
+    totals = np.bincount(geo_time, weights=values, minlength=len(labels[0]) * len(labels[2]))[geo_time]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        shares = (values / totals * 100).tolist()
 
     nested_data = {}
-    for (geo, age, time), value in aggregated.items():
-        if geo not in nested_data:
-            nested_data[geo] = {}
-        if time not in nested_data[geo]:
-            nested_data[geo][time] = {}
-        total = geo_time_totals.get((geo, time), 0)
-        percentage = round((value / total * 100), 2) if total > 0 else 0
-        nested_data[geo][time][age] = {"value": value, "percentage": percentage}
+    geos, ages, times = (l[p[first_rows]].tolist() for p, l in zip(positions, labels))
+    for geo, age, time, value, total, share in zip(geos, ages, times, values.tolist(), totals.tolist(), shares):
+        percentage = round(share, 2) if total > 0 else 0
+        nested_data.setdefault(geo, {}).setdefault(time, {})[age] = {"value": value, "percentage": percentage}
         # modified with AI
 
     return nested_data
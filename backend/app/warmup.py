@@ -0,0 +1,111 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.datastructures import MultiDict
+
+from app.routes.es_dataloader import get_loader
+from app.routes.meta import CHART_DATASETS
+from app.routes.response_cache import WARMUP_HEADER
+
+"""
+Warm-up of the caches after a deploy.
+
+1. All datasets used by the charts are loaded in parallel (download, parse & columnar store)
+2. Every chart endpoint is requested with its default params and with the most requested
+   params of the past (counted by the response cache), which fills the response cache
+
+Run it before the new version gets traffic:
+    flask --app run warmup
+or let every worker do it in the background on startup with WARMUP_ON_START=1.
+"""
+
+def chart_endpoints(app):
+    """
+    Returns the cached chart endpoints with their declared params,
+    e.g. [('/api/question1/chart1', {'time': Param, 'geo': Param}), ...]
+    """
+    endpoints = []
+    for rule in app.url_map.iter_rules():
+        view = app.view_functions.get(rule.endpoint)
+        if hasattr(view, 'cache_params') and 'GET' in rule.methods and not rule.arguments:
+            endpoints.append((rule.rule, view.cache_params))
+    return sorted(endpoints, key=lambda endpoint: endpoint[0])
+
+
+def warmup_urls(app, cache, top=5):
+    """
+    The urls to request: every endpoint with its defaults and its most used params
+
+    Returns:
+        list: urls (path & canonical query string), without duplicates
+    """
+    urls = []
+    for path, params in chart_endpoints(app):
+        urls.append(cache.make_key(path, params, MultiDict()))
+        if top:
+            urls.extend(cache.most_used(path, top))
+    return list(dict.fromkeys(urls))
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    try:
+        result = fn(*args)
+        return result, None, time.perf_counter() - start
+    except Exception as e:
+        return None, e, time.perf_counter() - start
+
+
+def warm_up(app, top=5, workers=4, refresh=False, log=print):
+    """
+    Fills the loader & response caches
+
+    Args:
+        app (Flask): The app
+        top (int): Number of the most used param combinations per endpoint that are requested as well
+        workers (int): Number of parallel loads & requests
+        refresh (bool): Builds the responses again even if they are cached (e.g. after a code change)
+        log (callable): Gets one line per dataset / endpoint
+
+    Returns:
+        list: dicts with 'name', 'status' and 'seconds' for every dataset & url
+    """
+    cache = app.extensions['response_cache']
+    loader = get_loader()
+    report = []
+    start = time.perf_counter()
+
+    # 1. the datasets, downloads of different datasets run at the same time
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [(code, pool.submit(_timed, loader.load_dataset, code)) for code in CHART_DATASETS]
+        for code, future in futures:
+            _, error, seconds = future.result()
+            if error is None:
+                _timed(loader.get_dimensions, code)
+            report.append({'name': code, 'status': 'failed' if error else 'ok', 'seconds': seconds})
+            log(f"dataset {code:<40} {'failed: ' + str(error) if error else 'ok':<12} {seconds:8.3f}s")
+
+    # 2. the chart endpoints
+    def request(url):
+        if refresh:
+            cache.delete(url)
+        hit = cache.get(url) is not None
+        with app.test_client() as client:
+            response = client.get(url, headers={WARMUP_HEADER: '1'})
+        return response.status_code, hit
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        urls = warmup_urls(app, cache, top)
+        futures = [(url, pool.submit(_timed, request, url)) for url in urls]
+        for url, future in futures:
+            result, error, seconds = future.result()
+            if error is not None:
+                status = f"failed: {error}"
+            else:
+                status = 'cached' if result[1] else str(result[0])
+            report.append({'name': url, 'status': status, 'seconds': seconds})
+            log(f"chart   {url:<40} {status:<12} {seconds:8.3f}s")
+
+    log(f"warmed up {len(CHART_DATASETS)} datasets and {len(report) - len(CHART_DATASETS)} urls "
+        f"in {time.perf_counter() - start:.3f}s")
+    return report
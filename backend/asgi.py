@@ -0,0 +1,4 @@
+from app.asgi import create_asgi_app
+
+# ASGI server, e.g. uvicorn asgi:app or gunicorn -k uvicorn.workers.UvicornWorker asgi:app
+app = create_asgi_app()
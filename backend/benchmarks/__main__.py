@@ -0,0 +1,61 @@
+import argparse
+import os
+import sys
+
+from .report import compare, format_comparison, metadata, read_results, write_results
+from .suite import run_suite
+
+"""
+Benchmarks of the parse, preprocessing & route hot paths with synthetic datasets (no calls to Eurostat).
+
+Run from the backend directory:
+    python -m benchmarks                               all groups at the scales 1, 10 & 50
+    python -m benchmarks --scales 1 --groups routes    only the routes with the smallest fixtures
+    python -m benchmarks --match question5             only the cases with question5 in their name
+    python -m benchmarks --save-baseline               store the results as the new baseline
+
+The results are written to benchmarks/results.json. If there is a baseline (benchmarks/baseline.json),
+the results are compared with it and the exit code is 1 if a case got slower (see report.compare).
+"""
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Benchmarks of the chart backend')
+    parser.add_argument('--scales', default='1,10,50', help='Sizes of the fixtures, comma separated (default: 1,10,50)')
+    parser.add_argument('--groups', default='parse,preprocessing,routes', help='Groups to run (default: all)')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs per case (default: 5)')
+    parser.add_argument('--match', default=None, help='Only run the cases whose name contains this')
+    parser.add_argument('--output', default=os.path.join(HERE, 'results.json'), help='Results file')
+    parser.add_argument('--baseline', default=os.path.join(HERE, 'baseline.json'), help='Baseline to compare with')
+    parser.add_argument('--threshold', type=float, default=0.25, help='Slowdown that is a regression (default: 0.25 = 25%%)')
+    parser.add_argument('--min-delta-ms', type=float, default=0.5, help='Smaller slowdowns are ignored (default: 0.5 ms)')
+    parser.add_argument('--save-baseline', action='store_true', help='Write the results to the baseline file as well')
+    args = parser.parse_args(argv)
+
+    scales = [int(scale) for scale in args.scales.split(',')]
+    groups = [group.strip() for group in args.groups.split(',')]
+    results = run_suite(scales=scales, groups=groups, repeat=args.repeat, match=args.match)
+    meta = metadata(args.repeat)
+
+    write_results(args.output, results, meta)
+    print(f"Results written to {args.output}")
+
+    if args.save_baseline:
+        write_results(args.baseline, results, meta)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline to compare with (use --save-baseline)")
+        return 0
+
+    comparison = compare(results, read_results(args.baseline), args.threshold, args.min_delta_ms, meta['calibration_ms'])
+    for line in format_comparison(comparison):
+        print(line)
+    return 1 if any(row['status'] == 'regression' for row in comparison) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,275 @@
+import json
+
+import numpy as np
+
+"""
+Synthetic JSON-stat documents with the shapes of the datasets used by the charts.
+
+The dimensions (ids, order, codes & labels the charts filter on) are the ones of the real datasets,
+the values are random but deterministic (fixed seed per dataset). The size is scaled with the
+geo dimension: at scale 1 there are about as many countries / regions as in the real datasets,
+at scale n every country or region is there n times (with a numbered code & label).
+
+    docs = make_datasets(scale=10)
+    doc = filter_jsonstat(docs['crim_off_cat'], {'geo': ['DE', 'FR'], 'time': ['2020']})
+"""
+
+COUNTRIES = [
+    ("BE", "Belgium"), ("BG", "Bulgaria"), ("CZ", "Czechia"), ("DK", "Denmark"), ("DE", "Germany"),
+    ("EE", "Estonia"), ("IE", "Ireland"), ("EL", "Greece"), ("ES", "Spain"), ("FR", "France"),
+    ("HR", "Croatia"), ("IT", "Italy"), ("CY", "Cyprus"), ("LV", "Latvia"), ("LT", "Lithuania"),
+    ("LU", "Luxembourg"), ("HU", "Hungary"), ("MT", "Malta"), ("NL", "Netherlands"), ("AT", "Austria"),
+    ("PL", "Poland"), ("PT", "Portugal"), ("RO", "Romania"), ("SI", "Slovenia"), ("SK", "Slovakia"),
+    ("FI", "Finland"), ("SE", "Sweden"), ("IS", "Iceland"), ("LI", "Liechtenstein"), ("NO", "Norway"),
+    ("CH", "Switzerland"), ("ME", "Montenegro"), ("MK", "North Macedonia"), ("AL", "Albania"),
+    ("RS", "Serbia"), ("TR", "Türkiye"), ("BA", "Bosnia and Herzegovina"), ("XK", "Kosovo*"),
+    ("UKC-L", "England and Wales"), ("UKM", "Scotland"), ("UKN", "Northern Ireland (UK) (NUTS 2021)"),
+]
+
+# aggregates, the charts leave (some of) them out
+AGGREGATES = [
+    ("EU27_2020", "European Union - 27 countries (from 2020)"),
+    ("EU28", "European Union - 28 countries (2013-2020)"),
+    ("EA19", "Euro area - 19 countries  (2015-2022)"),
+    ("EA20", "Euro area – 20 countries (from 2023)"),
+]
+
+ICCS = [
+    ("ICCS0101", "Intentional homicide"),
+    ("ICCS0102", "Attempted intentional homicide"),
+    ("ICCS02011", "Assault"),
+    ("ICCS020221", "Kidnapping"),
+    ("ICCS03011", "Sexual violence"),
+    ("ICCS030111", "Sexual assault"),
+    ("ICCS0302", "Sexual exploitation"),
+    ("ICCS0401", "Robbery"),
+    ("ICCS0501", "Burglary"),
+    ("ICCS05012", "Burglary of private residential premises"),
+    ("ICCS0502", "Theft"),
+    ("ICCS050211", "Theft of a motorized land vehicle"),
+    ("ICCS0601", "Unlawful acts involving controlled drugs or precursors"),
+    ("ICCS0701", "Fraud"),
+    ("ICCS0703", "Corruption"),
+    ("ICCS07041", "Money laundering"),
+    ("ICCS0901", "Acts against computer systems"),
+]
+
+UNITS = [("NR", "Number"), ("P_HTHAB", "Per hundred thousand inhabitants")]
+FREQ = [("A", "Annual")]
+SEX = [("T", "Total"), ("M", "Males"), ("F", "Females")]
+LEG_STAT = [("PER_SUSP", "Suspected person"), ("PER_PRSC", "Prosecuted person"), ("PER_CNV", "Convicted person")]
+ISCO08 = [("OC0110", "Police officers"), ("OC0210", "Prison staff"), ("OC2612", "Professional judges")]
+AGES = [
+    ("Y16-24", "From 16 to 24 years"), ("Y25-34", "From 25 to 34 years"), ("Y35-44", "From 35 to 44 years"),
+    ("Y45-54", "From 45 to 54 years"), ("Y55-64", "From 55 to 64 years"), ("Y_GE65", "65 years or over"),
+    ("Y_GE16", "16 years or over"),
+]
+
+# regions of crim_gen_reg per country at scale 1 (about 300 like the NUTS 3 regions with data)
+REGIONS_PER_COUNTRY = 8
+
+DATASET_CODES = [
+    'crim_off_cat', 'crim_gen_reg', 'crim_just_bri', 'crim_just_sex',
+    'crim_just_job', 'hlth_dhc130', 'tps00001', 'tec00115',
+]
+
+
+def years(first, last):
+    return [(str(year), str(year)) for year in range(first, last + 1)]
+
+
+def scaled(categories, scale):
+    """The categories repeated scale times, the copies get a numbered code & label"""
+    result = list(categories)
+    for copy in range(1, scale):
+        result.extend((f"{code}_{copy}", f"{label} ({copy})") for code, label in categories)
+    return result
+
+
+def regions(scale):
+    return scaled([
+        (f"{code}{n:02d}", f"{label} region {n}")
+        for code, label in COUNTRIES[:38] for n in range(1, REGIONS_PER_COUNTRY + 1)
+    ], scale)
+
+
+def make_jsonstat(code, dimensions, density=0.8, integer=False, seed=0):
+    """
+    A JSON-stat 2.0 document like the ones of the Eurostat API
+
+    Args:
+        code (str): Dataset code, used as the label
+        dimensions (list): (id, label, [(code, label), ...]) per dimension, in the order of Eurostat
+        density (float): Share of the cells that have a value
+        integer (bool): Whole numbers (counts) instead of decimals
+        seed (int): Seed of the random values
+    """
+    rng = np.random.default_rng(seed)
+    size = [len(categories) for _, _, categories in dimensions]
+    total = int(np.prod(size))
+
+    positions = np.flatnonzero(rng.random(total) < density)
+    if integer:
+        values = rng.integers(0, 50000, len(positions)).tolist()
+    else:
+        values = np.round(rng.uniform(0, 5000, len(positions)), 1).tolist()
+
+    return {
+        "version": "2.0",
+        "class": "dataset",
+        "label": code,
+        "source": "ESTAT",
+        "updated": "2024-06-01T23:00:00+0200",
+        "value": dict(zip(map(str, positions.tolist()), values)),
+        "id": [name for name, _, _ in dimensions],
+        "size": size,
+        "dimension": {
+            name: {
+                "label": label,
+                "category": {
+                    "index": {c: i for i, (c, _) in enumerate(categories)},
+                    "label": dict(categories),
+                },
+            }
+            for name, label, categories in dimensions
+        },
+    }
+
+
+def make_datasets(scale=1, codes=None):
+    """
+    The fixtures of all datasets (or only of codes) at a scale
+
+    Returns:
+        dict: dataset code -> JSON-stat document
+    """
+    geos = scaled(COUNTRIES + AGGREGATES, scale)
+    specs = {
+        'crim_off_cat': lambda: make_jsonstat('crim_off_cat', [
+            ("freq", "Time frequency", FREQ), ("iccs", "International classification of crime for statistical purposes", ICCS),
+            ("unit", "Unit of measure", UNITS), ("geo", "Geopolitical entity (reporting)", geos),
+            ("time", "Time", years(2008, 2022))], density=0.75, seed=1),
+        'crim_gen_reg': lambda: make_jsonstat('crim_gen_reg', [
+            ("freq", "Time frequency", FREQ), ("iccs", "International classification of crime for statistical purposes", ICCS[:1] + ICCS[7:11]),
+            ("unit", "Unit of measure", UNITS[:1]), ("geo", "Geopolitical entity (reporting)", regions(scale)),
+            ("time", "Time", years(2008, 2010))], density=0.6, integer=True, seed=2),
+        'crim_just_bri': lambda: make_jsonstat('crim_just_bri', [
+            ("freq", "Time frequency", FREQ), ("leg_stat", "Legal status", LEG_STAT), ("sex", "Sex", SEX),
+            ("unit", "Unit of measure", UNITS), ("geo", "Geopolitical entity (reporting)", geos),
+            ("time", "Time", years(2013, 2022))], density=0.8, seed=3),
+        'crim_just_sex': lambda: make_jsonstat('crim_just_sex', [
+            ("freq", "Time frequency", FREQ), ("leg_stat", "Legal status", LEG_STAT), ("sex", "Sex", SEX),
+            ("unit", "Unit of measure", UNITS), ("geo", "Geopolitical entity (reporting)", geos),
+            ("time", "Time", years(2013, 2022))], density=0.8, seed=4),
+        'crim_just_job': lambda: make_jsonstat('crim_just_job', [
+            ("freq", "Time frequency", FREQ), ("unit", "Unit of measure", UNITS), ("isco08", "International Standard Classification of Occupations 2008 (ISCO-08)", ISCO08),
+            ("sex", "Sex", SEX), ("geo", "Geopolitical entity (reporting)", geos),
+            ("time", "Time", years(2008, 2022))], density=0.8, seed=5),
+        'hlth_dhc130': lambda: make_jsonstat('hlth_dhc130', [
+            ("freq", "Time frequency", FREQ), ("unit", "Unit of measure", [("PC", "Percentage")]), ("sex", "Sex", SEX),
+            ("age", "Age class", AGES), ("geo", "Geopolitical entity (reporting)", geos),
+            ("time", "Time", years(2015, 2023))], density=0.85, seed=6),
+        'tps00001': lambda: make_jsonstat('tps00001', [
+            ("freq", "Time frequency", FREQ), ("indic_de", "Demographic indicator", [("JAN", "Population on 1 January - total")]),
+            ("geo", "Geopolitical entity (reporting)", geos), ("time", "Time", years(2013, 2024))],
+            density=0.95, integer=True, seed=7),
+        'tec00115': lambda: make_jsonstat('tec00115', [
+            ("freq", "Time frequency", FREQ), ("unit", "Unit of measure", [("CLV_PCH_PRE", "Chain linked volumes, percentage change on previous period")]),
+            ("na_item", "National accounts indicator (ESA 2010)", [("B1GQ", "Gross domestic product at market prices")]),
+            ("geo", "Geopolitical entity (reporting)", geos), ("time", "Time", years(2013, 2024))],
+            density=0.95, seed=8),
+    }
+    return {code: specs[code]() for code in (codes or DATASET_CODES)}
+
+
+# params of the API that are not dimension filters
+API_PARAMS = {'format', 'lang'}
+TIME_PARAMS = {'sinceTimePeriod', 'untilTimePeriod', 'lastTimePeriod'}
+
+
+def _as_list(value):
+    return [str(v) for v in (value if isinstance(value, (list, tuple, set)) else [value])]
+
+
+def filter_jsonstat(doc, params):
+    """
+    Filters a JSON-stat document like the Eurostat API filters a dataset
+
+    Every dimension param keeps the given codes (in the order of the dataset, several values are or-ed),
+    codes that the dataset does not have are ignored. The time can also be selected with
+    sinceTimePeriod, untilTimePeriod & lastTimePeriod. format & lang are ignored.
+
+    Args:
+        doc (dict): The whole dataset
+        params (dict): The query params, {name: value or [values]}
+
+    Returns:
+        dict: The filtered document
+
+    Raises:
+        KeyError: A param is neither a dimension nor a known param of the API
+        ValueError: A filter leaves no code of a dimension
+    """
+    ids, size = doc["id"], doc["size"]
+    params = {name: _as_list(value) for name, value in params.items() if name not in API_PARAMS}
+    for name in params:
+        if name not in ids and name not in TIME_PARAMS:
+            raise KeyError(name)
+
+    keep = []
+    for name, dim_size in zip(ids, size):
+        index = doc["dimension"][name]["category"]["index"]
+        codes = sorted(index, key=index.get)
+        selected = set(params[name]) if name in params else None
+        kept = [c for c in codes if selected is None or c in selected]
+        if name == 'time':
+            if 'sinceTimePeriod' in params:
+                kept = [c for c in kept if c >= params['sinceTimePeriod'][0]]
+            if 'untilTimePeriod' in params:
+                kept = [c for c in kept if c <= params['untilTimePeriod'][0]]
+            if 'lastTimePeriod' in params:
+                kept = kept[-int(params['lastTimePeriod'][0]):]
+        if not kept:
+            raise ValueError(f"No data for the filter of {name}")
+        keep.append(kept)
+
+    if all(len(kept) == dim_size for kept, dim_size in zip(keep, size)):
+        return doc
+
+    # old position -> new position per dimension (-1 if the code is filtered out)
+    new_size = [len(kept) for kept in keep]
+    lookups = []
+    for name, kept, dim_size in zip(ids, keep, size):
+        index = doc["dimension"][name]["category"]["index"]
+        lookup = np.full(dim_size, -1, dtype=np.int64)
+        lookup[[index[c] for c in kept]] = np.arange(len(kept))
+        lookups.append(lookup)
+
+    value = doc.get("value", {})
+    if isinstance(value, list):
+        value = {str(i): v for i, v in enumerate(value) if v is not None}
+    old = np.fromiter(map(int, value.keys()), dtype=np.int64, count=len(value))
+    coords = np.unravel_index(old, size) if len(old) else [np.empty(0, dtype=np.int64)] * len(size)
+    new_coords = [lookup[coord] for lookup, coord in zip(lookups, coords)]
+    inside = np.all([coord >= 0 for coord in new_coords], axis=0) if len(old) else np.empty(0, dtype=bool)
+    new_flat = np.ravel_multi_index([coord[inside] for coord in new_coords], new_size) if len(old) else old
+    values = list(value.values())
+    new_values = {str(n): values[i] for n, i in zip(new_flat.tolist(), np.flatnonzero(inside).tolist())}
+
+    dimension = {}
+    for name, kept in zip(ids, keep):
+        category = doc["dimension"][name]["category"]
+        dimension[name] = {
+            "label": doc["dimension"][name]["label"],
+            "category": {
+                "index": {c: i for i, c in enumerate(kept)},
+                "label": {c: category["label"][c] for c in kept},
+            },
+        }
+    result = dict(doc, size=new_size, dimension=dimension, value=new_values)
+    result.pop("status", None)
+    return result
+
+
+def jsonstat_bytes(doc):
+    return json.dumps(doc, separators=(',', ':')).encode()
@@ -0,0 +1,113 @@
+import json
+import platform
+import time
+
+import numpy as np
+import pandas as pd
+
+"""
+The results file of the benchmarks and the comparison with a stored baseline.
+
+    {"meta": {"created": ..., "python": ..., "pandas": ..., ...},
+     "results": [{"group": "parse", "name": "parse/crim_off_cat", "scale": 10, "median_ms": 12.3, ...}, ...]}
+
+A case is a regression if its fastest run is more than threshold (e.g. 0.25 = 25%) slower than in the
+baseline and also slower by more than min_delta_ms (so the noise of very fast cases is not flagged).
+Both files contain the time of a fixed calibration workload, the times are compared relative to it,
+so a baseline from a faster or slower machine (or a busy CI runner) does not flag every case.
+"""
+
+
+def calibrate(repeat=7):
+    """Milliseconds of a fixed mix of python & numpy work (the fastest of repeat runs)"""
+    rng = np.random.default_rng(0)
+    values = rng.random(200_000)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        np.sort(values)
+        pd.Series(values).groupby((values * 100).astype(int)).sum()
+        sum(i * i for i in range(200_000))
+        times.append(time.perf_counter() - start)
+    return round(min(times) * 1000, 3)
+
+
+def metadata(repeat):
+    return {
+        "created": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "calibration_ms": calibrate(),
+    }
+
+
+def write_results(path, results, meta):
+    with open(path, 'w') as f:
+        json.dump({"meta": meta, "results": results}, f, indent=2)
+        f.write('\n')
+
+
+def read_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(results, baseline, threshold=0.25, min_delta_ms=0.5, calibration_ms=None):
+    """
+    Compares the fastest runs (min_ms, less noisy than the median) with the baseline
+
+    Args:
+        results (list): The results of run_suite
+        baseline (dict): A results file (see read_results)
+        threshold (float): Relative slowdown that counts as a regression
+        min_delta_ms (float): Smaller slowdowns are never a regression
+        calibration_ms (float): Calibration time of the results, the baseline times are scaled
+            by the speed of this machine relative to the one of the baseline
+
+    Returns:
+        list: One dict per result with name, scale, baseline_ms (scaled to this machine), min_ms, ratio & status
+            ('regression', 'improvement', 'ok' or 'new' if the baseline does not have the case)
+    """
+    known = {(entry['name'], entry['scale']): entry for entry in baseline.get('results', [])}
+    speed = 1.0
+    if calibration_ms and baseline.get('meta', {}).get('calibration_ms'):
+        speed = calibration_ms / baseline['meta']['calibration_ms']
+    comparison = []
+    for entry in results:
+        base = known.get((entry['name'], entry['scale']))
+        row = {"name": entry['name'], "scale": entry['scale'], "min_ms": entry['min_ms']}
+        if base is None:
+            row.update(baseline_ms=None, ratio=None, status='new')
+        else:
+            expected = base['min_ms'] * speed
+            delta = entry['min_ms'] - expected
+            ratio = entry['min_ms'] / expected if expected > 0 else None
+            if ratio is not None and ratio > 1 + threshold and delta > min_delta_ms:
+                status = 'regression'
+            elif ratio is not None and ratio < 1 / (1 + threshold) and -delta > min_delta_ms:
+                status = 'improvement'
+            else:
+                status = 'ok'
+            row.update(baseline_ms=round(expected, 3), ratio=round(ratio, 3) if ratio is not None else None, status=status)
+        comparison.append(row)
+    return comparison
+
+
+def format_comparison(comparison):
+    """The regressions & improvements as lines of text"""
+    lines = []
+    for row in comparison:
+        if row['status'] in ('regression', 'improvement'):
+            lines.append(
+                f"{row['status'].upper():<12} {row['scale']:>3}x  {row['name']:<60} "
+                f"{row['baseline_ms']:>10.2f} -> {row['min_ms']:>10.2f} ms  (x{row['ratio']})"
+            )
+    counts = {}
+    for row in comparison:
+        counts[row['status']] = counts.get(row['status'], 0) + 1
+    lines.append(", ".join(f"{count} {status}" for status, count in sorted(counts.items())))
+    return lines
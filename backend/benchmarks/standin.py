@@ -0,0 +1,246 @@
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+
+import requests
+from flask import Flask, Response, request
+
+from app.routes.dataset_store import make_cache_key
+from app.routes.es_dataloader import EUROSTAT_API_URL
+from .fixtures import filter_jsonstat, jsonstat_bytes, make_datasets
+
+"""
+Local stand-in for the data endpoint of the Eurostat API, for load tests & benchmarks without the network.
+
+    GET /eurostat/api/dissemination/statistics/1.0/data/<code>?geo=DE&time=2020
+
+The datasets come from one of three sources:
+
+    synthetic   the fixtures of fixtures.make_datasets (default, --scale sets their size)
+    replay      the responses recorded into a directory (see record)
+    record      every request is passed on to the real API (--upstream) and its response is
+                recorded into the directory, so it can be replayed later
+
+The filters work like at Eurostat (see fixtures.filter_jsonstat): a dimension param keeps its codes,
+time can also be selected with sinceTimePeriod / untilTimePeriod / lastTimePeriod, an unknown
+dimension or a filter without data gives 400 and an unknown dataset 404.
+In replay mode a recorded response of the same request is served as it is, otherwise the
+recorded unfiltered dataset is filtered. Every response has an ETag and If-None-Match gives 304.
+
+The slow & failing parts of the real API can be added:
+    --latency 0.2 --jitter 0.1              seconds before the response starts
+    --tail-rate 0.01 --tail-latency 5       1% of the requests wait 5 seconds instead
+    --bandwidth 2000000                     bytes per second of the body
+    --error-rate 0.05 --error-status 503    5% of the requests fail (several statuses: 500,503,429)
+
+Start it and point the backend at it:
+    cd backend
+    python -m benchmarks.standin --port 8081 --latency 0.3
+    EUROSTAT_API_URL=http://127.0.0.1:8081/eurostat/api/dissemination/statistics/1.0/data python run.py
+"""
+
+DATA_PATH = '/eurostat/api/dissemination/statistics/1.0/data'
+
+# size of the chunks of a throttled body
+CHUNK_SIZE = 16 * 1024
+
+
+class Recordings:
+    def __init__(self, directory):
+        """
+        Responses of the API in a directory:
+            <directory>/<code>.json                the unfiltered dataset
+            <directory>/<code>/<hash>.json         the response of a request with filters (hash of the cache key)
+
+        Args:
+            directory (str): The directory (created on the first recording)
+        """
+        self.directory = directory
+        self._docs = {} # code -> unfiltered document, read once
+        self._lock = threading.Lock()
+
+    def path(self, dataset_code, params):
+        if not any(name not in ('format', 'lang') for name in params):
+            return os.path.join(self.directory, f"{dataset_code}.json")
+        digest = hashlib.sha1(make_cache_key(dataset_code, params).encode()).hexdigest()[:16]
+        return os.path.join(self.directory, dataset_code, f"{digest}.json")
+
+    def get(self, dataset_code, params):
+        """The recorded response of a request (bytes) or None"""
+        path = self.path(dataset_code, params)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                return f.read()
+        return None
+
+    def document(self, dataset_code):
+        """The recorded unfiltered dataset or None"""
+        with self._lock:
+            if dataset_code not in self._docs:
+                path = os.path.join(self.directory, f"{dataset_code}.json")
+                if not os.path.exists(path):
+                    return None
+                with open(path, 'rb') as f:
+                    self._docs[dataset_code] = json.loads(f.read())
+            return self._docs[dataset_code]
+
+    def put(self, dataset_code, params, body):
+        path = self.path(dataset_code, params)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # written to a temp file first, so a reader never sees half a file
+        with open(f"{path}.tmp", 'wb') as f:
+            f.write(body)
+        os.replace(f"{path}.tmp", path)
+        with self._lock:
+            self._docs.pop(dataset_code, None)
+
+
+def create_standin_app(mode='synthetic', scale=1, directory='recordings', upstream=EUROSTAT_API_URL,
+                       latency=0.0, jitter=0.0, tail_rate=0.0, tail_latency=0.0, bandwidth=None,
+                       error_rate=0.0, error_status=(503,), seed=None):
+    """
+    Creates the stand-in server
+
+    Args:
+        mode (str): 'synthetic', 'replay' or 'record'
+        scale (int): Size of the synthetic datasets
+        directory (str): Directory of the recordings (replay & record)
+        upstream (str): Data endpoint the requests are passed on to in record mode
+        latency (float): Seconds before every response
+        jitter (float): Up to this many seconds are added to the latency (uniform)
+        tail_rate (float): Share of the requests that wait tail_latency seconds instead
+        tail_latency (float): Seconds of the slow requests
+        bandwidth (int): Bytes per second of the body (None: not throttled)
+        error_rate (float): Share of the requests answered with an error
+        error_status (tuple): The statuses of the errors (one is picked per error)
+        seed (int): Seed of the random latency & errors, for runs that can be repeated
+
+    Returns:
+        Flask
+    """
+    if mode not in ('synthetic', 'replay', 'record'):
+        raise ValueError(f"Unknown mode: {mode}")
+
+    app = Flask(__name__)
+    docs = make_datasets(scale) if mode == 'synthetic' else {}
+    recordings = Recordings(directory)
+    rng = random.Random(seed)
+    rng_lock = threading.Lock()
+    stats = {'requests': 0, 'errors': 0, 'not_modified': 0, 'bytes': 0}
+    app.config['STANDIN_STATS'] = stats
+
+    def error(status, message):
+        return Response(json.dumps({"error": {"status": status, "label": message}}),
+                        status=status, mimetype='application/json')
+
+    def body_of(dataset_code, params):
+        """(status, body) of a request from the source of the mode"""
+        if mode == 'record':
+            response = requests.get(f"{upstream.rstrip('/')}/{dataset_code}", params=params, timeout=(5, 120))
+            if response.status_code == 200:
+                recordings.put(dataset_code, params, response.content)
+            return response.status_code, response.content
+
+        if mode == 'replay':
+            recorded = recordings.get(dataset_code, params)
+            if recorded is not None:
+                return 200, recorded
+            doc = recordings.document(dataset_code)
+        else:
+            doc = docs.get(dataset_code)
+
+        if doc is None:
+            return 404, None
+        try:
+            return 200, jsonstat_bytes(filter_jsonstat(doc, params))
+        except KeyError as e:
+            return 400, f"Unknown dimension: {e.args[0]}"
+        except ValueError as e:
+            return 400, str(e)
+
+    def throttled(body):
+        start = time.perf_counter()
+        for offset in range(0, len(body), CHUNK_SIZE):
+            chunk = body[offset:offset + CHUNK_SIZE]
+            yield chunk
+            # sleep until the bytes sent so far fit into the bandwidth
+            wait = (offset + len(chunk)) / bandwidth - (time.perf_counter() - start)
+            if wait > 0:
+                time.sleep(wait)
+
+    @app.route(f'{DATA_PATH}/<dataset_code>', methods=['GET'])
+    def data(dataset_code):
+        with rng_lock:
+            stats['requests'] += 1
+            slow = rng.random() < tail_rate
+            delay = tail_latency if slow else latency + rng.uniform(0, jitter)
+            failed = rng.random() < error_rate
+            failed_status = rng.choice(list(error_status))
+        if delay > 0:
+            time.sleep(delay)
+        if failed:
+            with rng_lock:
+                stats['errors'] += 1
+            return error(failed_status, "Injected error")
+
+        params = request.args.to_dict(flat=False)
+        status, body = body_of(dataset_code, params)
+        if status == 404:
+            return error(404, f"Unknown dataset: {dataset_code}")
+        if status != 200:
+            return error(status, body if isinstance(body, str) else f"Upstream answered {status}")
+
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if etag in request.headers.get('If-None-Match', ''):
+            with rng_lock:
+                stats['not_modified'] += 1
+            return Response(status=304, headers={'ETag': etag})
+
+        with rng_lock:
+            stats['bytes'] += len(body)
+        headers = {'ETag': etag, 'Content-Length': str(len(body))}
+        if bandwidth:
+            return Response(throttled(body), status=200, mimetype='application/json', headers=headers)
+        return Response(body, status=200, mimetype='application/json', headers=headers)
+
+    @app.route('/stats', methods=['GET'])
+    def standin_stats():
+        return stats
+
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.standin', description='Local stand-in for the Eurostat API')
+    parser.add_argument('--mode', default='synthetic', choices=['synthetic', 'replay', 'record'])
+    parser.add_argument('--scale', type=int, default=1, help='Size of the synthetic datasets (default: 1)')
+    parser.add_argument('--dir', default='recordings', help='Directory of the recordings (default: recordings)')
+    parser.add_argument('--upstream', default=EUROSTAT_API_URL, help='API the record mode passes the requests on to')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds before every response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Up to this many seconds added to the latency')
+    parser.add_argument('--tail-rate', type=float, default=0.0, help='Share of the requests with the tail latency')
+    parser.add_argument('--tail-latency', type=float, default=0.0, help='Seconds of the slow requests')
+    parser.add_argument('--bandwidth', type=int, default=None, help='Bytes per second of the body')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of the requests that fail')
+    parser.add_argument('--error-status', default='503', help='Statuses of the errors, comma separated (default: 503)')
+    parser.add_argument('--seed', type=int, default=None, help='Seed of the random latency & errors')
+    args = parser.parse_args(argv)
+
+    app = create_standin_app(
+        mode=args.mode, scale=args.scale, directory=args.dir, upstream=args.upstream,
+        latency=args.latency, jitter=args.jitter, tail_rate=args.tail_rate, tail_latency=args.tail_latency,
+        bandwidth=args.bandwidth, error_rate=args.error_rate,
+        error_status=tuple(int(status) for status in args.error_status.split(',')), seed=args.seed,
+    )
+    print(f"Eurostat stand-in ({args.mode}) on http://{args.host}:{args.port}{DATA_PATH}")
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
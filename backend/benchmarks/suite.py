@@ -0,0 +1,249 @@
+import contextlib
+import gc
+import io
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from app.routes import es_dataloader
+from app.routes.es_dataloader import EurostatDataLoader
+from app.utils import (
+    preprocessing_question1, preprocessing_question2, preprocessing_question3, preprocessing_question4,
+    preprocessing_question5, preprocessing_question6, preprocessing_question7, preprocessing_questions,
+)
+from app.utils.crime_cube import CrimeCube
+from app.utils.per_capita_panel import PerCapitaPanel, load_panel
+from .fixtures import filter_jsonstat, jsonstat_bytes, make_datasets
+
+"""
+The cases of the benchmark suite, in three groups:
+
+    parse           json.loads & EurostatDataLoader.parse_data of every dataset
+    preprocessing   every function of app/utils/preprocessing_question*.py (and the cube & panel builders)
+                    with the inputs the routes give them
+    routes          every cached GET endpoint through the Flask test client, the response cache is
+                    cleared before every run, so a run builds the chart (the loader is already warm)
+
+The loader is a FixtureLoader: the normal loader, but its calls to Eurostat are answered from the fixtures.
+"""
+
+
+class FixtureResponse:
+    def __init__(self, status_code, content=b'', headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+
+class FixtureLoader(EurostatDataLoader):
+    def __init__(self, docs, **kwargs):
+        """
+        EurostatDataLoader that answers its calls to Eurostat from the fixtures (with the filters applied)
+
+        Args:
+            docs (dict): Dataset code -> JSON-stat document, see fixtures.make_datasets
+        """
+        super().__init__(**kwargs)
+        self.docs = docs
+        self.requests = 0
+
+    def _request(self, dataset_code, params, cached=None):
+        self.requests += 1
+        if dataset_code not in self.docs:
+            return FixtureResponse(404)
+        try:
+            doc = filter_jsonstat(self.docs[dataset_code], params)
+        except (KeyError, ValueError):
+            return FixtureResponse(400)
+        return FixtureResponse(200, jsonstat_bytes(doc))
+
+
+@contextlib.contextmanager
+def quiet():
+    """Hides the debug prints of the loader & routes"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def measure(fn, repeat=5, warmup=1):
+    """
+    Runs fn warmup + repeat times
+
+    Returns:
+        list: The seconds of the timed runs
+    """
+    with quiet():
+        for _ in range(warmup):
+            fn()
+        times = []
+        for _ in range(repeat):
+            # no garbage collection inside of a timed run, it makes the times jump
+            gc.collect()
+            gc.disable()
+            try:
+                start = time.perf_counter()
+                fn()
+                times.append(time.perf_counter() - start)
+            finally:
+                gc.enable()
+    return times
+
+
+def result(group, name, scale, times, **extra):
+    """One entry of the results, the times in milliseconds"""
+    entry = {
+        "group": group,
+        "name": name,
+        "scale": scale,
+        "runs": len(times),
+        "min_ms": round(min(times) * 1000, 3),
+        "median_ms": round(statistics.median(times) * 1000, 3),
+        "mean_ms": round(statistics.fmean(times) * 1000, 3),
+    }
+    entry.update(extra)
+    return entry
+
+
+def parse_cases(loader, docs):
+    """(name, fn, extra) of the parse group"""
+    cases = []
+    for code, doc in docs.items():
+        payload = jsonstat_bytes(doc)
+        cases.append((f"decode/{code}", lambda payload=payload: json.loads(payload), {"bytes": len(payload)}))
+        with quiet():
+            rows = len(loader.parse_data(doc))
+        cases.append((f"parse/{code}", lambda doc=doc: loader.parse_data(doc), {"rows": rows}))
+    return cases
+
+
+def preprocessing_cases(loader):
+    """(name, fn, extra) of the preprocessing group, the inputs are loaded once (untimed)"""
+    q1, q2, q3, q4, q5, q6, q7 = (
+        preprocessing_question1, preprocessing_question2, preprocessing_question3, preprocessing_question4,
+        preprocessing_question5, preprocessing_question6, preprocessing_question7,
+    )
+    with quiet():
+        df_crime = loader.load_dataset('crim_off_cat')
+        df_pop = loader.load_dataset('tps00001')
+        df_gdp = loader.load_dataset('tec00115')
+        df_reg = loader.load_dataset('crim_gen_reg').dropna()
+        df_bri = loader.load_dataset('crim_just_bri', filters={'leg_stat': 'PER_SUSP'})
+        df_bri_all = loader.load_dataset('crim_just_bri')
+        df_sex = loader.load_dataset('crim_just_sex')
+        df_job = loader.load_dataset('crim_just_job')
+        df_job_year = loader.load_dataset('crim_just_job', time=['2020'])
+        df_health = loader.load_dataset('hlth_dhc130')
+        health_dims = loader.get_dimensions('hlth_dhc130')
+
+        cube = loader.load_derived('crim_off_cat', CrimeCube.from_frame)
+        panel = load_panel(loader)
+        df_police = q5.preprocessing_police_data_for_chart1(df_job)
+        merged_q5 = q5.merge_police_and_crime_for_chart1(df_police, cube)
+        df_q6 = q6.preprocessing_data_chart1(df_sex)
+        df_q7 = q7.preprocess_q7(df_health)
+
+    return [
+        ("build/crime_cube", lambda: CrimeCube.from_frame(df_crime), {}),
+        ("build/per_capita_panel", lambda: PerCapitaPanel.from_sources(df_pop, df_gdp, cube), {}),
+        ("question1/process_crime_data_chart1", lambda: q1.process_crime_data_chart1(cube), {}),
+        ("question1/process_crime_data_chart3", lambda: q1.process_crime_data_chart3(cube), {}),
+        ("question1/process_crime_data_chart4", lambda: q1.process_crime_data_chart4(panel, 2015), {}),
+        ("question2/get_chart1_data", lambda: q2.get_chart1_data(df_reg, None), {}),
+        ("question2/get_chart2_data", lambda: q2.get_chart2_data(df_reg, "DE"), {}),
+        ("question3/processing_data_for_q3", lambda: q3.processing_data_for_q3(df_bri, "Number"), {}),
+        ("question4/preprocess_and_merge_data_chart1",
+         lambda: q4.preprocess_and_merge_data_chart1(panel, "2020", "Intentional homicide"), {}),
+        ("question4/preprocess_and_merge_data_chart2", lambda: q4.preprocess_and_merge_data_chart2(panel, "DE"), {}),
+        ("question4/preprocess_and_merge_data_chart3",
+         lambda: q4.preprocess_and_merge_data_chart3(panel, "2020", "Intentional homicide"), {}),
+        ("question5/preprocessing_police_data_for_chart1", lambda: q5.preprocessing_police_data_for_chart1(df_job), {}),
+        ("question5/preprocessing_crime_data_for_chart1", lambda: q5.preprocessing_crime_data_for_chart1(cube), {}),
+        ("question5/merge_police_and_crime_for_chart1",
+         lambda: q5.merge_police_and_crime_for_chart1(df_police, cube), {}),
+        ("question5/filter_and_format_data_for_chart1",
+         lambda: q5.filter_and_format_data_for_chart1(merged_q5, "Intentional homicide", None), {}),
+        ("question5/preprocess_and_format_data_for_chart2",
+         lambda: q5.preprocess_and_format_data_for_chart2(df_job_year, cube, "2020", "Intentional homicide"), {}),
+        ("question6/preprocessing_data_chart1", lambda: q6.preprocessing_data_chart1(df_sex), {}),
+        ("question6/aggregate_dataframe", lambda: q6.aggregate_dataframe(df_q6), {}),
+        ("question7/preprocess_q7", lambda: q7.preprocess_q7(df_health), {}),
+        ("question7/filter_geo_data", lambda: q7.filter_geo_data(health_dims), {}),
+        ("question7/structure_chart_data", lambda: q7.structure_chart_data(df_q7), {}),
+        # the older helpers of preprocessing_questions.py (preprocess_q6_chart2 is left out,
+        # it needs the lev_limit dimension that none of the chart datasets has)
+        ("questions/preprocess_q7", lambda: preprocessing_questions.preprocess_q7(df_health), {}),
+        ("questions/preprocess_q6_chart1", lambda: preprocessing_questions.preprocess_q6_chart1(df_sex), {}),
+        ("questions/preprocess_q3_chart1", lambda: preprocessing_questions.preprocess_q3_chart1(df_bri_all), {}),
+        ("questions/prerocess_q3_chart2", lambda: preprocessing_questions.prerocess_q3_chart2(df_bri_all), {}),
+    ]
+
+
+def route_cases(app, cache):
+    """(name, fn, extra) of the routes group: every cached GET endpoint with its default params"""
+    from app.warmup import chart_endpoints
+
+    client = app.test_client()
+    cases = []
+    for path, _ in chart_endpoints(app):
+        extra = {}
+
+        def request(path=path, extra=extra):
+            cache.clear()
+            response = client.get(path)
+            if response.status_code != 200:
+                raise RuntimeError(f"{path} returned {response.status_code}")
+            extra['bytes'] = len(response.get_data())
+
+        cases.append((f"route{path[len('/api'):]}", request, extra))
+    return cases
+
+
+def run_suite(scales=(1, 10, 50), groups=('parse', 'preprocessing', 'routes'), repeat=5, match=None, log=print):
+    """
+    Runs the benchmarks at every scale
+
+    Args:
+        scales (list): Sizes of the fixtures, see fixtures.make_datasets
+        groups (list): The groups to run
+        repeat (int): Timed runs per case (after one untimed run)
+        match (str): Only run the cases whose name contains this
+        log (callable): Gets a line per case
+
+    Returns:
+        list: The results, see result
+    """
+    results = []
+    workdir = tempfile.mkdtemp(prefix='chart-benchmarks-')
+    os.environ['RESPONSE_CACHE_FILE'] = os.path.join(workdir, 'response_cache.sqlite3')
+
+    app = cache = None
+    if 'routes' in groups:
+        from app import cache, create_app
+        with quiet():
+            app = create_app()
+
+    for scale in scales:
+        docs = make_datasets(scale)
+        loader = FixtureLoader(docs, cache_file=os.path.join(workdir, f"eurostat_{scale}.sqlite3"))
+        # the routes use this loader through get_loader()
+        es_dataloader._shared_loader = loader
+
+        cases = []
+        if 'parse' in groups:
+            cases += [('parse',) + case for case in parse_cases(loader, docs)]
+        if 'preprocessing' in groups:
+            cases += [('preprocessing',) + case for case in preprocessing_cases(loader)]
+        if 'routes' in groups:
+            cases += [('routes',) + case for case in route_cases(app, cache)]
+
+        for group, name, fn, extra in cases:
+            if match and match not in name:
+                continue
+            entry = result(group, name, scale, measure(fn, repeat), **extra)
+            results.append(entry)
+            log(f"{scale:>3}x  {name:<60} {entry['median_ms']:>10.2f} ms")
+
+    es_dataloader._shared_loader = None
+    return results
@@ -0,0 +1,105 @@
+import os
+import threading
+import time
+
+import pytest
+from werkzeug.serving import make_server
+
+from app.routes import es_dataloader
+from app.routes.es_dataloader import EurostatDataLoader
+from benchmarks.standin import DATA_PATH, create_standin_app
+
+"""
+Fixtures of the tests: the offline stand-in of the Eurostat API (benchmarks/standin.py) runs
+in a thread of the test process and the loaders call it over HTTP like they call Eurostat.
+"""
+
+
+class Standin:
+    def __init__(self, **options):
+        """
+        Starts the stand-in on a free port
+
+        Args:
+            options: Arguments of create_standin_app (latency, error_rate ...)
+        """
+        app = create_standin_app(seed=0, **options)
+        self.stats = app.config['STANDIN_STATS']
+        self.server = make_server('127.0.0.1', 0, app, threaded=True)
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}{DATA_PATH}"
+        self.thread = threading.Thread(target=self.server.serve_forever, name='standin', daemon=True)
+        self.thread.start()
+
+    @property
+    def requests(self):
+        """Number of calls the stand-in got (304s and errors included)"""
+        return self.stats['requests']
+
+    def reset(self):
+        for name in self.stats:
+            self.stats[name] = 0
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture(scope='session')
+def _shared_standin():
+    standin = Standin()
+    yield standin
+    standin.close()
+
+
+@pytest.fixture
+def standin(_shared_standin):
+    """The stand-in without latency, its counters start at 0 in every test"""
+    _shared_standin.reset()
+    return _shared_standin
+
+
+@pytest.fixture
+def slow_standin():
+    """A stand-in that answers after 0.3 seconds, so concurrent calls overlap"""
+    standin = Standin(latency=0.3)
+    yield standin
+    standin.close()
+
+
+@pytest.fixture
+def make_loader(tmp_path):
+    """
+    Creates loaders that call a stand-in and keep their store in the temp dir of the test.
+    Loaders created with the same name share the store & the lock files, like the workers of one host.
+    """
+    def make(standin, name='eurostat', **kwargs):
+        return EurostatDataLoader(cache_file=str(tmp_path / f"{name}.sqlite3"), base_url=standin.base_url, **kwargs)
+    return make
+
+
+@pytest.fixture
+def wait_for():
+    """Waits until a condition is true (e.g. after a refresh in the background), fails after timeout seconds"""
+    def wait(condition, timeout=5):
+        deadline = time.time() + timeout
+        while not condition():
+            assert time.time() < deadline, "timed out"
+            time.sleep(0.02)
+    return wait
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    """The Flask app, its response cache is in a temp file"""
+    os.environ['RESPONSE_CACHE_FILE'] = str(tmp_path_factory.mktemp('responses') / 'response_cache.sqlite3')
+    from app import create_app
+    return create_app()
+
+
+@pytest.fixture
+def client(app, standin, make_loader, monkeypatch):
+    """Test client of the app, the routes load the datasets from the stand-in and nothing is cached yet"""
+    from app import cache
+    monkeypatch.setattr(es_dataloader, '_shared_loader', make_loader(standin))
+    cache.clear()
+    return app.test_client()
@@ -0,0 +1,81 @@
+import asyncio
+import threading
+
+import httpx
+
+from app.asgi import PrefetchingASGIApp
+from app.routes.async_dataloader import AsyncEurostatDataLoader
+
+"""
+The async loader downloads with httpx in the event loop and shares the store, caches & lock files
+of the normal loader, so it has to give the same dfs and download a dataset only once as well.
+"""
+
+
+def run(coroutine_fn, loader):
+    """Runs a coroutine in a new event loop and closes the client of the loader afterwards"""
+    async def main():
+        try:
+            return await coroutine_fn()
+        finally:
+            await loader.aclose()
+    return asyncio.run(main())
+
+
+def test_concurrent_loads_share_one_download(slow_standin, make_loader):
+    loader = AsyncEurostatDataLoader(make_loader(slow_standin, 'async'))
+
+    async def load():
+        return await asyncio.gather(*(loader.load_dataset('crim_off_cat') for _ in range(8)))
+
+    dfs = run(load, loader)
+    assert slow_standin.requests == 1
+    direct = make_loader(slow_standin, 'sync').load_dataset('crim_off_cat')
+    assert all(df.equals(direct) for df in dfs)
+
+
+def test_async_and_sync_loaders_share_the_lock_file(slow_standin, make_loader):
+    # two workers of the host: one async, one sync, same store & lock files
+    async_loader = AsyncEurostatDataLoader(make_loader(slow_standin))
+    sync_loader = make_loader(slow_standin)
+    barrier = threading.Barrier(2)
+    results = {}
+
+    def load_sync():
+        barrier.wait()
+        results['sync'] = sync_loader.load_dataset('crim_off_cat')
+
+    async def load_async():
+        await asyncio.get_running_loop().run_in_executor(None, barrier.wait)
+        return await async_loader.load_dataset('crim_off_cat')
+
+    thread = threading.Thread(target=load_sync)
+    thread.start()
+    results['async'] = run(load_async, async_loader)
+    thread.join()
+
+    assert slow_standin.requests == 1
+    assert results['async'].equals(results['sync'])
+
+
+def test_single_number_timeout(standin, make_loader):
+    loader = AsyncEurostatDataLoader(make_loader(standin, timeout=10))
+
+    async def load():
+        return await loader.get_dimensions('tps00001')
+
+    assert 'geo' in run(load, loader)
+
+
+def test_asgi_app_gives_the_wsgi_response(client, standin, make_loader):
+    asgi_app = PrefetchingASGIApp(client.application, loader=AsyncEurostatDataLoader(make_loader(standin)))
+    path = '/api/question1/chart3?geo=DE'
+
+    async def get():
+        transport = httpx.ASGITransport(app=asgi_app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as http:
+            return await http.get(path)
+
+    response = run(get, asgi_app.loader)
+    assert response.status_code == 200
+    assert response.content == client.get(path).get_data()
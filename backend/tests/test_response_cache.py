@@ -0,0 +1,46 @@
+"""
+The cached chart responses have an ETag, a request with a matching If-None-Match gets a 304
+without a body (and without building the chart or loading a dataset).
+"""
+
+PATH = '/api/question1/chart3'
+
+
+def test_matching_etag_gives_304(client, standin):
+    first = client.get(PATH)
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+    requests = standin.requests
+
+    revalidated = client.get(PATH, headers={'If-None-Match': etag})
+    assert revalidated.status_code == 304
+    assert revalidated.get_data() == b''
+    assert revalidated.headers['ETag'] == etag
+    assert standin.requests == requests
+
+
+def test_other_etag_gives_the_body(client):
+    first = client.get(PATH)
+    other = client.get(PATH, headers={'If-None-Match': '"something-else"'})
+    assert other.status_code == 200
+    assert other.get_data() == first.get_data()
+    assert other.headers['ETag'] == first.headers['ETag']
+
+
+def test_etag_of_a_compressed_body(client):
+    plain = client.get(PATH)
+    compressed = client.get(PATH, headers={'Accept-Encoding': 'gzip'})
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    etag = compressed.headers['ETag']
+    assert etag != plain.headers['ETag']
+
+    revalidated = client.get(PATH, headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert revalidated.status_code == 304
+
+
+def test_etag_changes_with_the_params(client):
+    default = client.get(PATH)
+    filtered = client.get(PATH, query_string={'geo': 'DE'})
+    assert filtered.status_code == 200
+    assert filtered.headers['ETag'] != default.headers['ETag']
+    assert client.get(PATH, query_string={'geo': 'DE'}, headers={'If-None-Match': default.headers['ETag']}).status_code == 200
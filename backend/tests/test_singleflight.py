@@ -0,0 +1,81 @@
+import threading
+import time
+
+from app.routes.singleflight import SingleFlight
+
+"""
+Cold loads of the same dataset at the same time must call Eurostat only once:
+the threads of a process wait for one download (SingleFlight) and the processes of a host
+for the one holding the lock file of the key (file_lock).
+"""
+
+
+def load_together(loaders, threads_per_loader, dataset_code='crim_off_cat'):
+    """Starts the loads of every thread at the same moment and returns their dfs"""
+    jobs = [loader for loader in loaders for _ in range(threads_per_loader)]
+    barrier = threading.Barrier(len(jobs))
+    results = [None] * len(jobs)
+    errors = []
+
+    def run(i, loader):
+        barrier.wait()
+        try:
+            results[i] = loader.load_dataset(dataset_code)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(i, loader)) for i, loader in enumerate(jobs)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    return results
+
+
+def test_threads_share_one_download(slow_standin, make_loader):
+    dfs = load_together([make_loader(slow_standin)], 8)
+    assert slow_standin.requests == 1
+    assert all(df.equals(dfs[0]) for df in dfs)
+
+
+def test_processes_share_one_download(slow_standin, make_loader):
+    # two loaders on the same store & lock files, like two workers of gunicorn
+    dfs = load_together([make_loader(slow_standin), make_loader(slow_standin)], 4)
+    assert slow_standin.requests == 1
+    assert all(df.equals(dfs[0]) for df in dfs)
+
+
+def test_singleflight_runs_once_and_shares_errors():
+    flights = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def fail():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        raise ValueError("upstream down")
+
+    errors = []
+
+    def run():
+        try:
+            flights.do('key', fail)
+        except ValueError as e:
+            errors.append(e)
+
+    first = threading.Thread(target=run)
+    first.start()
+    started.wait(5)
+    others = [threading.Thread(target=run) for _ in range(3)]
+    for thread in others:
+        thread.start()
+    # gives the others the time to join the running call
+    time.sleep(0.2)
+    release.set()
+    for thread in [first] + others:
+        thread.join()
+
+    assert len(calls) == 1
+    assert len(errors) == 4
@@ -0,0 +1,99 @@
+import time
+
+import pytest
+
+from app.routes.dataset_store import make_cache_key
+from benchmarks.fixtures import FREQ, make_jsonstat
+from benchmarks.suite import FixtureLoader
+
+"""
+Filtered loads answered by slicing a cached superset (EurostatDataLoader._slice_from_superset)
+must return the same df as a download of the filtered request.
+"""
+
+FILTERS = [
+    {'geo': 'DE'},
+    {'geo': ['FR', 'DE']},
+    {'iccs': 'ICCS0101', 'unit': 'NR'},
+    {'geo': ['DE', 'AT'], 'time': ['2019', '2020']},
+]
+
+
+@pytest.mark.parametrize('filters', FILTERS)
+def test_slice_matches_direct_load(standin, make_loader, filters):
+    warm = make_loader(standin, 'warm')
+    warm.load_dataset('crim_off_cat')
+    assert standin.requests == 1
+
+    sliced = warm.load_dataset('crim_off_cat', filters=filters)
+    # cut out of the cached dataset, Eurostat is not called
+    assert standin.requests == 1
+
+    direct = make_loader(standin, 'cold').load_dataset('crim_off_cat', filters=filters)
+    assert standin.requests == 2
+    assert sliced.equals(direct)
+
+
+def test_slice_has_the_version_of_the_superset(standin, make_loader):
+    loader = make_loader(standin)
+    with loader.record_versions() as whole:
+        loader.load_dataset('crim_off_cat')
+    with loader.record_versions() as sliced:
+        loader.load_dataset('crim_off_cat', filters={'geo': 'DE'})
+
+    key = make_cache_key('crim_off_cat', {'format': 'json', 'geo': 'DE'})
+    assert sliced[key] is not None
+    assert sliced[key] == list(whole.values())[0]
+    # a cached response built on the slice can be revalidated without loading it
+    assert loader.current_versions([key]) == sliced
+    assert loader.get_dimension_index('crim_off_cat', {'geo': 'DE'})['geo'].codes == ['DE']
+
+
+def test_unknown_code_is_not_sliced(standin, make_loader):
+    loader = make_loader(standin)
+    loader.load_dataset('crim_off_cat')
+
+    # the stand-in answers 400 like Eurostat, an empty slice would hide the typo
+    with pytest.raises(Exception, match='400'):
+        loader.load_dataset('crim_off_cat', filters={'geo': 'XX'})
+    assert standin.requests == 2
+
+
+def test_shared_label_is_not_sliced(tmp_path):
+    # two codes with the same label: the df only holds the labels, so a slice would mix them up
+    dimensions = [
+        ('freq', 'Time frequency', FREQ),
+        ('iccs', 'ICCS', [('A', 'Theft'), ('B', 'Theft'), ('C', 'Fraud')]),
+        ('geo', 'Geopolitical entity', [('DE', 'Germany'), ('FR', 'France')]),
+        ('time', 'Time', [('2019', '2019'), ('2020', '2020')]),
+    ]
+    docs = {'test': make_jsonstat('test', dimensions, density=1)}
+    warm = FixtureLoader(docs, cache_file=str(tmp_path / 'warm.sqlite3'))
+    cold = FixtureLoader(docs, cache_file=str(tmp_path / 'cold.sqlite3'))
+    warm.load_dataset('test')
+
+    shared = warm.load_dataset('test', filters={'iccs': 'A'})
+    assert warm.requests == 2
+    assert shared.equals(cold.load_dataset('test', filters={'iccs': 'A'}))
+
+    unique = warm.load_dataset('test', filters={'iccs': 'C'})
+    assert warm.requests == 2
+    assert unique.equals(cold.load_dataset('test', filters={'iccs': 'C'}))
+
+
+def test_stale_slice_refreshes_the_superset(standin, make_loader, wait_for):
+    loader = make_loader(standin, cache_expiry=1, stale_grace=60)
+    loader.load_dataset('crim_off_cat')
+    before = loader.load_dataset('crim_off_cat', filters={'geo': 'DE'})
+
+    time.sleep(1.2)
+    stale = loader.load_dataset('crim_off_cat', filters={'geo': 'DE'})
+    assert stale.equals(before)
+    # only the whole dataset was asked for again (and not changed: the ETag gave a 304)
+    wait_for(lambda: standin.stats['not_modified'] == 1)
+    assert standin.requests == 2
+    assert loader.store.get(make_cache_key('crim_off_cat', {'format': 'json', 'geo': 'DE'})) is None
+    wait_for(lambda: loader._freshness(loader.store.get(make_cache_key('crim_off_cat', {'format': 'json'})).fetched_at) == 'fresh')
+    assert loader.load_dataset('crim_off_cat', filters={'geo': 'DE'}).equals(before)
+    assert standin.requests == 2
+
@@ -0,0 +1,44 @@
+import time
+
+from app.routes.dataset_store import make_cache_key
+
+"""
+An expired entry is served as it is during stale_grace while it is refreshed in the background,
+after stale_grace the request waits for the refresh.
+"""
+
+KEY = make_cache_key('crim_off_cat', {'format': 'json'})
+
+
+def test_stale_entry_is_served_and_refreshed(slow_standin, make_loader, wait_for):
+    loader = make_loader(slow_standin, cache_expiry=1, stale_grace=60)
+    fresh = loader.load_dataset('crim_off_cat')
+    fetched_at = loader.store.get(KEY).fetched_at
+
+    time.sleep(1.1)
+    start = time.perf_counter()
+    stale = loader.load_dataset('crim_off_cat')
+    # returned right away, the refresh (0.3 s latency) is still running
+    assert time.perf_counter() - start < 0.25
+    assert slow_standin.requests == 1
+    assert stale.equals(fresh)
+
+    wait_for(lambda: loader.store.get(KEY).fetched_at > fetched_at)
+    assert slow_standin.requests == 2
+    # the data did not change, so the ETag was revalidated
+    assert slow_standin.stats['not_modified'] == 1
+    assert loader._freshness(loader.store.get(KEY).fetched_at) == 'fresh'
+
+    assert loader.load_dataset('crim_off_cat').equals(fresh)
+    assert slow_standin.requests == 2
+
+
+def test_entry_after_the_grace_is_refreshed_first(standin, make_loader):
+    loader = make_loader(standin, cache_expiry=1, stale_grace=0)
+    fresh = loader.load_dataset('crim_off_cat')
+
+    time.sleep(1.1)
+    assert loader.load_dataset('crim_off_cat').equals(fresh)
+    # the request waited for the refresh
+    assert standin.requests == 2
+    assert loader._freshness(loader.store.get(KEY).fetched_at) == 'fresh'